@@ -0,0 +1,60 @@
+# Generated by Django 4.2.5 on 2026-10-18 16:27
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def delete_duplicate_likes(apps, schema_editor):
+    # Уникальности не было: повторный лайк мог создать вторую строку
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    duplicates = LikedItem.objects.values('user_id', 'content_type_id', 'object_id') \
+        .annotate(rows=Count('id'), first_id=Min('id')).filter(rows__gt=1)
+    for row in duplicates:
+        LikedItem.objects.filter(user_id=row['user_id'], content_type_id=row['content_type_id'],
+                                 object_id=row['object_id']).exclude(pk=row['first_id']).delete()
+
+
+def fill_like_counters(apps, schema_editor):
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    LikeCounter = apps.get_model('likes', 'LikeCounter')
+    LikeCounter.objects.bulk_create([
+        LikeCounter(content_type_id=row['content_type_id'], object_id=row['object_id'],
+                    likes_count=row['likes_count'])
+        for row in LikedItem.objects.values('content_type_id', 'object_id')
+        .annotate(likes_count=Count('id')).order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('likes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(delete_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='likeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'content_type', 'object_id'), name='likes_likeditem_unique_user_object'),
+        ),
+        migrations.AddField(
+            model_name='likecounter',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+        ),
+        migrations.AddConstraint(
+            model_name='likecounter',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='likes_likecounter_unique_object'),
+        ),
+        migrations.RunPython(fill_like_counters, migrations.RunPython.noop),
+    ]
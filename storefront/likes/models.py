@@ -1,13 +1,170 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import IntegrityError, connection, models, transaction
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
 # Create your models here.
 
+class LikedItemManager(models.Manager):
+    """
+    like / unlike - пачкой. На sqlite и postgresql один INSERT / DELETE
+    с RETURNING: счетчики LikeCounter меняются ровно на вставленные
+    и удаленные строки, повторный лайк и гонка их не сбивают.
+    Одиночные записи через ORM (админка, каскад) считают сигналы.
+    """
+
+    def for_model(self, obj_type):
+        meta = obj_type._meta
+        return self.filter(content_type__app_label=meta.app_label,
+                           content_type__model=meta.model_name)
+
+    def get_liked_ids(self, user, obj_type, obj_ids):
+        """Какие из obj_ids пользователь лайкнул - один запрос по уникальному индексу."""
+        if not user.is_authenticated or not obj_ids:
+            return set()
+        return set(self.for_model(obj_type).filter(user_id=user.id, object_id__in=list(obj_ids))
+                   .values_list('object_id', flat=True))
+
+    def like(self, user, obj_type, obj_ids):
+        """Лайкает существующие объекты из obj_ids. Возвращает id новых лайков."""
+        obj_ids = sorted(set(obj_ids))
+        if not obj_ids:
+            return []
+        content_type = ContentType.objects.get_for_model(obj_type)
+        if not has_returning():
+            return self.like_one_by_one(user, obj_type, content_type, obj_ids)
+
+        # INSERT ... SELECT из таблицы модели: несуществующие id отсеиваются тем же запросом
+        quote = connection.ops.quote_name
+        sql = (
+            f'INSERT INTO {quote(self.model._meta.db_table)} (user_id, content_type_id, object_id) '
+            f'SELECT %s, %s, {quote(obj_type._meta.pk.column)} '
+            f'FROM {quote(obj_type._meta.db_table)} '
+            f'WHERE {quote(obj_type._meta.pk.column)} IN ({", ".join(["%s"] * len(obj_ids))}) '
+            f'ON CONFLICT (user_id, content_type_id, object_id) DO NOTHING '
+            f'RETURNING object_id'
+        )
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [user.id, content_type.id] + obj_ids)
+                liked = [row[0] for row in cursor.fetchall()]
+            LikeCounter.objects.add(content_type, {obj_id: 1 for obj_id in liked})
+        return liked
+
+    def like_one_by_one(self, user, obj_type, content_type, obj_ids):
+        # Счетчики - сигналом post_save
+        liked = []
+        for obj_id in obj_type._default_manager.filter(pk__in=obj_ids).values_list('pk', flat=True):
+            try:
+                with transaction.atomic():
+                    self.create(user_id=user.id, content_type=content_type, object_id=obj_id)
+            except IntegrityError:
+                continue
+            liked.append(obj_id)
+        return liked
+
+    def unlike(self, user, obj_type, obj_ids):
+        """Снимает лайки. Возвращает id, с которых лайк действительно снят."""
+        obj_ids = sorted(set(obj_ids))
+        if not obj_ids:
+            return []
+        content_type = ContentType.objects.get_for_model(obj_type)
+        if not has_returning():
+            # Счетчики - сигналом post_delete
+            return [obj_id for obj_id in obj_ids
+                    if self.filter(user_id=user.id, content_type=content_type,
+                                   object_id=obj_id).delete()[0]]
+
+        quote = connection.ops.quote_name
+        sql = (
+            f'DELETE FROM {quote(self.model._meta.db_table)} '
+            f'WHERE user_id = %s AND content_type_id = %s '
+            f'AND object_id IN ({", ".join(["%s"] * len(obj_ids))}) '
+            f'RETURNING object_id'
+        )
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [user.id, content_type.id] + obj_ids)
+                unliked = [row[0] for row in cursor.fetchall()]
+            LikeCounter.objects.add(content_type, {obj_id: -1 for obj_id in unliked})
+        return unliked
+
+
+    def forget(self, obj_type, obj_ids):
+        """
+        Лайки и счетчики удаленных объектов. Одним DELETE без сигналов:
+        счетчики удаляются целиком, уменьшать их по одному лайку незачем.
+        """
+        obj_ids = sorted(set(obj_ids))
+        if not obj_ids:
+            return
+        content_type = ContentType.objects.get_for_model(obj_type)
+        quote = connection.ops.quote_name
+        sql = (
+            f'DELETE FROM {quote(self.model._meta.db_table)} '
+            f'WHERE content_type_id = %s AND object_id IN ({", ".join(["%s"] * len(obj_ids))})'
+        )
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [content_type.id] + obj_ids)
+            LikeCounter.objects.filter(content_type=content_type, object_id__in=obj_ids).delete()
+
+
+def has_returning():
+    return connection.vendor in ('sqlite', 'postgresql') \
+        and connection.features.can_return_rows_from_bulk_insert
+
+
 class LikedItem(models.Model):
+    objects = LikedItemManager()
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
 
+    class Meta:
+        constraints = [
+            # Один лайк на объект; индекс отвечает и на "что я лайкнул из этих N"
+            models.UniqueConstraint(fields=['user', 'content_type', 'object_id'],
+                                    name='likes_likeditem_unique_user_object'),
+        ]
+
+
+class LikeCounterManager(models.Manager):
+    def get_counts(self, obj_type, obj_ids):
+        """{id объекта: кол-во лайков} одним запросом, без лайков - нет в словаре."""
+        meta = obj_type._meta
+        return dict(self.filter(content_type__app_label=meta.app_label,
+                                content_type__model=meta.model_name,
+                                object_id__in=list(obj_ids), likes_count__gt=0)
+                    .values_list('object_id', 'likes_count'))
+
+    def add(self, content_type, deltas):
+        """{id объекта: +-n} - атомарно, в самой базе."""
+        by_delta = defaultdict(list)
+        for obj_id, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(obj_id)
+        self.bulk_create([LikeCounter(content_type=content_type, object_id=obj_id)
+                          for delta, obj_ids in by_delta.items() if delta > 0
+                          for obj_id in obj_ids], ignore_conflicts=True)
+        # Лайк / анлайк пачкой - один UPDATE на все объекты
+        for delta, obj_ids in by_delta.items():
+            self.filter(content_type=content_type, object_id__in=obj_ids) \
+                .update(likes_count=models.F('likes_count') + delta)
+
+
+class LikeCounter(models.Model):
+    """Кол-во лайков объекта - без COUNT по LikedItem на каждую карточку."""
+    objects = LikeCounterManager()
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    likes_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'],
+                                    name='likes_likecounter_unique_object'),
+        ]
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import LikeCounter, LikedItem
+
+
+# like / unlike пачкой меняют счетчики сами (SQL без сигналов),
+# здесь - одиночные записи через ORM: админка, каскад при удалении пользователя
+@receiver(post_save, sender=LikedItem)
+def liked_item_saved(sender, instance, created, **kwargs):
+    if created:
+        LikeCounter.objects.add(instance.content_type, {instance.object_id: 1})
+
+
+@receiver(post_delete, sender=LikedItem)
+def liked_item_deleted(sender, instance, **kwargs):
+    LikeCounter.objects.add(instance.content_type, {instance.object_id: -1})
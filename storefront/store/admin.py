@@ -1,9 +1,10 @@
 from django.contrib import admin
-from django.db.models.aggregates import Count
 from django.db.models.query import QuerySet
 from django.utils.html import format_html, urlencode
 from django.urls import reverse
 from . import models
+from .facets import LOW_INVENTORY
+from .thumbnails import variant_urls
 
 
 # Register your models here.
@@ -20,7 +21,7 @@ class InventoryFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == '<10':
-            return queryset.filter(inventory__lt=10)
+            return queryset.filter(inventory__lt=LOW_INVENTORY)
 
 
 class ProductImageInline(admin.TabularInline):
@@ -28,8 +29,13 @@ class ProductImageInline(admin.TabularInline):
     readonly_fields = ['thumbnail']
 
     def thumbnail(self, instance):
+        # Наименьший вариант, пока его нет - оригинал
+        variants = variant_urls(instance.variants)
+        if variants:
+            return format_html('<img src="{}" class="thumbnail">',
+                               next(iter(variants.values()))['url'])
         if instance.image.name != '':
-            return format_html(f'<img src="{instance.image.url}" class="thumbnail">')
+            return format_html('<img src="{}" class="thumbnail">', instance.image.url)
         return ''
 
 @admin.register(models.Product)
@@ -47,7 +53,7 @@ class ProductAdmin(admin.ModelAdmin):
 
     @admin.display(ordering='inventory')
     def inventory_status(self, product):
-        if product.inventory < 10:
+        if product.inventory < LOW_INVENTORY:
             return 'Low'
         return 'Ok'
 
@@ -60,6 +66,7 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(models.Collection)
 class CollectionAdmin(admin.ModelAdmin):
     list_display = ['title', 'products_count']
+    readonly_fields = ['products_count']  # Ведут сигналы товаров
     search_fields = ['title']
 
     @admin.display(ordering='products_count')
@@ -73,11 +80,6 @@ class CollectionAdmin(admin.ModelAdmin):
         )
         return format_html(f'<a href="{url}"> {collection.products_count} Products </a>')
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            products_count=Count('products')
-        )
-
 
 class OrderItemInline(admin.TabularInline):
     min_num = 1
@@ -6,4 +6,10 @@ class StoreConfig(AppConfig):
     name = 'store'
 
     def ready(self):
-        import store.signals.handlers
\ No newline at end of file
+        import store.signals.handlers
+
+        from django.conf import settings
+        interval = getattr(settings, 'STORE_CART_SWEEP_INTERVAL', None)
+        if interval:
+            from store.carts import start_cart_sweeper
+            start_cart_sweeper(interval)
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+Покупатель в JWT: при выдаче токена в него пишутся customer_id и membership,
+CustomerJWTAuthentication кладет их в request.customer_id / request.membership.
+Вьюхам не нужно искать Customer по user_id на каждый запрос.
+
+Токены, выданные до появления claims (и force_authenticate в тестах), claims
+не содержат - get_customer_id() тогда один раз берет покупателя из базы.
+Там, где покупатель должен существовать (профиль, оформление заказа),
+get_customer() проверяет claim и при удаленном покупателе берет его заново.
+membership в токене - на момент выдачи, для прав и цен читайте из базы.
+
+Пользователь по токену берется из UserCache - снимков в памяти процесса
+(LRU на STORE_AUTH_USER_CACHE_SIZE записей, TTL STORE_AUTH_USER_CACHE_TTL
+секунд). Сохранение пользователя (смена пароля, деактивация) сбрасывает
+снимок в своем процессе, в остальных он живет не дольше TTL.
+"""
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import Customer
+
+CUSTOMER_ID_CLAIM = 'customer_id'
+MEMBERSHIP_CLAIM = 'membership'
+
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+
+class UserCache:
+    """
+    {id пользователя: (срок, версия токена, значения полей)}. Версия -
+    REVOKE_TOKEN_CLAIM (хеш пароля), если токены ее несут: токен другой
+    версии снимок не получит. Отдается новый экземпляр, общий не меняется.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_model, user_id, version):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            expires, entry_version, values = entry
+            if expires < monotonic() or entry_version != version:
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+        fields = [field.attname for field in user_model._meta.concrete_fields]
+        return user_model.from_db(DEFAULT_DB_ALIAS, fields, values)
+
+    def set(self, user_id, version, user):
+        values = [getattr(user, field.attname) for field in user._meta.concrete_fields]
+        with self.lock:
+            self.entries[user_id] = (monotonic() + self.ttl, version, values)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)  # Самый давно использованный
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def get_user_cache():
+    """None, если STORE_AUTH_USER_CACHE_TTL = 0 (кеш выключен)."""
+    global _user_cache
+    ttl = getattr(settings, 'STORE_AUTH_USER_CACHE_TTL', 0)
+    if not ttl:
+        return None
+    with _user_cache_lock:
+        if _user_cache is None:
+            _user_cache = UserCache(getattr(settings, 'STORE_AUTH_USER_CACHE_SIZE', 10000), ttl)
+    return _user_cache
+
+
+def invalidate_user(user_id):
+    if _user_cache is not None:
+        _user_cache.invalidate(user_id)
+
+
+def get_token_customer(user):
+    customer, created = Customer.objects.only('id', 'membership').get_or_create(user_id=user.id)
+    return customer
+
+
+class CustomerTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """/auth/jwt/create: claims покупателя. Refresh копирует их в новый access."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        customer = get_token_customer(user)
+        token[CUSTOMER_ID_CLAIM] = customer.id
+        token[MEMBERSHIP_CLAIM] = customer.membership
+        return token
+
+
+class CachedUserJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication без запроса пользователя, пока его снимок в UserCache."""
+
+    def get_user(self, validated_token):
+        cache = get_user_cache()
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if cache is None or user_id is None:
+            return super().get_user(validated_token)
+
+        version = validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+        user = cache.get(self.user_model, user_id, version)
+        if user is None:
+            # Неактивный или с другим паролем - исключение, в кеш не попадет
+            user = super().get_user(validated_token)
+            cache.set(user_id, version, user)
+        return user
+
+
+class CustomerJWTAuthentication(CachedUserJWTAuthentication):
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            user, token = result
+            request.customer_id = token.get(CUSTOMER_ID_CLAIM)
+            request.membership = token.get(MEMBERSHIP_CLAIM)
+        return result
+
+
+def get_customer_id(request):
+    """id покупателя текущего пользователя: из токена, для старых токенов - из базы."""
+    customer_id = getattr(request, 'customer_id', None)
+    if customer_id is None:
+        customer = get_token_customer(request.user)
+        request.customer_id = customer_id = customer.id
+        request.membership = customer.membership
+    return customer_id
+
+
+def get_customer(request, *fields):
+    """
+    Покупатель текущего пользователя по id из токена. Если покупателя с этим
+    id уже нет (удален после выдачи токена) - claim забываем и берем
+    (создаем) покупателя по пользователю, как для старых токенов.
+    """
+    queryset = Customer.objects.only(*fields) if fields else Customer.objects.all()
+    try:
+        return queryset.get(pk=get_customer_id(request))
+    except Customer.DoesNotExist:
+        customer = get_token_customer(request.user)
+        request.customer_id = customer.id
+        request.membership = customer.membership
+        return customer
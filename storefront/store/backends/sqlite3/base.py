@@ -0,0 +1,47 @@
+"""
+SQLite для нескольких процессов (gunicorn). В Django 4.2 у стандартного
+бэкенда нет init_command и transaction_mode (появились в 5.1), поэтому
+подключение настраивается здесь. Дополнительные OPTIONS:
+
+    'pragmas': {'journal_mode': 'WAL', 'busy_timeout': 5000, ...} - выполняются
+        на каждом новом подключении, по порядку;
+    'transaction_mode': 'DEFERRED' | 'IMMEDIATE' | 'EXCLUSIVE' - режим BEGIN
+        по умолчанию. Точечно IMMEDIATE дает store.transactions.atomic_write.
+
+Остальные OPTIONS, как и в стандартном бэкенде, уходят в sqlite3.connect.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = dict(options.get('pragmas', {}))
+        for name in self.pragmas:
+            if not name.isidentifier():
+                raise ImproperlyConfigured(f'Недопустимое имя PRAGMA: {name!r}')
+        self.transaction_mode = options.get('transaction_mode', 'DEFERRED').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f'transaction_mode: одно из {", ".join(TRANSACTION_MODES)}')
+        self.begin_mode = None  # Режим только следующего BEGIN
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        # Для базы в памяти (тесты) journal_mode = WAL SQLite молча оставит memory
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode, self.begin_mode = self.begin_mode or self.transaction_mode, None
+        self.cursor().execute(f'BEGIN {mode}')
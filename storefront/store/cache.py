@@ -0,0 +1,128 @@
+from functools import partial
+from hashlib import md5
+from time import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from rest_framework.response import Response
+
+CATALOG_CACHE_ALIAS = 'catalog'
+
+
+def get_catalog_cache():
+    return caches[CATALOG_CACHE_ALIAS]
+
+
+def get_ttl(kind):
+    return getattr(settings, 'STORE_CATALOG_CACHE_TTL', {}).get(kind, DEFAULT_TIMEOUT)
+
+
+def get_generation(name):
+    """
+    Поколение группы списков. Ключ списка включает поколение, поэтому
+    инвалидация = увеличить поколение, старые записи вытеснит LRU / TTL.
+    Начальное значение - время, чтобы после вытеснения счетчика
+    не вернуться к уже использованному номеру.
+    """
+    cache = get_catalog_cache()
+    key = f'gen:{name}'
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, int(time() * 1000), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(name):
+    from .routers import get_replicas, get_sticky_seconds
+    cache = get_catalog_cache()
+    key = f'gen:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:  # Ключа нет - get_generation создаст новый
+        pass
+    if get_replicas():
+        # Пока метка жива, реплика может не догнать запись (см. cached_response)
+        cache.set(f'fresh:{name}', True, get_sticky_seconds())
+
+
+def request_key(request):
+    params = sorted(request.query_params.lists())
+    raw = f'{request.get_host()}{request.path}?{params}'
+    return md5(raw.encode()).hexdigest()
+
+
+def product_group(product_id):
+    return f'product:{product_id}'
+
+
+def product_list_group(collection_id=None):
+    return f'products:{collection_id}' if collection_id else 'products'
+
+
+def invalidate_product(product_id, *collection_ids):
+    """Сбрасывает карточку товара и списки товаров его категорий."""
+    bump_generation(product_group(product_id))
+    bump_generation(product_list_group())
+    for collection_id in set(collection_ids):
+        if collection_id is not None:
+            bump_generation(product_list_group(collection_id))
+
+
+def invalidate_collections():
+    bump_generation('collections')
+
+
+def cached_response(request, kind, group, handler):
+    """
+    Read-through кеш: сериализованный ответ хранится по ключу из поколения
+    группы и параметров запроса (collection_id, search, ordering, page...).
+    group - имя или список имен групп, сброс любой из них сбрасывает запись.
+    handler вызывается только при промахе.
+
+    Ответ с реплики не кешируется, пока поколение группы моложе
+    STORE_DB_STICKY_SECONDS: реплика могла не догнать запись, и старые данные
+    прожили бы под новым поколением весь TTL. Позже - кешируется: как и
+    закрепление за основной базой, это считает, что реплика отстает меньше
+    STORE_DB_STICKY_SECONDS. Отстанет больше - старый ответ проживет до TTL.
+    """
+    from .routers import current_replica
+    cache = get_catalog_cache()
+    groups = [group] if isinstance(group, str) else group
+    generations = ':'.join(str(get_generation(name)) for name in groups)
+    key = f'{kind}:{generations}:{request_key(request)}'
+    data = cache.get(key)
+    if data is not None:
+        return Response(data)
+
+    response = handler()
+    if response.status_code == 200 and not (
+            current_replica() and cache.get_many([f'fresh:{name}' for name in groups])):
+        cache.set(key, response.data, get_ttl(kind))
+    return response
+
+
+class CatalogCacheMixin:
+    """
+    Кеширует list/retrieve вьюсета. cached_actions: действие -> вид записи
+    (ключ STORE_CATALOG_CACHE_TTL), get_cache_group() - группа инвалидации.
+    """
+    cached_actions = {}
+
+    def get_cache_group(self):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        handler = partial(super().list, request, *args, **kwargs)
+        if 'list' not in self.cached_actions:
+            return handler()
+        return cached_response(request, self.cached_actions['list'],
+                               self.get_cache_group(), handler)
+
+    def retrieve(self, request, *args, **kwargs):
+        handler = partial(super().retrieve, request, *args, **kwargs)
+        if 'retrieve' not in self.cached_actions:
+            return handler()
+        return cached_response(request, self.cached_actions['retrieve'],
+                               self.get_cache_group(), handler)
@@ -0,0 +1,204 @@
+"""
+Корзины. Позиция корзины уникальна по (cart, product), поэтому
+добавление товара - один upsert: новая позиция вставляется, существующая
+увеличивается в самой базе. Параллельные добавления не теряют количество
+и не создают дубликатов.
+
+Собранная корзина кешируется (CartViewSet.retrieve), ключ включает версию
+корзины (меняется при записи позиций) и поколения только ее товаров (цены,
+названия, остатки) - запись других товаров кеш корзины не сбрасывает.
+
+Брошенные корзины (нет активности дольше STORE_CART_TTL_DAYS) удаляет
+sweep_carts: команда sweep_carts или фоновый поток start_cart_sweeper.
+"""
+import logging
+import threading
+from datetime import timedelta
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.utils import timezone
+
+from .cache import bump_generation, get_catalog_cache, get_generation, get_ttl, product_group
+from .models import Cart, CartItem, Product
+from .transactions import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# last_activity пишется не чаще - чтобы частые записи позиций не били по базе
+CART_TOUCH_INTERVAL = timedelta(minutes=1)
+
+
+def cart_group(cart_id):
+    return f'cart:{cart_id}'
+
+
+def get_cart_product_ids(cart_id):
+    """id товаров корзины - в кеше под версией корзины, она меняется вместе с позициями."""
+    cache = get_catalog_cache()
+    # Версия читается до запроса: позиции, записанные между ними, сменят ключ
+    key = f'cart-products:{cart_id}:{get_generation(cart_group(cart_id))}'
+    product_ids = cache.get(key)
+    if product_ids is None:
+        product_ids = sorted(CartItem.objects.filter(cart_id=cart_id)
+                             .values_list('product_id', flat=True))
+        cache.set(key, product_ids, get_ttl('cart'))
+    return product_ids
+
+
+def cart_cache_groups(cart_id):
+    return [cart_group(cart_id)] + [product_group(product_id)
+                                    for product_id in get_cart_product_ids(cart_id)]
+
+
+def invalidate_cart(cart_id):
+    """Новая версия корзины - после коммита, как и для каталога."""
+    transaction.on_commit(lambda: bump_generation(cart_group(cart_id)))
+
+
+def touch_cart(cart_id):
+    """Один UPDATE по ключу, ничего не пишет, если корзину трогали недавно."""
+    now = timezone.now()
+    Cart.objects.filter(pk=cart_id, last_activity__lt=now - CART_TOUCH_INTERVAL) \
+        .update(last_activity=now)
+
+
+def line_total():
+    """Сумма позиции в SQL: quantity * итоговая цена товара."""
+    return ExpressionWrapper(F('quantity') * F('product__effective_price'),
+                             output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def add_cart_items(cart_id, quantities):
+    """
+    {product_id: quantity} -> позиции корзины (id, product_id, quantity).
+    Несуществующие товары пропускаются, вызывающий сравнивает product_id.
+    """
+    if not quantities:
+        return []
+    invalidate_cart(cart_id)
+    if connection.vendor in ('sqlite', 'postgresql') \
+            and connection.features.can_return_rows_from_bulk_insert:
+        return upsert_cart_items(cart_id, quantities)
+    return update_or_create_cart_items(cart_id, quantities)
+
+
+def upsert_cart_items(cart_id, quantities):
+    # INSERT ... SELECT из товаров: проверка товара в том же запросе
+    table = CartItem._meta.db_table
+    values = ', '.join(['(%s, %s)'] * len(quantities))
+    sql = (
+        f'INSERT INTO {table} (cart_id, product_id, quantity) '
+        f'SELECT %s, product.id, item.column2 FROM {Product._meta.db_table} product '
+        f'JOIN (VALUES {values}) item ON product.id = item.column1 '
+        f'WHERE true '  # Без WHERE SQLite путает ON CONFLICT с JOIN ... ON
+        f'ON CONFLICT (cart_id, product_id) '
+        f'DO UPDATE SET quantity = {table}.quantity + excluded.quantity '
+        f'RETURNING id, product_id, quantity'
+    )
+    params = [CartItem._meta.get_field('cart').get_db_prep_value(cart_id, connection)]
+    for product_id, quantity in quantities.items():
+        params += [product_id, quantity]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [CartItem(id=item_id, cart_id=cart_id, product_id=product_id, quantity=quantity)
+            for item_id, product_id, quantity in rows]
+
+
+def update_or_create_cart_items(cart_id, quantities):
+    """Для баз без ON CONFLICT: UPDATE с F(), при гонке на вставке - повтор."""
+    product_ids = Product.objects.filter(pk__in=list(quantities)).values_list('id', flat=True)
+    items = []
+    with transaction.atomic():
+        for product_id in product_ids:
+            lookup = {'cart_id': cart_id, 'product_id': product_id}
+            quantity = quantities[product_id]
+            if not CartItem.objects.filter(**lookup).update(quantity=F('quantity') + quantity):
+                try:
+                    with transaction.atomic():
+                        CartItem.objects.create(quantity=quantity, **lookup)
+                except IntegrityError:
+                    CartItem.objects.filter(**lookup).update(quantity=F('quantity') + quantity)
+            items.append(CartItem.objects.get(**lookup))
+    return items
+
+
+# Брошенные корзины
+
+def get_cart_ttl():
+    return timedelta(days=getattr(settings, 'STORE_CART_TTL_DAYS', 30))
+
+
+def sweep_carts(ttl=None, batch_size=500, pause=0.1, max_batches=None):
+    """
+    Удаляет корзины без активности дольше ttl пачками по batch_size.
+    Каждая пачка - своя короткая транзакция, между пачками пауза pause
+    секунд: SQLite не блокируется надолго и оформление заказов не ждет.
+    Отдает (корзин, позиций, секунд) по каждой пачке.
+    """
+    cutoff = timezone.now() - (ttl if ttl is not None else get_cart_ttl())
+    quote = connection.ops.quote_name
+    cart_table = quote(Cart._meta.db_table)
+    item_table = quote(CartItem._meta.db_table)
+
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        started = monotonic()
+        # Выбранные корзины заблокированы до конца транзакции: last_activity проверен
+        # один раз, позиции и корзины удаляются по одному списку id. На SQLite вместо
+        # блокировки строк - BEGIN IMMEDIATE (atomic_write)
+        with atomic_write(), connection.cursor() as cursor:
+            cart_ids = list(Cart.objects.select_for_update()
+                            .filter(last_activity__lt=cutoff).order_by('last_activity')
+                            .values_list('id', flat=True)[:batch_size])
+            if not cart_ids:
+                return
+
+            # Без ORM-каскада: он загрузил бы каждую позицию ради сигналов
+            id_params = [Cart._meta.pk.get_db_prep_value(cart_id, connection)
+                         for cart_id in cart_ids]
+            placeholders = ', '.join(['%s'] * len(cart_ids))
+            cursor.execute(f'DELETE FROM {item_table} WHERE cart_id IN ({placeholders})',
+                           id_params)
+            items = cursor.rowcount
+            cursor.execute(f'DELETE FROM {cart_table} WHERE id IN ({placeholders})', id_params)
+            carts = cursor.rowcount
+            transaction.on_commit(lambda ids=cart_ids: [bump_generation(cart_group(cart_id))
+                                                        for cart_id in ids])
+
+        batches += 1
+        yield carts, items, monotonic() - started
+        if pause:
+            sleep(pause)
+
+
+_sweeper = None
+
+
+def start_cart_sweeper(interval):
+    """Фоновый поток процесса: sweep_carts каждые interval секунд."""
+    global _sweeper
+    if _sweeper is not None:
+        return _sweeper
+
+    def run():
+        while True:
+            sleep(interval)
+            try:
+                for carts, items, seconds in sweep_carts(
+                        batch_size=getattr(settings, 'STORE_CART_SWEEP_BATCH_SIZE', 500),
+                        pause=getattr(settings, 'STORE_CART_SWEEP_PAUSE', 0.1)):
+                    logger.info('Удалено брошенных корзин: %s, позиций: %s за %.2f с',
+                                carts, items, seconds)
+            except Exception:
+                logger.exception('Не удалось удалить брошенные корзины')
+            finally:
+                connections.close_all()
+
+    _sweeper = threading.Thread(target=run, name='store-cart-sweeper', daemon=True)
+    _sweeper.start()
+    return _sweeper
@@ -0,0 +1,246 @@
+"""
+Потоковый импорт и экспорт каталога (CSV и JSONL) для команд
+import_catalog и export_catalog. Строки читаются и пишутся по одной,
+в базу - пачками через bulk_create / bulk_update.
+"""
+import csv
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Min
+
+from .cache import invalidate_collections
+from .models import Collection, Product, ProductImage, Promotion, touch_products
+from .pricing import recompute_prices
+
+FORMATS = ['csv', 'jsonl']
+LIST_SEPARATOR = ';'  # Списки (promotions) в CSV
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+class RowWriter:
+    def __init__(self, stream, fmt, fields):
+        self.stream = stream
+        self.fmt = fmt
+        self.fields = fields
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(stream, fieldnames=fields)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.fmt == 'csv':
+            self.writer.writerow({
+                key: LIST_SEPARATOR.join(map(str, value)) if isinstance(value, list) else value
+                for key, value in row.items()
+            })
+        else:
+            self.stream.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+
+
+def iter_batches(queryset, batch_size):
+    """Пачки по id (keyset), без OFFSET и без загрузки всей таблицы."""
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_id).order_by('pk')[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1]['id'] if isinstance(batch[-1], dict) else batch[-1].pk
+        yield batch
+
+
+def parse_list(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return value
+    return [item for item in str(value).split(LIST_SEPARATOR) if item]
+
+
+class CollectionIO:
+    """Категории: ключ - title (slug у категорий нет)."""
+    fields = ['id', 'title']
+
+    def export(self, batch_size):
+        for batch in iter_batches(Collection.objects.values(*self.fields), batch_size):
+            yield from batch
+
+    def import_batch(self, rows):
+        titles = {row['title'] for row in rows}
+        existing = set(Collection.objects.filter(title__in=titles).values_list('title', flat=True))
+        new = [Collection(title=title) for title in titles - existing]
+        Collection.objects.bulk_create(new)
+        if new:
+            transaction.on_commit(invalidate_collections)
+        return len(new), 0
+
+
+class PromotionIO:
+    """Акции: ключ - id, строки без id создаются."""
+    fields = ['id', 'description', 'discount']
+
+    def export(self, batch_size):
+        for batch in iter_batches(Promotion.objects.values(*self.fields), batch_size):
+            yield from batch
+
+    def import_batch(self, rows):
+        ids = [int(row['id']) for row in rows if row.get('id')]
+        existing = Promotion.objects.in_bulk(ids)
+        new, changed = [], []
+        for row in rows:
+            promotion = existing.get(int(row['id'])) if row.get('id') else None
+            if promotion is None:
+                promotion = Promotion()
+                new.append(promotion)
+            else:
+                changed.append(promotion)
+            promotion.description = row['description']
+            promotion.discount = float(row['discount'])
+
+        Promotion.objects.bulk_create(new)
+        Promotion.objects.bulk_update(changed, ['description', 'discount'])
+        if changed:  # Скидка могла измениться
+            through = Product.promotion.through.objects
+            recompute_prices(through.filter(promotion_id__in=[p.id for p in changed])
+                             .values_list('product_id', flat=True).distinct())
+        return len(new), len(changed)
+
+
+class ProductIO:
+    """
+    Товары: upsert по slug. Категория - по названию, все категории
+    загружаются одним запросом, недостающие создаются пачкой.
+    promotions - id акций (в CSV через ';'), description - описание:
+    если колонки нет - не трогаем.
+    """
+    fields = ['slug', 'title', 'description', 'unit_price', 'inventory',
+              'collection', 'promotions']
+    update_fields = ['title', 'unit_price', 'inventory', 'collection']
+
+    def __init__(self):
+        self.collections = None
+
+    def export(self, batch_size):
+        queryset = Product.objects.values('id', 'slug', 'title', 'description', 'unit_price',
+                                          'inventory', 'collection__title')
+        through = Product.promotion.through.objects
+        for batch in iter_batches(queryset, batch_size):
+            promotions = {}
+            for product_id, promotion_id in through.filter(
+                    product_id__in=[row['id'] for row in batch]) \
+                    .values_list('product_id', 'promotion_id'):
+                promotions.setdefault(product_id, []).append(promotion_id)
+            for row in batch:
+                row['collection'] = row.pop('collection__title')
+                row['promotions'] = promotions.get(row.pop('id'), [])
+                yield row
+
+    def resolve_collections(self, titles):
+        if self.collections is None:
+            self.collections = dict(Collection.objects.values_list('title', 'id'))
+        missing = [Collection(title=title) for title in set(titles) - set(self.collections)]
+        for collection in Collection.objects.bulk_create(missing):
+            self.collections[collection.title] = collection.id
+        if missing:
+            transaction.on_commit(invalidate_collections)
+
+    def import_batch(self, rows):
+        rows = {row['slug']: row for row in rows}  # Повторный slug - побеждает последний
+        self.resolve_collections(row['collection'] for row in rows.values())
+        existing = dict(Product.objects.filter(slug__in=list(rows)).values('slug')
+                        .annotate(first_id=Min('id')).values_list('slug', 'first_id'))
+
+        new, changed = [], []
+        for slug, row in rows.items():
+            product = Product(
+                id=existing.get(slug),
+                slug=slug,
+                title=row['title'],
+                description=row.get('description') or None,
+                unit_price=Decimal(str(row['unit_price'])),
+                inventory=int(row['inventory']),
+                collection_id=self.collections[row['collection']],
+            )
+            validate_product(product)
+            (changed if product.id else new).append(product)
+
+        Product.objects.bulk_create(new)
+        # Одним UPDATE - товары с одинаковым набором колонок
+        by_fields = {}
+        for product in changed:
+            has_description = 'description' in rows[product.slug]
+            by_fields.setdefault(has_description, []).append(product)
+        for has_description, products in by_fields.items():
+            fields = self.update_fields + ['description'] if has_description \
+                else self.update_fields
+            Product.objects.bulk_update(products, fields)
+        self.set_promotions(rows, new + changed)
+        return len(new), len(changed)
+
+    def set_promotions(self, rows, products):
+        products = [p for p in products if 'promotions' in rows[p.slug]]
+        if not products:
+            return
+        through = Product.promotion.through
+        through.objects.filter(product_id__in=[p.id for p in products]).delete()
+        through.objects.bulk_create([
+            through(product_id=product.id, promotion_id=int(promotion_id))
+            for product in products
+            for promotion_id in parse_list(rows[product.slug]['promotions'])
+        ])
+        recompute_prices([p.id for p in products])
+
+
+def validate_product(product):
+    """Валидаторы модели (цена и остаток от 1, длины): bulk-запись их не вызывает."""
+    try:
+        # Категория уже есть в resolve_collections, проверка ключа - лишний запрос
+        product.clean_fields(exclude=['collection'])
+    except ValidationError as error:
+        # ValueError - команда откатит пачку и назовет строку
+        raise ValueError(f'{product.slug}: {error.message_dict}')
+
+
+class ProductImageIO:
+    """Метаданные картинок (путь в хранилище): ключ - slug товара + image."""
+    fields = ['product', 'image']
+
+    def export(self, batch_size):
+        queryset = ProductImage.objects.values('id', 'product__slug', 'image')
+        for batch in iter_batches(queryset, batch_size):
+            for row in batch:
+                yield {'product': row['product__slug'], 'image': row['image']}
+
+    def import_batch(self, rows):
+        products = dict(Product.objects.filter(slug__in={row['product'] for row in rows})
+                        .values('slug').annotate(first_id=Min('id')).values_list('slug', 'first_id'))
+        existing = set(ProductImage.objects.filter(product_id__in=products.values())
+                       .values_list('product_id', 'image'))
+
+        new = []
+        for row in rows:
+            key = (products[row['product']], row['image'])
+            if key not in existing:
+                existing.add(key)
+                new.append(ProductImage(product_id=key[0], image=key[1]))
+        ProductImage.objects.bulk_create(new)
+        touch_products({image.product_id for image in new})
+        return len(new), 0
+
+
+CATALOG_MODELS = {
+    'collection': CollectionIO,
+    'promotion': PromotionIO,
+    'product': ProductIO,
+    'image': ProductImageIO,
+}
@@ -0,0 +1,64 @@
+from functools import partial
+from hashlib import md5
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified и ответ 304 для list и retrieve.
+
+    Валидаторы считаются одним запросом к базе без сериализации:
+    для объекта - его last_update, для списка - COUNT и MAX(last_update)
+    по отфильтрованному queryset (удаление меняет COUNT, любая запись - MAX).
+    Поэтому last_update должен меняться при каждой записи (auto_now + сигналы).
+    """
+    last_modified_field = 'last_update'
+
+    def get_validator_state(self):
+        """Возвращает (версия, last_modified) или None, если объекта нет."""
+        queryset = self.get_queryset().order_by()
+        if self.action == 'retrieve':
+            lookup = self.lookup_url_kwarg or self.lookup_field
+            last_modified = queryset.filter(**{self.lookup_field: self.kwargs[lookup]}) \
+                .values_list(self.last_modified_field, flat=True).first()
+            if last_modified is None:
+                return None
+            return last_modified.isoformat(), last_modified
+
+        state = self.filter_queryset(queryset).order_by().aggregate(
+            count=Count('pk'), last_modified=Max(self.last_modified_field))
+        last_modified = state['last_modified']
+        version = f"{state['count']}:{last_modified.isoformat() if last_modified else ''}"
+        return version, last_modified
+
+    def conditional_response(self, request, handler):
+        state = self.get_validator_state()
+        if state is None:
+            return handler()
+
+        version, last_modified = state
+        # Разные параметры и форматы - разные представления
+        raw = f'{request.get_host()}{request.get_full_path()}|{request.accepted_renderer.format}|{version}'
+        etag = quote_etag(md5(raw.encode()).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler()
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, partial(super().retrieve, request, *args, **kwargs))
@@ -0,0 +1,91 @@
+"""
+Потоковая выгрузка заказов (NDJSON / CSV). Заказы читаются пачками по id,
+позиции пачки - одним запросом, поэтому память не растет с числом заказов.
+"""
+import csv
+import json
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import OrderItem
+
+ORDER_EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CSV_HEADER = ['order_id', 'placed_at', 'payment_status', 'customer_id',
+              'product_id', 'product_title', 'quantity', 'unit_price']
+
+
+def parse_moment(value):
+    """Дата или дата-время из query-параметра -> aware datetime (или None)."""
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            moment = datetime.combine(day, time.min)
+    except ValueError:  # Формат верный, но такой даты нет: 2020-13-45
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: write() просто возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_order_chunks(queryset, chunk_size):
+    queryset = queryset.order_by('id').values('id', 'placed_at', 'payment_status', 'customer_id')
+    last_id = 0
+    while True:
+        orders = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not orders:
+            return
+        last_id = orders[-1]['id']
+
+        items = {}
+        for item in OrderItem.objects.filter(order_id__in=[order['id'] for order in orders]) \
+                .order_by('id').values('order_id', 'product_id', 'product__title',
+                                       'quantity', 'unit_price'):
+            items.setdefault(item.pop('order_id'), []).append(item)
+        for order in orders:
+            order['items'] = items.get(order['id'], [])
+        yield orders
+
+
+def iter_order_export(queryset, fmt, chunk_size=1000):
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(CSV_HEADER)
+        for orders in iter_order_chunks(queryset, chunk_size):
+            for order in orders:
+                for item in order['items']:
+                    yield writer.writerow([
+                        order['id'], order['placed_at'].isoformat(), order['payment_status'],
+                        order['customer_id'], item['product_id'], item['product__title'],
+                        item['quantity'], item['unit_price'],
+                    ])
+        return
+
+    for orders in iter_order_chunks(queryset, chunk_size):
+        for order in orders:
+            yield json.dumps({
+                'id': order['id'],
+                'placed_at': order['placed_at'].isoformat(),
+                'payment_status': order['payment_status'],
+                'customer': order['customer_id'],
+                'items': [{
+                    'product': {'id': item['product_id'], 'title': item['product__title']},
+                    'quantity': item['quantity'],
+                    'unit_price': str(item['unit_price']),
+                } for item in order['items']],
+            }, ensure_ascii=False) + '\n'
@@ -0,0 +1,179 @@
+"""
+Фасеты каталога: кол-во товаров по категориям, ценовым диапазонам и остатку
+(мало на складе - то же правило, что InventoryFilter в админке: < 10).
+
+Без поиска и фасетных фильтров счетчики читаются из ProductFacet - куба
+(категория, диапазон, остаток), который сигналы товаров обновляют
+инкрементально. Иначе - один GROUP BY по отфильтрованному queryset.
+В обоих случаях все фасеты считаются одним запросом, формат ответа один.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import BooleanField, Case, Count, F, IntegerField, Value, When
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+from tags.filters import TagFilter
+
+from .models import Product, ProductFacet
+
+LOW_INVENTORY = 10
+INVENTORY_LOW = 'low'
+INVENTORY_OK = 'ok'
+FACETS = ['collection', 'price', 'inventory']
+
+
+def get_price_buckets():
+    return list(getattr(settings, 'STORE_PRICE_BUCKETS', []))
+
+
+def get_bucket_bounds():
+    """[(min, max)] по номерам диапазонов, у последнего max = None."""
+    bounds = get_price_buckets()
+    return list(zip([0] + bounds, bounds + [None]))
+
+
+def bucket_label(index):
+    low, high = get_bucket_bounds()[index]
+    return f'{low}-{high}' if high is not None else f'{low}+'
+
+
+def price_bucket(unit_price):
+    buckets = get_price_buckets()
+    for index, bound in enumerate(buckets):
+        if unit_price < bound:
+            return index
+    return len(buckets)
+
+
+def facet_key(collection_id, unit_price, inventory):
+    """Ключ строки ProductFacet для товара."""
+    return collection_id, price_bucket(unit_price), inventory < LOW_INVENTORY
+
+
+def count_rows(queryset):
+    """(collection_id, название, диапазон, мало на складе, кол-во) - одним запросом."""
+    buckets = get_price_buckets()
+    return queryset.order_by().prefetch_related(None).annotate(
+        facet_bucket=Case(
+            *[When(unit_price__lt=bound, then=Value(index)) for index, bound in enumerate(buckets)],
+            default=Value(len(buckets)), output_field=IntegerField()),
+        facet_low=Case(
+            When(inventory__lt=LOW_INVENTORY, then=Value(True)),
+            default=Value(False), output_field=BooleanField()),
+    ).values_list('collection_id', 'collection__title', 'facet_bucket', 'facet_low') \
+        .annotate(count=Count('pk'))
+
+
+def precomputed_rows(collection_id=None):
+    queryset = ProductFacet.objects.filter(products_count__gt=0)
+    if collection_id is not None:
+        queryset = queryset.filter(collection_id=collection_id)
+    return queryset.values_list('collection_id', 'collection__title', 'price_bucket',
+                                'low_inventory', 'products_count')
+
+
+def build_facets(rows, names):
+    collections = {}
+    prices = Counter()
+    inventory = Counter()
+    for collection_id, title, bucket, low, count in rows:
+        entry = collections.setdefault(collection_id,
+                                       {'id': collection_id, 'title': title, 'count': 0})
+        entry['count'] += count
+        prices[bucket] += count
+        inventory[INVENTORY_LOW if low else INVENTORY_OK] += count
+
+    facets = {}
+    if 'collection' in names:
+        facets['collection'] = sorted(collections.values(), key=lambda entry: entry['title'])
+    if 'price' in names:
+        facets['price'] = [
+            {'value': bucket_label(index), 'min': low, 'max': high, 'count': prices[index]}
+            for index, (low, high) in enumerate(get_bucket_bounds())
+        ]
+    if 'inventory' in names:
+        facets['inventory'] = [{'value': value, 'count': inventory[value]}
+                               for value in (INVENTORY_LOW, INVENTORY_OK)]
+    return facets
+
+
+def parse_facet_names(value):
+    """?facets=price,inventory - выбранные фасеты, пусто или 'all' - все."""
+    names = [name for name in (value or '').split(',') if name in FACETS]
+    return names or FACETS
+
+
+def get_facets(request, queryset, names=FACETS):
+    """
+    queryset - уже отфильтрованный вьюсетом. collection_id - единственный
+    фильтр, который есть в кубе, с остальными (и ?tag=) считаем по queryset.
+    """
+    params = request.query_params
+    if any(params.get(param) for param in ProductFacetFilter.filter_params()):
+        rows = count_rows(queryset)
+    else:
+        rows = precomputed_rows(params.get('collection_id'))
+    return build_facets(rows, names)
+
+
+class ProductFacetFilter(BaseFilterBackend):
+    """Фильтры по значениям фасетов: ?price=10-50 и ?inventory=low|ok."""
+    price_query_param = 'price'
+    inventory_query_param = 'inventory'
+
+    @classmethod
+    def filter_params(cls):
+        return [api_settings.SEARCH_PARAM, TagFilter.tag_query_param,
+                cls.price_query_param, cls.inventory_query_param]
+
+    def filter_queryset(self, request, queryset, view):
+        price = request.query_params.get(self.price_query_param)
+        if price:
+            bounds = {bucket_label(index): bound
+                      for index, bound in enumerate(get_bucket_bounds())}
+            if price not in bounds:
+                raise ValidationError({self.price_query_param: 'Неизвестный ценовой диапазон'})
+            low, high = bounds[price]
+            queryset = queryset.filter(unit_price__gte=low)
+            if high is not None:
+                queryset = queryset.filter(unit_price__lt=high)
+
+        inventory = request.query_params.get(self.inventory_query_param)
+        if inventory == INVENTORY_LOW:
+            queryset = queryset.filter(inventory__lt=LOW_INVENTORY)
+        elif inventory == INVENTORY_OK:
+            queryset = queryset.filter(inventory__gte=LOW_INVENTORY)
+        elif inventory:
+            raise ValidationError({self.inventory_query_param: 'Допустимо: low, ok'})
+        return queryset
+
+
+# Поддержка куба - вызывается из signals.handlers
+
+def apply_deltas(deltas):
+    """{ключ фасета: +-n} - атомарные F-обновления, недостающие строки создаются."""
+    deltas = {key: delta for key, delta in deltas.items() if delta and key[0] is not None}
+    ProductFacet.objects.bulk_create([
+        ProductFacet(collection_id=collection_id, price_bucket=bucket, low_inventory=low)
+        for (collection_id, bucket, low), delta in deltas.items() if delta > 0
+    ], ignore_conflicts=True)
+    for (collection_id, bucket, low), delta in deltas.items():
+        ProductFacet.objects.filter(
+            collection_id=collection_id, price_bucket=bucket, low_inventory=low,
+        ).update(products_count=F('products_count') + delta)
+
+
+def refresh_collections(collection_ids):
+    """Пересчет куба для категорий - после массовых операций с товарами."""
+    collection_ids = [pk for pk in set(collection_ids) if pk is not None]
+    if not collection_ids:
+        return
+    ProductFacet.objects.filter(collection_id__in=collection_ids).delete()
+    ProductFacet.objects.bulk_create([
+        ProductFacet(collection_id=collection_id, price_bucket=bucket,
+                     low_inventory=low, products_count=count)
+        for collection_id, _, bucket, low, count
+        in count_rows(Product.objects.filter(collection_id__in=collection_ids))
+    ])
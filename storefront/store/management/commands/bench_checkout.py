@@ -0,0 +1,142 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from time import monotonic, sleep
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections
+from django.db.models import Sum
+from store.models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product
+from store.serializers import CreateOrderSerializer, OutOfStockError
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест оформления заказов: параллельные покупки одних и тех же ' \
+           'товаров, проверка что склад не ушел в минус. --readers - параллельно ' \
+           'читают каталог. Пишет в настроенную базу и удаляет свои данные в конце ' \
+           '(кроме --keep)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=0,
+                            help='Потоков, читающих товары, пока идут оформления')
+        parser.add_argument('--read-pause', type=float, default=0.005,
+                            help='Секунд между чтениями потока: читатели в одном процессе '
+                                 'без паузы отнимают GIL у оформлений')
+        parser.add_argument('--checkouts', type=int, default=400)
+        parser.add_argument('--skus', type=int, default=3)
+        parser.add_argument('--stock', type=int, default=100, help='Остаток каждого товара')
+        parser.add_argument('--retries', type=int, default=200,
+                            help='Повторов при "database is locked"')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Не удалять данные теста')
+
+    def handle(self, *args, threads, readers, read_pause, checkouts, skus, stock, retries,
+               seed, keep, **options):
+        rng = random.Random(seed)
+        marker = f'bench-{uuid4().hex[:8]}'
+        collection = Collection.objects.create(title=marker)
+        products = [Product.objects.create(title=f'{marker}-{number}', slug=marker,
+                                           unit_price=10, inventory=stock,
+                                           collection=collection)
+                    for number in range(skus)]
+        users = [get_user_model().objects.create(username=f'{marker}-{number}',
+                                                 email=f'{marker}-{number}@bench.local')
+                 for number in range(threads)]
+        carts = []
+        for number in range(checkouts):
+            cart = Cart.objects.create()
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product=product, quantity=rng.randint(1, 2))
+                for product in rng.sample(products, rng.randint(1, skus))
+            ])
+            carts.append((users[number % threads].id, cart.id))
+        customers = dict(Customer.objects.filter(user__in=users).values_list('user_id', 'id'))
+
+        results = {'ok': 0, 'out_of_stock': 0, 'locked': 0}
+
+        def checkout(user_id, cart_id):
+            try:
+                for attempt in range(retries + 1):
+                    try:
+                        serializer = CreateOrderSerializer(
+                            data={'cart_id': cart_id}, context={'customer_id': customers[user_id]})
+                        serializer.is_valid(raise_exception=True)
+                        serializer.save()
+                        return 'ok'
+                    except OutOfStockError:
+                        return 'out_of_stock'
+                    except OperationalError:  # SQLite: писатель один, ждем и повторяем
+                        results['locked'] += 1
+                        sleep(0.001 * 2 ** min(attempt, 7) * rng.random())
+                raise CommandError(f'Корзина {cart_id}: база занята {retries} раз подряд')
+            finally:
+                close_old_connections()  # Как в конце запроса: с CONN_MAX_AGE не закрывает
+
+        done = Event()
+        reads = {'count': 0, 'locked': 0, 'slowest': 0}
+
+        def read_catalog():
+            try:
+                while not done.is_set():
+                    started = monotonic()
+                    try:
+                        list(Product.objects.filter(collection=collection)
+                             .values_list('id', 'inventory', 'last_update'))
+                    except OperationalError:
+                        reads['locked'] += 1
+                        continue
+                    reads['count'] += 1
+                    reads['slowest'] = max(reads['slowest'], monotonic() - started)
+                    sleep(read_pause)
+            finally:
+                close_old_connections()
+
+        started = monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=threads + readers) as pool:
+                reader_futures = [pool.submit(read_catalog) for _ in range(readers)]
+                try:
+                    for outcome in pool.map(lambda args: checkout(*args), carts):
+                        results[outcome] += 1
+                finally:
+                    done.set()
+                for future in reader_futures:
+                    future.result()
+            elapsed = monotonic() - started
+
+            sold = dict(OrderItem.objects.filter(product__in=products).values('product_id')
+                        .annotate(total=Sum('quantity')).values_list('product_id', 'total'))
+            remaining = dict(Product.objects.filter(pk__in=[p.pk for p in products])
+                             .values_list('id', 'inventory'))
+            oversold = [product_id for product_id, inventory in remaining.items()
+                        if inventory < 0 or sold.get(product_id, 0) + inventory != stock]
+            for product_id, inventory in sorted(remaining.items()):
+                self.stdout.write(f'Товар {product_id}: продано {sold.get(product_id, 0)}, '
+                                  f'осталось {inventory} из {stock}')
+            self.stdout.write(
+                f'Заказов: {results["ok"]}, отказов (нет на складе): {results["out_of_stock"]}, '
+                f'повторов из-за блокировки: {results["locked"]}')
+            self.stdout.write(f'{checkouts} оформлений за {elapsed:.2f} с: '
+                              f'{checkouts / elapsed:.0f} попыток/с, '
+                              f'{results["ok"] / elapsed:.0f} заказов/с')
+            if readers:
+                self.stdout.write(f'Чтений: {reads["count"]} ({reads["count"] / elapsed:.0f}/с), '
+                                  f'ошибок блокировки: {reads["locked"]}, '
+                                  f'самое долгое {reads["slowest"] * 1000:.0f} мс')
+            if oversold:
+                raise CommandError(f'Перепродажа товаров: {oversold}')
+            self.stdout.write(self.style.SUCCESS('Перепродаж нет'))
+        finally:
+            if not keep:
+                orders = Order.objects.filter(customer__user__in=users)
+                OrderItem.objects.filter(order__in=orders).delete()
+                orders.delete()
+                Cart.objects.filter(pk__in=[cart_id for _, cart_id in carts]).delete()
+                # Свежие строки: счетчики и фасеты уменьшаются по текущему остатку
+                for product in Product.objects.filter(pk__in=[p.pk for p in products]):
+                    product.delete()
+                collection.delete()
+                get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
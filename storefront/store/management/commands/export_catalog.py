@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from store.catalog_io import CATALOG_MODELS, FORMATS, RowWriter
+
+
+class Command(BaseCommand):
+    help = 'Потоковый экспорт каталога в CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=list(CATALOG_MODELS))
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument('--output', default='-', help='Файл, по умолчанию stdout')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, model, format, output, batch_size, **options):
+        io = CATALOG_MODELS[model]()
+        stream = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8', newline='')
+        try:
+            writer = RowWriter(stream, format, io.fields)
+            count = 0
+            for row in io.export(batch_size):
+                writer.write(row)
+                count += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        self.stderr.write(f'Выгружено строк: {count}')
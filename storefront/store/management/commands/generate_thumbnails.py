@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from store.catalog_io import iter_batches
+from store.models import ProductImage
+from store.thumbnails import get_storage, get_variant_sizes, hash_file, run_in_worker, \
+    variant_path
+
+
+class Command(BaseCommand):
+    help = 'Строит недостающие варианты картинок товаров ' \
+           '(и хеши картинок, загруженных без них)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--force', action='store_true',
+                            help='Перестроить и уже готовые варианты')
+
+    def handle(self, *args, batch_size, workers, force, **options):
+        started = monotonic()
+        storage = get_storage()
+
+        hashed = 0
+        queryset = ProductImage.objects.filter(content_hash='').exclude(image='') \
+            .values('id', 'image')
+        for batch in iter_batches(queryset, batch_size):
+            for row in batch:
+                if not storage.exists(row['image']):
+                    self.stderr.write(f'Нет файла {row["image"]} (картинка {row["id"]})')
+                    continue
+                with storage.open(row['image']) as file:
+                    content_hash = hash_file(file)
+                ProductImage.objects.filter(pk=row['id']).update(content_hash=content_hash)
+                hashed += 1
+
+        hashes = ProductImage.objects.exclude(content_hash='')
+        if not force:
+            hashes = hashes.filter(variants={})
+        hashes = list(hashes.order_by().values_list('content_hash', flat=True).distinct())
+        if force:
+            for content_hash in hashes:
+                for name in get_variant_sizes():
+                    storage.delete(variant_path(content_hash, name))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            done = sum(1 for variants in pool.map(run_in_worker, hashes) if variants)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Хешей: {hashed}, картинок с вариантами: {done} из {len(hashes)} '
+            f'за {monotonic() - started:.2f} с'))
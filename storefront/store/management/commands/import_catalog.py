@@ -0,0 +1,49 @@
+from itertools import islice
+from time import monotonic
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from store.catalog_io import CATALOG_MODELS, FORMATS, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт каталога из CSV или JSONL пачками (upsert)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=list(CATALOG_MODELS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='По умолчанию - по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, model, path, format, batch_size, **options):
+        format = format or ('csv' if path.endswith('.csv') else 'jsonl')
+        io = CATALOG_MODELS[model]()
+        total_created = total_updated = 0
+        started = monotonic()
+
+        with open(path, encoding='utf-8', newline='') as stream:
+            rows = read_rows(stream, format)
+            number = 0
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                number += 1
+                batch_started = monotonic()
+                try:
+                    with transaction.atomic():  # Ошибка откатывает только эту пачку
+                        created, updated = io.import_batch(batch)
+                except (KeyError, ValueError, ArithmeticError) as error:
+                    raise CommandError(f'Пачка {number}: некорректная строка ({error!r}). '
+                                       f'Предыдущие пачки сохранены')
+                total_created += created
+                total_updated += updated
+                elapsed = monotonic() - batch_started
+                self.stdout.write(f'Пачка {number}: {len(batch)} строк, создано {created}, '
+                                  f'обновлено {updated}, {len(batch) / elapsed:.0f} строк/с')
+
+        elapsed = monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: создано {total_created}, обновлено {total_updated} '
+            f'за {elapsed:.1f} с'))
@@ -0,0 +1,32 @@
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from store.outbox import deliver_pending, purge_delivered
+
+
+class Command(BaseCommand):
+    help = 'Доставляет события outbox (order_created) получателям сигналов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'STORE_OUTBOX_BATCH_SIZE', 100))
+        parser.add_argument('--poll-interval', type=float,
+                            default=getattr(settings, 'STORE_OUTBOX_POLL_INTERVAL', 5))
+        parser.add_argument('--purge-days', type=float, default=7,
+                            help='Удалять доставленные события старше N дней')
+        parser.add_argument('--once', action='store_true',
+                            help='Доставить готовые события и выйти')
+
+    def handle(self, *args, batch_size, poll_interval, purge_days, once, **options):
+        while True:
+            started = monotonic()
+            count = deliver_pending(batch_size)
+            if count:
+                self.stdout.write(f'Событий: {count} за {monotonic() - started:.2f} с')
+            purged = purge_delivered(purge_days)
+            if purged:
+                self.stdout.write(f'Удалено доставленных: {purged}')
+            if once:
+                return
+            sleep(poll_interval)
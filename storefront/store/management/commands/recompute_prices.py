@@ -0,0 +1,23 @@
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from store.catalog_io import iter_batches
+from store.models import Product
+from store.pricing import recompute_prices
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Product.effective_price (акции + налог) пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        changed = 0
+        started = monotonic()
+        for batch in iter_batches(Product.objects.values('id'), batch_size):
+            with transaction.atomic():
+                changed += recompute_prices([row['id'] for row in batch], batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Изменено цен: {changed} за {monotonic() - started:.2f} с'))
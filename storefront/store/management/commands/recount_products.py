@@ -0,0 +1,44 @@
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from store.cache import invalidate_collections
+from store.models import Collection, Product
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Collection.products_count пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, batch_size, **options):
+        counts = Product.objects.filter(collection=OuterRef('pk')).order_by() \
+            .values('collection').annotate(count=Count('pk')).values('count')
+        last_id = 0
+        fixed = 0
+        started = monotonic()
+
+        while True:
+            batch = list(Collection.objects.filter(pk__gt=last_id).order_by('pk')
+                         .values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                stale = Collection.objects.filter(pk__in=batch) \
+                    .annotate(actual=Coalesce(Subquery(counts), 0)) \
+                    .exclude(products_count=F('actual')) \
+                    .values_list('pk', 'actual')
+                for collection_id, actual in list(stale):
+                    Collection.objects.filter(pk=collection_id).update(
+                        products_count=actual, last_update=timezone.now())
+                    fixed += 1
+            last_id = batch[-1]
+
+        if fixed:
+            invalidate_collections()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено категорий: {fixed} за {monotonic() - started:.2f} с'))
@@ -0,0 +1,35 @@
+from datetime import timedelta
+from time import monotonic
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from store.carts import get_cart_ttl, sweep_carts
+
+
+class Command(BaseCommand):
+    help = 'Удаляет брошенные корзины (без активности дольше TTL) пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-days', type=float,
+                            help='По умолчанию STORE_CART_TTL_DAYS')
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'STORE_CART_SWEEP_BATCH_SIZE', 500))
+        parser.add_argument('--pause', type=float,
+                            default=getattr(settings, 'STORE_CART_SWEEP_PAUSE', 0.1),
+                            help='Секунд между пачками')
+        parser.add_argument('--max-batches', type=int)
+
+    def handle(self, *args, ttl_days, batch_size, pause, max_batches, **options):
+        ttl = timedelta(days=ttl_days) if ttl_days is not None else get_cart_ttl()
+        total_carts = total_items = 0
+        started = monotonic()
+        for number, (carts, items, seconds) in enumerate(
+                sweep_carts(ttl, batch_size, pause, max_batches), start=1):
+            total_carts += carts
+            total_items += items
+            self.stdout.write(f'Пачка {number}: корзин {carts}, позиций {items} '
+                              f'за {seconds:.3f} с ({(carts + items) / max(seconds, 1e-6):.0f} строк/с)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено корзин: {total_carts}, позиций: {total_items} '
+            f'за {monotonic() - started:.2f} с'))
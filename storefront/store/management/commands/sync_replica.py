@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from store.routers import get_replicas
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в файлы реплик (локальная замена репликации)'
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError('Реплик нет: задайте STORE_DB_REPLICA')
+        for alias in [DEFAULT_DB_ALIAS] + replicas:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'{alias}: не SQLite, реплику обновляет сама СУБД')
+
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        try:
+            for alias in replicas:
+                connections[alias].close()
+                target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                try:
+                    source.backup(target)  # Согласованный снимок, даже если в базу пишут
+                finally:
+                    target.close()
+                self.stdout.write(f'{alias}: {connections[alias].settings_dict["NAME"]}')
+        finally:
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f'Обновлено реплик: {len(replicas)}'))
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.5 on 2026-10-18 15:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_products_count(apps, schema_editor):
+    Collection = apps.get_model('store', 'Collection')
+    Product = apps.get_model('store', 'Product')
+    counts = Product.objects.filter(collection=OuterRef('pk')).order_by() \
+        .values('collection').annotate(count=Count('pk')).values('count')
+    Collection.objects.update(products_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_last_update_auto_now'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='products_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='Кол-во товаров'),
+        ),
+        migrations.RunPython(fill_products_count, migrations.RunPython.noop),
+    ]
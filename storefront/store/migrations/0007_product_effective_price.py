@@ -0,0 +1,41 @@
+# Generated by Django 4.2.5 on 2026-10-18 15:59
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def fill_effective_price(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    for product in Product.objects.prefetch_related('promotion').iterator(chunk_size=1000):
+        price = product.unit_price
+        for promotion in product.promotion.all():
+            discount = min(max(Decimal(str(promotion.discount)), Decimal(0)), Decimal(100))
+            price = price * (1 - discount / 100)
+        product.effective_price = round(price * Decimal(1.1), 2)
+        product.save(update_fields=['effective_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_orderitem_related_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=8, verbose_name='Итоговая цена'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=8, verbose_name='Цена'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='store_produ_effecti_707a96_idx'),
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+    ]
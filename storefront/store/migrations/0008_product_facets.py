@@ -0,0 +1,53 @@
+# Generated by Django 4.2.5 on 2026-10-18 16:02
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_product_facets(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductFacet = apps.get_model('store', 'ProductFacet')
+    buckets = list(getattr(settings, 'STORE_PRICE_BUCKETS', []))
+    counts = Counter()
+    for collection_id, unit_price, inventory in Product.objects \
+            .values_list('collection_id', 'unit_price', 'inventory').iterator(chunk_size=1000):
+        bucket = next((index for index, bound in enumerate(buckets) if unit_price < bound),
+                      len(buckets))
+        counts[collection_id, bucket, inventory < 10] += 1
+    ProductFacet.objects.bulk_create([
+        ProductFacet(collection_id=collection_id, price_bucket=bucket,
+                     low_inventory=low, products_count=count)
+        for (collection_id, bucket, low), count in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_bucket', models.PositiveSmallIntegerField(verbose_name='Ценовой диапазон')),
+                ('low_inventory', models.BooleanField(verbose_name='Мало на складе')),
+                ('products_count', models.PositiveIntegerField(default=0, verbose_name='Кол-во товаров')),
+                ('collection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='store.collection', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Фасет каталога',
+                'verbose_name_plural': 'Фасеты каталога',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productfacet',
+            constraint=models.UniqueConstraint(fields=('collection', 'price_bucket', 'low_inventory'), name='store_productfacet_unique_key'),
+        ),
+        migrations.RunPython(fill_product_facets, migrations.RunPython.noop),
+    ]
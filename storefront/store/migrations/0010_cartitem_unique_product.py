@@ -0,0 +1,31 @@
+# Generated by Django 4.2.5 on 2026-10-18 16:06
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    # Раньше параллельные добавления могли создать две позиции одного товара
+    CartItem = apps.get_model('store', 'CartItem')
+    duplicates = CartItem.objects.values('cart_id', 'product_id') \
+        .annotate(rows=Count('id'), first_id=Min('id'), total=Sum('quantity')) \
+        .filter(rows__gt=1)
+    for row in duplicates:
+        items = CartItem.objects.filter(cart_id=row['cart_id'], product_id=row['product_id'])
+        items.exclude(pk=row['first_id']).delete()
+        items.update(quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_productimage_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='store_cartitem_unique_product'),
+        ),
+    ]
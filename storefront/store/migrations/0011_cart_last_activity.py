@@ -0,0 +1,27 @@
+# Generated by Django 4.2.5 on 2026-10-18 16:09
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def fill_last_activity(apps, schema_editor):
+    # Для старых корзин точнее времени создания ничего нет
+    Cart = apps.get_model('store', 'Cart')
+    Cart.objects.update(last_activity=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_cartitem_unique_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='last_activity',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Последняя активность'),
+        ),
+        migrations.RunPython(fill_last_activity, migrations.RunPython.noop),
+    ]
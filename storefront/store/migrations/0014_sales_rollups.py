@@ -0,0 +1,57 @@
+# Generated by Django 4.2.5 on 2026-10-18 16:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_order_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='sales_status',
+            field=models.CharField(blank=True, choices=[('P', 'Pending'), ('C', 'Complete'), ('F', 'Failed')], editable=False, max_length=1, null=True),
+        ),
+        migrations.CreateModel(
+            name='SalesHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_status', models.CharField(choices=[('P', 'Pending'), ('C', 'Complete'), ('F', 'Failed')], max_length=1, verbose_name='Статус оплаты')),
+                ('units', models.IntegerField(default=0, verbose_name='Штук')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Продажи за час',
+                'verbose_name_plural': 'Продажи по часам',
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_status', models.CharField(choices=[('P', 'Pending'), ('C', 'Complete'), ('F', 'Failed')], max_length=1, verbose_name='Статус оплаты')),
+                ('units', models.IntegerField(default=0, verbose_name='Штук')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('day', models.DateField(verbose_name='День')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Продажи за день',
+                'verbose_name_plural': 'Продажи по дням',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='saleshourly',
+            constraint=models.UniqueConstraint(fields=('hour', 'product', 'payment_status'), name='store_saleshourly_unique_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesdaily',
+            constraint=models.UniqueConstraint(fields=('day', 'product', 'payment_status'), name='store_salesdaily_unique_key'),
+        ),
+    ]
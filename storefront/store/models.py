@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import connections, models, transaction
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from uuid import uuid4
 from django.conf import settings
 from django.contrib import admin
+from .signals import products_bulk_saved
 
 # Create your models here.
 
@@ -22,16 +24,152 @@ class Collection(models.Model):
                                         null=True, blank=True,
                                         related_name='+',
                                         verbose_name='Рекомендуемый товар')
+    # Меняется и при изменении состава товаров категории (см. signals.handlers)
+    last_update = models.DateTimeField(auto_now=True, verbose_name='Время обновления')
+    # Денормализованный счетчик вместо annotate(Count('products')).
+    # Пересчитать: manage.py recount_products
+    products_count = models.PositiveIntegerField(default=0, db_index=True,
+                                                 verbose_name='Кол-во товаров')
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # products_count меняют только сигналы товаров (F) и recount_products:
+        # полное сохранение давно загруженной категории не возвращает старое значение
+        if not self._state.adding and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'products_count']
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
         ordering = ['title']  # Сортировка в админке
 
 
+class ProductQuerySet(models.QuerySet):
+    """
+    Массовые операции шлют products_bulk_saved, чтобы счетчики категорий,
+    поисковый индекс и кеш обновлялись так же, как при save().
+    bulk_create - только для новых товаров (без update_conflicts).
+    """
+    update_batch_size = 500
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .pricing import calculate_effective_price
+        objs = list(objs)
+        for obj in objs:  # У новых товаров еще нет акций
+            obj.effective_price = calculate_effective_price(obj.unit_price)
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            products_bulk_saved.send(sender=self.model, created=True, fields=None,
+                                     product_ids=[obj.pk for obj in objs],
+                                     old_collections={})
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        """
+        В отличие от QuerySet.bulk_update (CASE WHEN на каждую строку, что
+        на больших пачках упирается в Python) - один UPDATE через executemany.
+        batch_size - товаров на executemany и сигнал, все пачки в одной транзакции.
+        """
+        objs = list(objs)
+        if batch_size and len(objs) > batch_size:
+            with transaction.atomic(using=self.db, savepoint=False):
+                return sum(self.bulk_update(objs[start:start + batch_size], fields)
+                           for start in range(0, len(objs), batch_size))
+        fields = [self.model._meta.get_field(name) for name in fields]
+        now = timezone.now()
+        for obj in objs:
+            obj.last_update = now  # bulk_update не применяет auto_now
+        last_update = self.model._meta.get_field('last_update')
+        if last_update not in fields:
+            fields.append(last_update)
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+            quote(self.model._meta.db_table),
+            ', '.join(f'{quote(field.column)} = %s' for field in fields),
+            quote(self.model._meta.pk.column),
+        )
+        params = [
+            [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields]
+            + [obj.pk]
+            for obj in objs
+        ]
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            old_collections = {}
+            if any(field.name == 'collection' for field in fields):
+                old_collections = dict(self.model.objects.filter(pk__in=[obj.pk for obj in objs])
+                                       .values_list('id', 'collection_id'))
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, params)
+            products_bulk_saved.send(sender=self.model, created=False,
+                                     fields=[field.name for field in fields],
+                                     product_ids=[obj.pk for obj in objs],
+                                     old_collections=old_collections)
+        return len(objs)
+
+    def update(self, **kwargs):
+        """
+        Пачками по id (keyset): ни вся таблица в памяти, ни pk__in больше
+        update_batch_size параметров. Пачка - UPDATE и сигнал. Следующая
+        пачка берется после id предыдущей, поэтому фильтр по меняемым полям
+        не пропускает и не повторяет строки.
+        """
+        kwargs.setdefault('last_update', timezone.now())
+        moved = 'collection' in kwargs or 'collection_id' in kwargs
+        rows = last_id = 0
+        with transaction.atomic(using=self.db, savepoint=False):
+            while True:
+                # Запоминаем до обновления: фильтр может зависеть от меняемых полей
+                old_collections = dict(self.filter(pk__gt=last_id).order_by('pk')
+                                       .values_list('id', 'collection_id')[:self.update_batch_size])
+                if not old_collections:
+                    break
+                product_ids = list(old_collections)
+                rows += models.QuerySet.update(self.filter(pk__in=product_ids), **kwargs)
+                products_bulk_saved.send(sender=self.model, created=False, fields=list(kwargs),
+                                         product_ids=product_ids,
+                                         old_collections=old_collections if moved else {})
+                if len(product_ids) < self.update_batch_size:
+                    break
+                last_id = product_ids[-1]
+        return rows
+
+
+    def decrement_inventory(self, quantities):
+        """
+        Списывает остатки {product_id: quantity} условными UPDATE
+        ... SET inventory = inventory - n WHERE inventory >= n: проверка и
+        списание атомарны, продать больше остатка нельзя. Товары идут по
+        возрастанию id - параллельные оформления блокируют строки в одном
+        порядке и не ловят дедлок. Возвращает id товаров, которых не хватило
+        (на первом же прекращает); откатывает транзакцию вызывающий.
+        """
+        now = timezone.now()
+        decremented = {}
+        with transaction.atomic(using=self.db, savepoint=False):
+            for product_id in sorted(quantities):
+                quantity = quantities[product_id]
+                # Базовый update: один сигнал на все товары ниже, а не на каждый
+                rows = models.QuerySet.update(
+                    self.filter(pk=product_id, inventory__gte=quantity),
+                    inventory=models.F('inventory') - quantity, last_update=now)
+                if not rows:
+                    return [product_id]
+                decremented[product_id] = -quantity
+            products_bulk_saved.send(sender=self.model, created=False,
+                                     fields=['inventory', 'last_update'],
+                                     product_ids=list(decremented), old_collections={},
+                                     inventory_deltas=decremented)
+        return []
+
+
 class Product(models.Model):
     title = models.CharField(max_length=255, verbose_name='Наименование товара')
     slug = models.SlugField()  #  product/1  -> product/iphone-15-pro-max
@@ -41,19 +179,67 @@ class Product(models.Model):
                                      verbose_name='Цена за шт')
     inventory = models.IntegerField(validators=[MinValueValidator(1)],
                                     verbose_name='Кол-во на складе')
-    last_update = models.DateTimeField(auto_now_add=True, verbose_name='Время обновления')
+    # Версия товара для ETag: меняется при каждой записи, в т.ч. картинок и акций
+    last_update = models.DateTimeField(auto_now=True, verbose_name='Время обновления')
     collection = models.ForeignKey(Collection, on_delete=models.PROTECT,
                                    verbose_name='Категория', related_name='products')
     # Как обращаться к детям из родительской модели
     promotion = models.ManyToManyField(Promotion, blank=True)
+    # Цена с акциями и налогом, считается в store.pricing - не редактировать руками
+    effective_price = models.DecimalField(max_digits=8, decimal_places=2, default=0,
+                                          editable=False, verbose_name='Итоговая цена')
+
+    objects = ProductQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Вместе со счетчиком products_count категории (signals.handlers)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['title']
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
+        # Индексы под курсорную пагинацию: (поле сортировки, id)
+        indexes = [
+            models.Index(fields=['title', 'id']),
+            models.Index(fields=['unit_price', 'id']),
+            models.Index(fields=['last_update', 'id']),
+            models.Index(fields=['effective_price', 'id']),
+        ]
+
+
+def touch_products(product_ids):
+    """
+    Картинки, акции, тэги - часть товара, но их bulk-операции и сигналы
+    товар не сохраняют: обновляем его last_update (ETag) и кеш.
+    """
+    Product.objects.filter(pk__in=list(product_ids)).update(last_update=timezone.now())
+
+
+class ProductFacet(models.Model):
+    """
+    Предпосчитанные фасеты каталога: кол-во товаров на каждую комбинацию
+    (категория, ценовой диапазон, мало на складе). Поддерживается
+    инкрементально сигналами товаров, см. store.facets.
+    Пересчитать: manage.py rebuild_facets
+    """
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE,
+                                   related_name='facets', verbose_name='Категория')
+    price_bucket = models.PositiveSmallIntegerField(verbose_name='Ценовой диапазон')
+    low_inventory = models.BooleanField(verbose_name='Мало на складе')
+    products_count = models.PositiveIntegerField(default=0, verbose_name='Кол-во товаров')
+
+    class Meta:
+        verbose_name = 'Фасет каталога'
+        verbose_name_plural = 'Фасеты каталога'
+        constraints = [
+            models.UniqueConstraint(fields=['collection', 'price_bucket', 'low_inventory'],
+                                    name='store_productfacet_unique_key'),
+        ]
 
 class Customer(models.Model):
     # Статусы покупателей
@@ -95,6 +281,10 @@ class Cart(models.Model):
     # Сделаем сложно генерируемый id чтобы сложнее было подобрать
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Обновляется записями позиций (store.carts.touch_cart), по нему
+    # удаляются брошенные корзины: manage.py sweep_carts
+    last_activity = models.DateTimeField(default=timezone.now, db_index=True,
+                                         verbose_name='Последняя активность')
 
 
 class CartItem(models.Model):
@@ -103,6 +293,25 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='Товар')
     quantity = models.PositiveIntegerField(verbose_name='Количество товаров')
 
+    class Meta:
+        # Повторное добавление товара увеличивает quantity (store.carts)
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'],
+                                    name='store_cartitem_unique_product'),
+        ]
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """total_price - сумма позиций, считается в SQL подзапросом по заказу."""
+        line = models.ExpressionWrapper(
+            models.F('quantity') * models.F('unit_price'),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        totals = OrderItem.objects.filter(order_id=models.OuterRef('pk')) \
+            .order_by().values('order_id').annotate(total=models.Sum(line)).values('total')
+        return self.annotate(total_price=models.Subquery(
+            totals, output_field=models.DecimalField(max_digits=12, decimal_places=2)))
+
 
 class Order(models.Model):
     PAYMENT_STATUS_PENDING = 'P'
@@ -120,17 +329,75 @@ class Order(models.Model):
                                       default=PAYMENT_STATUS_PENDING,
                                       verbose_name='Статус оплаты')
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
+    # Статус, под которым позиции учтены в сводках продаж (None - еще не учтены),
+    # см. store.sales
+    sales_status = models.CharField(max_length=1, choices=PAYMENT_STATUS_CHOICES,
+                                    null=True, blank=True, editable=False)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        # История заказов: курсор по (placed_at, id) внутри покупателя,
+        # для персонала и выгрузки - по всем заказам
+        indexes = [
+            models.Index(fields=['customer', 'placed_at', 'id']),
+            models.Index(fields=['placed_at', 'id']),
+        ]
 
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.PROTECT, verbose_name='Заказ')
+    order = models.ForeignKey(Order, on_delete=models.PROTECT, verbose_name='Заказ',
+                              related_name='items')
     product = models.ForeignKey(Product, on_delete=models.PROTECT, verbose_name='Товар')
     quantity = models.PositiveIntegerField(verbose_name='Кол-во заказанного')
-    unit_price = models.DecimalField(max_digits=6, decimal_places=2, verbose_name='Цена')
+    # Итоговая цена (с акциями и налогом) может быть больше 9999.99
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2, verbose_name='Цена')
     # Цена товара может поменяться после покупки. А нам нужно сохранить цену отдельно
     # На момент покупки
 
 
+class SalesRollup(models.Model):
+    """
+    Сводка продаж: штуки и выручка товара за период по статусу оплаты.
+    Поддерживается инкрементально, см. store.sales.
+    Пересчитать: manage.py backfill_sales --rebuild
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+',
+                                verbose_name='Товар')
+    payment_status = models.CharField(max_length=1, choices=Order.PAYMENT_STATUS_CHOICES,
+                                      verbose_name='Статус оплаты')
+    units = models.IntegerField(default=0, verbose_name='Штук')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                  verbose_name='Выручка')
+
+    class Meta:
+        abstract = True
+
+
+class SalesDaily(SalesRollup):
+    day = models.DateField(verbose_name='День')
+
+    class Meta:
+        verbose_name = 'Продажи за день'
+        verbose_name_plural = 'Продажи по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product', 'payment_status'],
+                                    name='store_salesdaily_unique_key'),
+        ]
+
+
+class SalesHourly(SalesRollup):
+    hour = models.DateTimeField(verbose_name='Час')
+
+    class Meta:
+        verbose_name = 'Продажи за час'
+        verbose_name_plural = 'Продажи по часам'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'product', 'payment_status'],
+                                    name='store_saleshourly_unique_key'),
+        ]
+
+
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE,
                                 related_name='reviews')  # product.reviews.all()
@@ -152,3 +419,30 @@ from .validators import validate_file_size
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='store/images', validators=[validate_file_size])
+    # sha256 файла: одинаковые загрузки хранятся один раз (store.thumbnails)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    # Уменьшенные копии: {имя: {path, width, height}}, строятся в фоне
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+
+
+class OutboxEvent(models.Model):
+    """
+    Событие для доставки получателям сигналов после коммита (store.outbox).
+    Пишется в той же транзакции, что и данные события.
+    """
+    topic = models.CharField(max_length=100, verbose_name='Событие')
+    payload = models.JSONField(default=dict, verbose_name='Данные')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Следующая попытка доставки (и аренда события диспетчером)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    delivered_at = models.DateTimeField(null=True, blank=True, verbose_name='Доставлено')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+
+    class Meta:
+        verbose_name = 'Событие outbox'
+        verbose_name_plural = 'События outbox'
+        indexes = [
+            # Очередь: недоставленные, у которых подошло время попытки
+            models.Index(fields=['delivered_at', 'available_at']),
+        ]
@@ -0,0 +1,164 @@
+"""
+Transactional outbox для сигналов (order_created).
+
+publish() пишет OutboxEvent в текущей транзакции: событие существует, только
+если транзакция закоммитилась, и получатели не удлиняют оформление заказа.
+Диспетчер (фоновый поток процесса или manage.py outbox_worker) забирает
+события пачками, шлет сигнал и помечает доставленными. Ошибка получателя -
+повтор с экспоненциальной задержкой. Доставка at-least-once: при повторе
+сигнал снова получат все получатели, поэтому они должны быть идемпотентными.
+"""
+import logging
+import random
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Order, OutboxEvent
+from .signals import order_created
+
+logger = logging.getLogger(__name__)
+
+# Событие -> (сигнал, аргументы сигнала из payload)
+TOPICS = {
+    'order_created': (order_created,
+                      lambda payload: {'order': Order.objects.get(pk=payload['order_id'])}),
+}
+# Столько взятое диспетчером событие не видно другим (упал - доставит другой)
+LEASE = timedelta(minutes=5)
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def publish(topic, **payload):
+    """Вызывать внутри транзакции, которая пишет данные события."""
+    if topic not in TOPICS:
+        raise ValueError(f'Неизвестное событие: {topic}')
+    event = OutboxEvent.objects.create(topic=topic, payload=payload)
+    transaction.on_commit(wake_dispatcher)
+    return event
+
+
+def get_backoff(attempts):
+    base, limit = getattr(settings, 'STORE_OUTBOX_RETRY_BACKOFF', (1, 3600))
+    delay = min(base * 2 ** (attempts - 1), limit)
+    return timedelta(seconds=delay * random.uniform(0.5, 1))  # Разброс - без волн повторов
+
+
+def claim_batch(batch_size):
+    now = timezone.now()
+    ids = list(OutboxEvent.objects.filter(delivered_at__isnull=True, available_at__lte=now)
+               .order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    lease_until = now + LEASE
+    # Условие повторяем: часть событий мог забрать параллельный диспетчер
+    OutboxEvent.objects.filter(pk__in=ids, delivered_at__isnull=True, available_at__lte=now) \
+        .update(available_at=lease_until)
+    return list(OutboxEvent.objects.filter(pk__in=ids, available_at=lease_until).order_by('id'))
+
+
+def deliver(event):
+    """Шлет сигнал события. Возвращает текст ошибок получателей или None."""
+    signal, load = TOPICS[event.topic]
+    errors = [
+        f'{getattr(receiver, "__qualname__", receiver)}: {response!r}'
+        for receiver, response in signal.send_robust(OutboxEvent, event=event,
+                                                     **load(event.payload))
+        if isinstance(response, Exception)
+    ]
+    return '\n'.join(errors) or None
+
+
+def deliver_batch(batch_size=None):
+    """Одна пачка. Возвращает число взятых событий (0 - доставлять нечего)."""
+    events = claim_batch(batch_size or getattr(settings, 'STORE_OUTBOX_BATCH_SIZE', 100))
+    delivered = []
+    for event in events:
+        try:
+            error = deliver(event)
+        except ObjectDoesNotExist as exc:  # Данных события нет - повтор не поможет
+            OutboxEvent.objects.filter(pk=event.pk).update(
+                delivered_at=timezone.now(), last_error=f'Нет данных события: {exc}')
+            continue
+        except Exception as exc:
+            error = repr(exc)
+
+        if error is None:
+            delivered.append(event.pk)
+            continue
+        attempts = event.attempts + 1
+        OutboxEvent.objects.filter(pk=event.pk).update(
+            attempts=attempts, last_error=error,
+            available_at=timezone.now() + get_backoff(attempts))
+        logger.warning('Событие %s #%s не доставлено (попытка %s): %s',
+                       event.topic, event.pk, attempts, error)
+
+    OutboxEvent.objects.filter(pk__in=delivered).update(delivered_at=timezone.now())
+    return len(events)
+
+
+def deliver_pending(batch_size=None):
+    """Доставляет пачками, пока есть готовые события. Возвращает их число."""
+    batch_size = batch_size or getattr(settings, 'STORE_OUTBOX_BATCH_SIZE', 100)
+    total = 0
+    while True:
+        count = deliver_batch(batch_size)
+        total += count
+        if count < batch_size:
+            return total
+
+
+def purge_delivered(days):
+    """Удаляет доставленные события старше days дней."""
+    moment = timezone.now() - timedelta(days=days)
+    return OutboxEvent.objects.filter(delivered_at__lt=moment).delete()[0]
+
+
+class OutboxDispatcher(threading.Thread):
+    """
+    Фоновый поток процесса: доставляет сразу после коммита (wake)
+    и раз в poll_interval секунд - повторы и события упавших процессов.
+    """
+
+    def __init__(self, poll_interval):
+        super().__init__(name='store-outbox', daemon=True)
+        self.poll_interval = poll_interval
+        self.wakeup = threading.Event()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            try:
+                deliver_pending()
+            except Exception:
+                logger.exception('Ошибка диспетчера outbox')
+            finally:
+                connections.close_all()
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = OutboxDispatcher(getattr(settings, 'STORE_OUTBOX_POLL_INTERVAL', 5))
+            _dispatcher.start()
+    return _dispatcher
+
+
+def wake_dispatcher():
+    """
+    STORE_OUTBOX_DISPATCHER: 'thread' - поток процесса (запускается при первом
+    событии), 'sync' - доставка сразу в этом потоке, None - только outbox_worker.
+    """
+    mode = getattr(settings, 'STORE_OUTBOX_DISPATCHER', 'thread')
+    if mode == 'thread':
+        get_dispatcher().wakeup.set()
+    elif mode == 'sync':
+        deliver_pending()
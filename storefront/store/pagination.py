@@ -1,4 +1,175 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import b64decode, b64encode
+from hashlib import md5
+
+from django.core.cache import cache
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
 
 class DefaultPagination(PageNumberPagination):
-    page_size = 10
\ No newline at end of file
+    page_size = 10
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация.
+
+    Вместо OFFSET + COUNT следующая страница выбирается условием
+    WHERE (поле, id) > (значения последней строки), поэтому страница N
+    стоит столько же, сколько первая. Сортировка берется из queryset
+    (после OrderingFilter) или из Meta.ordering, id добавляется в конец
+    как стабильный tie-breaker. Поля сортировки должны быть NOT NULL.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    # ?count=approx - примерное кол-во строк, закешированное на count_cache_timeout
+    count_query_param = 'count'
+    count_cache_timeout = 300
+    tie_breaker = 'id'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model_meta = queryset.model._meta
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.count = None
+
+        if request.query_params.get(self.count_query_param) == 'approx':
+            self.count = self.get_approximate_count(queryset)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['r'])
+        if cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(cursor['v'], reverse))
+
+        queryset = queryset.order_by(*[
+            F(name).desc() if desc ^ reverse else F(name).asc()
+            for name, desc in self.ordering
+        ])
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        # Пришли назад со следующей страницы - значит следующая точно есть
+        self.has_next = has_more if not reverse else True
+        self.has_previous = cursor is not None if not reverse else has_more
+        self.first = results[0] if results else None
+        self.last = results[-1] if results else None
+        return results
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+        if self.count is not None:
+            payload['count'] = self.count
+            payload['count_is_approximate'] = True
+        payload['results'] = data
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """Список пар (attname, desc) c tie-breaker в конце."""
+        query = queryset.query
+        fields = [f for f in query.order_by if isinstance(f, str)]
+        if not fields and query.default_ordering:
+            fields = list(queryset.model._meta.ordering)
+
+        meta = queryset.model._meta
+        ordering = []
+        for field in fields:
+            desc = field.startswith('-')
+            name = field.lstrip('-')
+            name = meta.pk.attname if name == 'pk' else meta.get_field(name).attname
+            if name not in [n for n, _ in ordering]:
+                ordering.append((name, desc))
+
+        if self.tie_breaker not in [n for n, _ in ordering]:
+            # Направление id совпадает с первым полем - удобнее для индекса
+            ordering.append((self.tie_breaker, ordering[0][1] if ordering else False))
+        return ordering
+
+    def get_cursor_filter(self, values, reverse):
+        # (a, b, id) > (x, y, z)  =>  a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+        condition = Q()
+        equal = Q()
+        for (name, desc), value in zip(self.ordering, values):
+            lookup = 'lt' if desc ^ reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_approximate_count(self, queryset):
+        sql = str(queryset.order_by().query)
+        key = 'keyset-count:' + md5(sql.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.order_by().count()
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            signature, values, reverse = cursor['o'], cursor['v'], cursor['r']
+            if not isinstance(values, list) or not isinstance(reverse, int):  # bool - тоже int
+                raise ValueError
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # Курсор выдан для другой сортировки
+        if signature != self.get_signature() or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        try:
+            values = [self.model_meta.get_field(name).to_python(value)
+                      for (name, _), value in zip(self.ordering, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return {'v': values, 'r': reverse}
+
+    def encode_cursor(self, row, reverse):
+        # row - объект модели или словарь из values(); to_python() разберет str() обратно
+        values = [str(row[name] if isinstance(row, dict) else getattr(row, name))
+                  for name, _ in self.ordering]
+        cursor = {'o': self.get_signature(), 'v': values, 'r': int(reverse)}
+        encoded = b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_signature(self):
+        return ','.join(('-' if desc else '') + name for name, desc in self.ordering)
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self.encode_cursor(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            return remove_query_param(self.request.build_absolute_uri(),
+                                      self.cursor_query_param)
+        return self.encode_cursor(self.first, reverse=True)
@@ -0,0 +1,52 @@
+"""
+Итоговая цена товара: цена за шт, все акции товара (скидки перемножаются)
+и налог. Хранится в Product.effective_price и пересчитывается при смене
+цены или акций (signals.handlers), API / корзины / заказы читают колонку.
+"""
+from decimal import Decimal
+
+from .models import Product
+
+# Decimal(1.1) - ровно то же значение, что раньше строилось для каждого товара
+TAX_RATE = Decimal(1.1)
+
+
+def calculate_effective_price(unit_price, discounts=()):
+    """discounts - проценты скидок акций, отрицательные и >100 обрезаются."""
+    price = Decimal(str(unit_price))
+    for discount in discounts:
+        discount = min(max(Decimal(str(discount)), Decimal(0)), Decimal(100))
+        price = price * (1 - discount / 100)
+    return round(price * TAX_RATE, 2)
+
+
+def get_discounts(product_ids):
+    """{id товара: [скидки]} одним запросом."""
+    discounts = {}
+    for product_id, discount in Product.promotion.through.objects \
+            .filter(product_id__in=product_ids) \
+            .values_list('product_id', 'promotion__discount'):
+        discounts.setdefault(product_id, []).append(discount)
+    return discounts
+
+
+def recompute_prices(product_ids, batch_size=1000):
+    """
+    Пересчет пачками: 2 чтения и один executemany UPDATE на пачку.
+    Меняются только реально изменившиеся цены.
+    """
+    product_ids = list(product_ids)
+    changed_total = 0
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        discounts = get_discounts(batch)
+        changed = []
+        for product in Product.objects.filter(pk__in=batch) \
+                .only('id', 'unit_price', 'effective_price'):
+            price = calculate_effective_price(product.unit_price, discounts.get(product.id, []))
+            if price != product.effective_price:
+                product.effective_price = price
+                changed.append(product)
+        Product.objects.bulk_update(changed, ['effective_price'])
+        changed_total += len(changed)
+    return changed_total
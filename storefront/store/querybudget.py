@@ -0,0 +1,55 @@
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMixin:
+    """
+    Лимит SQL-запросов на действие вьюсета: query_budget = {'list': 4, ...}.
+
+    STORE_QUERY_BUDGET_MODE: 'raise' - превышение ломает запрос (разработка
+    и тесты, так N+1 не доедет до продакшена), 'warn' - только лог, None - выкл.
+    Запись проверяется после коммита: исключение дало бы 500 на уже примененное
+    изменение, поэтому для небезопасных методов и в 'raise' - только лог.
+    Лимит нужен каждому действию из роутера (test_every_routed_action_has_budget).
+    """
+    query_budget = {}
+
+    def dispatch(self, request, *args, **kwargs):
+        mode = getattr(settings, 'STORE_QUERY_BUDGET_MODE', None)
+        if not mode:
+            return super().dispatch(request, *args, **kwargs)
+
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = super().dispatch(request, *args, **kwargs)
+
+        action = getattr(self, 'action', None)
+        budget = self.query_budget.get(action)
+        if budget is not None and counter.count > budget:
+            message = (f'{self.__class__.__name__}.{action}: {counter.count} SQL-запросов, '
+                       f'лимит {budget}')
+            if mode == 'raise' and request.method in SAFE_METHODS:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
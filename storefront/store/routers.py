@@ -0,0 +1,130 @@
+"""
+Чтение каталога с реплик.
+
+ReplicaReadMixin включает реплику на время безопасного запроса (GET, HEAD,
+OPTIONS) вьюсета, ReplicaRouter отправляет туда чтения. Запись, чтение внутри
+транзакции и все остальные вьюхи, команды, админка - основная база.
+
+Read-your-writes: после успешной записи PrimaryAfterWriteMiddleware на
+STORE_DB_STICKY_SECONDS секунд закрепляет клиента за основной базой - cookie
+и ключ пользователя в кеше каталога (для JWT-клиентов без cookie). Реплика
+отстает, поэтому после записи клиент должен видеть свои данные с основной.
+
+Ответ, прочитанный с реплики, попадает в кеш каталога, только если группу
+не сбрасывали последние STORE_DB_STICKY_SECONDS секунд (cached_response):
+иначе отставшая реплика записала бы старые данные под новое поколение,
+и они жили бы весь TTL, в том числе для писавшего клиента.
+
+Реплики - алиасы из STORE_DB_REPLICAS. Пустой список - все идет в default.
+"""
+import random
+from contextvars import ContextVar
+from time import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .cache import get_catalog_cache
+
+STICKY_COOKIE = 'store_primary_until'
+
+_replica = ContextVar('store_db_replica', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'STORE_DB_REPLICAS', []))
+
+
+def get_sticky_seconds():
+    return getattr(settings, 'STORE_DB_STICKY_SECONDS', 5)
+
+
+def sticky_key(user_id):
+    return f'db-primary:{user_id}'
+
+
+def use_replica(alias):
+    """Чтения текущего запроса - с alias (None - с основной). Отдает токен для reset_replica."""
+    return _replica.set(alias)
+
+
+def reset_replica(token):
+    _replica.reset(token)
+
+
+def current_replica():
+    """Алиас реплики, с которой читает текущий запрос, или None."""
+    return _replica.get()
+
+
+def mark_written(request, response):
+    seconds = get_sticky_seconds()
+    # Подделанная cookie только отправит клиента на основную базу
+    response.set_cookie(STICKY_COOKIE, str(int(time() + seconds)), max_age=seconds,
+                        httponly=True, samesite='Lax')
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        get_catalog_cache().set(sticky_key(user.id), True, seconds)
+
+
+def is_sticky(request):
+    """Клиент писал меньше STORE_DB_STICKY_SECONDS секунд назад."""
+    try:
+        if float(request.COOKIES.get(STICKY_COOKIE, 0)) > time():
+            return True
+    except ValueError:
+        pass
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated \
+        and bool(get_catalog_cache().get(sticky_key(user.id)))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        # Внутри транзакции читаем то, что она же пишет
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Реплика - копия основной базы
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплика получает вместе с данными
+        return False if db in get_replicas() else None
+
+
+class ReplicaReadMixin:
+    """Безопасные запросы вьюсета читают со случайной реплики, если клиент недавно не писал."""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = use_replica(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            reset_replica(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # После аутентификации: закрепление смотрит и на пользователя
+        replicas = get_replicas()
+        if replicas and request.method in SAFE_METHODS and not is_sticky(request):
+            use_replica(random.choice(replicas))
+
+
+class PrimaryAfterWriteMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # request.user здесь уже тот, кого аутентифицировал DRF
+        if get_replicas() and request.method not in SAFE_METHODS \
+                and response.status_code < 400:
+            mark_written(request, response)
+        return response
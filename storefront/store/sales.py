@@ -0,0 +1,186 @@
+"""
+Сводки продаж: SalesHourly и SalesDaily - штуки и выручка по (период, товар,
+статус оплаты). Отчеты читают только сводки, не позиции заказов.
+
+Сводки обновляются инкрементально. Order.sales_status - статус, под которым
+позиции заказа уже учтены; sync_order_sales() переносит их в текущий
+payment_status (None -> P для нового заказа, P -> C при оплате). Повторный
+вызов ничего не меняет, поэтому повторная доставка order_created безопасна.
+Новые заказы учитывает получатель order_created, смену статуса -
+UpdateOrderSerializer, историю - команда backfill_sales.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from time import sleep
+
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Order, OrderItem, SalesDaily, SalesHourly
+from .transactions import atomic_write
+
+GROUP_BY = ['day', 'hour', 'product', 'collection']
+# Столько раз sync_order_sales повторяет пачку, если заказы поменялись параллельно
+SYNC_ATTEMPTS = 3
+
+
+class SalesConflict(Exception):
+    pass
+
+
+def sync_order_sales(order_ids):
+    """Учитывает заказы, у которых sales_status != payment_status. Возвращает их число."""
+    for attempt in range(SYNC_ATTEMPTS):
+        try:
+            with atomic_write():
+                return apply_orders(order_ids)
+        except SalesConflict:
+            if attempt == SYNC_ATTEMPTS - 1:
+                raise
+
+
+def apply_orders(order_ids):
+    orders = {order_id: (old, new) for order_id, old, new in
+              Order.objects.filter(pk__in=list(order_ids))
+              .exclude(sales_status=F('payment_status'))
+              .values_list('id', 'sales_status', 'payment_status')}
+    if not orders:
+        return 0
+
+    # Сначала помечаем заказы: условие по старому статусу не даст учесть дважды
+    transitions = defaultdict(list)
+    for order_id, transition in orders.items():
+        transitions[transition].append(order_id)
+    for (old, new), ids in transitions.items():
+        claimed = Order.objects.filter(pk__in=ids, sales_status=old, payment_status=new) \
+            .update(sales_status=new)
+        if claimed != len(ids):
+            raise SalesConflict  # Откат, sync_order_sales перечитает заказы
+
+    hourly = defaultdict(lambda: [0, Decimal(0)])
+    daily = defaultdict(lambda: [0, Decimal(0)])
+    for order_id, product_id, placed_at, quantity, unit_price in OrderItem.objects \
+            .filter(order_id__in=list(orders)) \
+            .values_list('order_id', 'product_id', 'order__placed_at', 'quantity', 'unit_price'):
+        placed_at = timezone.localtime(placed_at)
+        hour = placed_at.replace(minute=0, second=0, microsecond=0)
+        old, new = orders[order_id]
+        for status, sign in [(old, -1), (new, 1)]:
+            if status is None:
+                continue
+            for deltas, period in [(hourly, hour), (daily, placed_at.date())]:
+                delta = deltas[period, product_id, status]
+                delta[0] += sign * quantity
+                delta[1] += sign * quantity * unit_price
+
+    apply_deltas(SalesHourly, 'hour', hourly)
+    apply_deltas(SalesDaily, 'day', daily)
+    return len(orders)
+
+
+def apply_deltas(model, period, deltas):
+    """{(период, товар, статус): [штуки, выручка]} - прибавляются к строкам сводки."""
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    if connection.vendor in ('sqlite', 'postgresql'):
+        return upsert_deltas(model, period, deltas)
+
+    model.objects.bulk_create([
+        model(**{period: value}, product_id=product_id, payment_status=status)
+        for value, product_id, status in deltas
+    ], ignore_conflicts=True)
+    for (value, product_id, status), (units, revenue) in deltas.items():
+        model.objects.filter(**{period: value}, product_id=product_id, payment_status=status) \
+            .update(units=F('units') + units, revenue=F('revenue') + revenue)
+
+
+def upsert_deltas(model, period, deltas):
+    # Одним запросом на таблицу, сколько бы товаров ни было в пачке
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    period_field = model._meta.get_field(period)
+    revenue_field = model._meta.get_field('revenue')
+    sql = (
+        f'INSERT INTO {table} ({quote(period)}, product_id, payment_status, units, revenue) '
+        f'VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(deltas))} '
+        f'ON CONFLICT ({quote(period)}, product_id, payment_status) '
+        f'DO UPDATE SET units = {table}.units + excluded.units, '
+        f'revenue = {table}.revenue + excluded.revenue'
+    )
+    params = []
+    for (value, product_id, status), (units, revenue) in deltas.items():
+        params += [period_field.get_db_prep_value(value, connection), product_id, status, units,
+                   revenue_field.get_db_prep_save(revenue, connection)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def reset_sales():
+    """Для полного пересчета: сводки пустые, ни один заказ не учтен."""
+    with transaction.atomic():
+        SalesHourly.objects.all().delete()
+        SalesDaily.objects.all().delete()
+        Order.objects.exclude(sales_status=None).update(sales_status=None)
+
+
+def backfill_sales(chunk_size=1000, pause=0):
+    """
+    Учитывает неучтенные заказы пачками по id, каждая пачка - своя короткая
+    транзакция, между пачками пауза pause секунд. Отдает (последний id, учтено).
+    """
+    last_id = 0
+    while True:
+        ids = list(Order.objects.filter(pk__gt=last_id).order_by('pk')
+                   .values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return
+        last_id = ids[-1]
+        yield last_id, sync_order_sales(ids)
+        if pause:
+            sleep(pause)
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def sales_report(group_by, day_from=None, day_to=None, payment_status=None,
+                 product_id=None, collection_id=None):
+    """
+    Строки отчета из сводок: по часам - SalesHourly, остальное - SalesDaily.
+    day_from, day_to - даты включительно.
+    """
+    if group_by == 'hour':
+        queryset, period = SalesHourly.objects.all(), 'hour'
+        # Границы - моменты, а не hour__date: так работает индекс по hour
+        if day_from is not None:
+            queryset = queryset.filter(hour__gte=start_of_day(day_from))
+        if day_to is not None:
+            queryset = queryset.filter(hour__lt=start_of_day(day_to + timedelta(days=1)))
+    else:
+        queryset, period = SalesDaily.objects.all(), 'day'
+        if day_from is not None:
+            queryset = queryset.filter(day__gte=day_from)
+        if day_to is not None:
+            queryset = queryset.filter(day__lte=day_to)
+
+    if payment_status is not None:
+        queryset = queryset.filter(payment_status=payment_status)
+    if product_id is not None:
+        queryset = queryset.filter(product_id=product_id)
+    if collection_id is not None:
+        queryset = queryset.filter(product__collection_id=collection_id)
+
+    # Категория - текущая категория товара
+    columns = {
+        'day': [period],
+        'hour': [period],
+        'product': ['product_id', 'product__title'],
+        'collection': ['product__collection_id', 'product__collection__title'],
+    }[group_by]
+    return queryset.order_by().values(*columns) \
+        .annotate(units=Sum('units'), revenue=Sum('revenue')) \
+        .filter(units__gt=0).order_by(*columns)
@@ -0,0 +1,119 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from rest_framework.filters import SearchFilter
+
+
+class BaseSearchBackend:
+    """
+    Бэкенд поиска товаров. search() фильтрует и ранжирует queryset,
+    index()/remove() вызываются из сигналов при сохранении и удалении товара.
+    """
+
+    def search(self, queryset, terms):
+        raise NotImplementedError
+
+    def index(self, product):
+        pass
+
+    def index_many(self, product_ids):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """Старое поведение SearchFilter: LIKE '%term%' по title и description."""
+    fields = ['title', 'description']
+
+    def search(self, queryset, terms):
+        for term in terms:
+            condition = Q()
+            for field in self.fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    Полнотекстовый индекс SQLite FTS5 (таблица создается миграцией 0003).
+    rowid индекса = id товара, результаты сортируются по bm25.
+    """
+    table = 'store_product_fts'
+
+    def search(self, queryset, terms):
+        return queryset.extra(
+            tables=[self.table],
+            where=[f'{self.table}.rowid = store_product.id', f'{self.table} MATCH %s'],
+            params=[self.build_query(terms)],
+            select={'search_rank': f'bm25({self.table})'},
+            order_by=['search_rank'],  # Явный ?ordering= перекрывает релевантность
+        )
+
+    def build_query(self, terms):
+        # Каждое слово в кавычках (экранируем синтаксис FTS5) + поиск по префиксу
+        return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [product.id])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, description) VALUES (%s, %s, %s)',
+                [product.id, product.title, product.description or '']
+            )
+
+    def index_many(self, product_ids, batch_size=500):
+        product_ids = list(product_ids)
+        with connection.cursor() as cursor:
+            # Пачками - у SQLite ограничено число параметров запроса
+            for start in range(0, len(product_ids), batch_size):
+                batch = product_ids[start:start + batch_size]
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', batch)
+                cursor.execute(
+                    f'INSERT INTO {self.table} (rowid, title, description) '
+                    f"SELECT id, title, COALESCE(description, '') FROM store_product "
+                    f'WHERE id IN ({placeholders})', batch
+                )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, description) '
+                f"SELECT id, title, COALESCE(description, '') FROM store_product"
+            )
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    path = getattr(settings, 'STORE_SEARCH_BACKEND', None)
+    if path is None:
+        # FTS5 есть только в SQLite, для остальных баз - LIKE
+        if connection.vendor == 'sqlite':
+            path = 'store.search.SQLiteFTSBackend'
+        else:
+            path = 'store.search.LikeSearchBackend'
+    return import_string(path)()
+
+
+class ProductSearchFilter(SearchFilter):
+    """Тот же параметр ?search=, но поиск идет через подключаемый бэкенд."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend().search(queryset, terms)
@@ -1,9 +1,15 @@
 from rest_framework import serializers
 from .models import Product, Collection, ProductImage, Review, Cart, CartItem, Order, OrderItem, Customer
+from collections import Counter
 from decimal import Decimal
-from django.db import transaction
-from .signals import order_created
-
+from .outbox import publish
+from .thumbnails import variant_urls
+from .carts import add_cart_items, line_total
+from .sales import GROUP_BY, sync_order_sales
+from .transactions import atomic_write
+from django.db.models import Sum, Window
+from tags.models import TaggedItem
+from likes.models import LikedItem
 
 
 class CollectionSerializer(serializers.ModelSerializer):
@@ -22,7 +28,13 @@ class ProductImageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ProductImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'variants']
+
+    # Пока варианты строятся в фоне - пустой объект, клиент берет image
+    variants = serializers.SerializerMethodField()
+
+    def get_variants(self, image: ProductImage):
+        return variant_urls(image.variants, self.context.get('request'))
 
 class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
@@ -30,7 +42,7 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'title', 'price', 'description',
-                  'slug', 'inventory', 'price_with_tax', 'collection', 'images']
+                  'slug', 'inventory', 'price_with_tax', 'collection', 'images', 'tags']
 
     price = serializers.DecimalField(max_digits=6, decimal_places=2,
                                      source='unit_price')
@@ -40,7 +52,13 @@ class ProductSerializer(serializers.ModelSerializer):
     )
 
     def calculate_tax(self, product: Product):
-        return round(product.unit_price * Decimal(1.1), 2)
+        return product.effective_price  # Посчитана заранее: акции + налог (store.pricing)
+
+    tags = serializers.SerializerMethodField()
+
+    def get_tags(self, product: Product):
+        tags = TaggedItem.objects.get_tags_for_many(Product, [product.id])
+        return [tag.label for tag in tags.get(product.id, [])]
 
 
     def create(self, validated_data):
@@ -56,6 +74,89 @@ class ProductSerializer(serializers.ModelSerializer):
         return instance
 
 
+class ProductReadSerializer:
+    """
+    Быстрая сериализация товаров только для чтения (list/retrieve).
+
+    Принимает строки values() с полями fields, картинки и тэги загружает
+    по одному запросу на всю страницу. Без полей DRF на каждый объект, но
+    JSON совпадает с ProductSerializer байт в байт (см. tests/test_products.py).
+    """
+    # last_update не выводится, но нужен курсорной пагинации
+    fields = ['id', 'title', 'unit_price', 'description', 'slug',
+              'inventory', 'collection_id', 'last_update', 'effective_price']
+
+    def __init__(self, instance=None, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        product_ids = [row['id'] for row in rows]
+        images = self.get_images(product_ids)
+        tags = TaggedItem.objects.get_tags_for_many(Product, product_ids)
+        data = [self.to_representation(row, images.get(row['id'], []),
+                                       [tag.label for tag in tags.get(row['id'], [])])
+                for row in rows]
+        return data if self.many else data[0]
+
+    def get_images(self, product_ids):
+        request = self.context.get('request')
+        storage = ProductImage._meta.get_field('image').storage
+        images = {}
+        for product_id, image_id, name, variants in ProductImage.objects \
+                .filter(product_id__in=product_ids).order_by('id') \
+                .values_list('product_id', 'id', 'image', 'variants'):
+            url = None
+            if name:
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+            images.setdefault(product_id, []).append({
+                'id': image_id, 'image': url, 'variants': variant_urls(variants, request)})
+        return images
+
+    def to_representation(self, row, images, tags):
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'price': row['unit_price'],
+            'description': row['description'],
+            'slug': row['slug'],
+            'inventory': row['inventory'],
+            'price_with_tax': row['effective_price'],
+            'collection': row['collection_id'],
+            'images': images,
+            'tags': tags,
+        }
+
+
+class ProductLikesSerializer(serializers.Serializer):
+    """Лайки пачкой: {"like": [id товара, ...], "unlike": [...]}, одна транзакция."""
+    max_items = 100
+
+    like = serializers.ListField(child=serializers.IntegerField(min_value=1), default=list)
+    unlike = serializers.ListField(child=serializers.IntegerField(min_value=1), default=list)
+
+    def validate(self, data):
+        if not data['like'] and not data['unlike']:
+            raise serializers.ValidationError('Нужен like или unlike')
+        if len(data['like']) + len(data['unlike']) > self.max_items:
+            raise serializers.ValidationError(f'Не более {self.max_items} товаров за раз')
+        if set(data['like']) & set(data['unlike']):
+            raise serializers.ValidationError('Товар не может быть и в like, и в unlike')
+        return data
+
+    def save(self, **kwargs):
+        # Несуществующие товары и повторные лайки пропускаются
+        user = self.context['user']
+        with atomic_write():
+            LikedItem.objects.unlike(user, Product, self.validated_data['unlike'])
+            LikedItem.objects.like(user, Product, self.validated_data['like'])
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
@@ -73,7 +174,7 @@ class ReviewSerializer(serializers.ModelSerializer):
 class SimpleProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ['id', 'title', 'unit_price']
+        fields = ['id', 'title', 'unit_price', 'effective_price']
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -82,7 +183,10 @@ class CartItemSerializer(serializers.ModelSerializer):
         method_name='get_total_price')
 
     def get_total_price(self, cart_item: CartItem):
-        return cart_item.quantity * cart_item.product.unit_price
+        total_price = getattr(cart_item, 'total_price', None)  # Посчитано в SQL
+        if total_price is not None:
+            return total_price
+        return cart_item.quantity * cart_item.product.effective_price
 
     class Meta:
         model = CartItem
@@ -97,7 +201,7 @@ class CartSerializer(serializers.ModelSerializer):
         method_name='get_total_price')
 
     def get_total_price(self, cart: Cart):
-        return sum([item.quantity * item.product.unit_price for item in cart.items.all()])
+        return sum([item.quantity * item.product.effective_price for item in cart.items.all()])
 
     class Meta:
         model = Cart
@@ -105,29 +209,61 @@ class CartSerializer(serializers.ModelSerializer):
 
 
 
+class CartReadSerializer:
+    """
+    Быстрое чтение корзины (CartViewSet.retrieve): один запрос только
+    нужных колонок, суммы позиций и корзины считает база (SUM() OVER ()).
+    JSON совпадает с CartSerializer (см. tests/test_carts.py).
+    """
+
+    def __init__(self, cart_id):
+        self.cart_id = cart_id
+
+    @property
+    def data(self):
+        """None, если корзины нет."""
+        rows = list(CartItem.objects.filter(cart_id=self.cart_id).order_by('id')
+                    .annotate(total_price=line_total(),
+                              cart_total=Window(Sum(line_total())))
+                    .values('id', 'quantity', 'product_id', 'product__title',
+                            'product__unit_price', 'product__effective_price',
+                            'total_price', 'cart_total'))
+        if not rows and not Cart.objects.filter(pk=self.cart_id).exists():
+            return None
+
+        fields = SimpleProductSerializer().fields
+        return {
+            'id': str(self.cart_id),
+            'items': [{
+                'id': row['id'],
+                'product': {
+                    'id': row['product_id'],
+                    'title': row['product__title'],
+                    'unit_price': fields['unit_price'].to_representation(
+                        row['product__unit_price']),
+                    'effective_price': fields['effective_price'].to_representation(
+                        row['product__effective_price']),
+                },
+                'quantity': row['quantity'],
+                'total_price': row['total_price'],
+            } for row in rows],
+            'total_price': rows[0]['cart_total'] if rows else 0,
+        }
+
+
 class AddCartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField()
 
- 
-    def validate_product_id(self, value):
-        if not Product.objects.filter(pk=value).exists(): # Если нет товара
-            raise serializers.ValidationError('Нет товара с данным id')
-        return value
-
     def save(self, **kwargs):
         cart_id = self.context['cart_id'] # В какую корзину
         product_id = self.validated_data['product_id'] # ЧТо положить
-        quantity = self.validated_data['quantity']  # ЧТо положить
-
-        try: # Сначала пытаемся положить в существующую корзину
-            cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product_id)
-            # Думаем что у нас есть такая корзина с таким товаром
-            cart_item.quantity += quantity  # Добавляем товар
-            cart_item.save()
-            self.instance = cart_item
-        except:
-            self.instance = CartItem.objects.create(cart_id=cart_id, **self.validated_data)
+        quantity = self.validated_data['quantity']
 
+        # Один запрос: нет позиции - вставка, есть - quantity увеличивается в базе
+        items = add_cart_items(cart_id, {product_id: quantity})
+        if not items:  # Если нет товара
+            raise serializers.ValidationError({'product_id': ['Нет товара с данным id']})
+        self.instance = items[0]
         return self.instance
 
     class Meta:
@@ -135,6 +271,32 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product_id', 'quantity']
 
 
+class BulkAddCartItemSerializer(serializers.Serializer):
+    """Много товаров за один запрос и одну транзакцию, товары могут повторяться."""
+    max_items = 100
+
+    items = AddCartItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        if len(items) > self.max_items:
+            raise serializers.ValidationError(f'Не более {self.max_items} товаров за раз')
+        return items
+
+    def save(self, **kwargs):
+        quantities = Counter()
+        for item in self.validated_data['items']:
+            quantities[item['product_id']] += item['quantity']
+
+        with atomic_write():
+            items = add_cart_items(self.context['cart_id'], quantities)
+            missing = set(quantities) - {item.product_id for item in items}
+            if missing:  # Откатываем всю пачку
+                raise serializers.ValidationError(
+                    {'items': [f'Нет товаров с id: {", ".join(map(str, sorted(missing)))}']})
+        self.instance = items
+        return self.instance
+
+
 
 
 class UpdateCartItemSerializer(serializers.ModelSerializer):
@@ -159,6 +321,12 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'unit_price', 'quantity']
 
 class UpdateOrderSerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        with atomic_write():
+            order = super().update(instance, validated_data)
+            sync_order_sales([order.id])  # Позиции переходят в сводках под новый статус
+        return order
+
     class Meta:
         model = Order
         fields = ['payment_status']
@@ -166,10 +334,28 @@ class UpdateOrderSerializer(serializers.ModelSerializer):
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
+    total_price = serializers.SerializerMethodField(
+        method_name='get_total_price')
+
+    def get_total_price(self, order: Order):
+        total_price = getattr(order, 'total_price', None)  # Посчитано в SQL (with_totals)
+        if total_price is None:
+            total_price = sum([item.quantity * item.unit_price for item in order.items.all()])
+        # SQLite отдает сумму числом, формат - как у unit_price позиций
+        return serializers.DecimalField(max_digits=12, decimal_places=2) \
+            .to_representation(total_price)
 
     class Meta:
         model = Order
-        fields = ['id', 'customer', 'placed_at', 'payment_status', 'items']
+        fields = ['id', 'customer', 'placed_at', 'payment_status', 'total_price', 'items']
+
+
+class OutOfStockError(Exception):
+    """Не хватает товара на складе, errors - по позиции на товар."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
 
 
 class CreateOrderSerializer(serializers.Serializer):
@@ -184,29 +370,79 @@ class CreateOrderSerializer(serializers.Serializer):
 
 
     def save(self, **kwargs):
-        with transaction.atomic(): # На случай ошибки, чтобы изменения откатились
-            cart_id = self.validated_data['cart_id']
-            customer = Customer.objects.get(user_id=self.context['user_id'])
-            order = Order.objects.create(customer=customer)
-
-            cart_items = CartItem.objects.select_related('product').filter(cart_id=cart_id)
-
-            order_items = [OrderItem(
-                order=order,
-                product=item.product,
-                unit_price=item.product.unit_price,
-                quantity=item.quantity
-            ) for item in cart_items]
-
-            OrderItem.objects.bulk_create(order_items)
-            Cart.objects.filter(pk=cart_id).delete()
-
-            order_created.send_robust(self.__class__, order=order)
-
-            return order
-
-
-
-
-
-
+        cart_id = self.validated_data['cart_id']
+        quantities = {}
+        try:
+            # На случай ошибки, чтобы изменения откатились. IMMEDIATE: склад читается
+            # и списывается под одной блокировкой записи, без повторов на SQLite
+            with atomic_write():
+                cart_items = list(CartItem.objects.filter(cart_id=cart_id).order_by('product_id')
+                                  .values('product_id', 'quantity', 'product__effective_price'))
+                # Уже под блокировкой: параллельное оформление могло забрать корзину
+                if not cart_items:
+                    raise serializers.ValidationError({'cart_id': ['Корзина пустая']})
+                quantities = {item['product_id']: item['quantity'] for item in cart_items}
+                # Сначала склад: не хватило - исключение откатит уже списанное
+                if Product.objects.decrement_inventory(quantities):
+                    raise OutOfStockError([])
+
+                order = Order.objects.create(customer_id=self.context['customer_id'])
+                order_items = [OrderItem(
+                    order=order,
+                    product_id=item['product_id'],
+                    unit_price=item['product__effective_price'],  # Цена с акциями и налогом
+                    quantity=item['quantity']
+                ) for item in cart_items]
+
+                OrderItem.objects.bulk_create(order_items)
+                Cart.objects.filter(pk=cart_id).delete()
+
+                # Получатели order_created - после коммита, в диспетчере outbox
+                publish('order_created', order_id=order.id)
+
+                return order
+        except OutOfStockError:
+            # Остатки читаем после отката: списанное по другим позициям уже вернулось
+            raise OutOfStockError(self.get_stock_errors(quantities))
+
+    def get_stock_errors(self, quantities):
+        """Ошибка на каждую позицию, которой не хватает на складе."""
+        return [
+            {'product_id': product_id, 'title': title, 'quantity': quantities[product_id],
+             'available': inventory, 'error': 'Недостаточно товара на складе'}
+            for product_id, title, inventory in Product.objects
+            .filter(pk__in=list(quantities)).order_by('id')
+            .values_list('id', 'title', 'inventory')
+            if inventory < quantities[product_id]
+        ]
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    """Параметры отчета о продажах (SalesReportViewSet): даты включительно."""
+    group_by = serializers.ChoiceField(
+        choices=GROUP_BY, default='day',
+        error_messages={'invalid_choice': f'Допустимо: {", ".join(GROUP_BY)}'})
+    payment_status = serializers.ChoiceField(
+        choices=Order.PAYMENT_STATUS_CHOICES, default=Order.PAYMENT_STATUS_COMPLETE,
+        error_messages={'invalid_choice': 'Неизвестный статус'})
+    # Имена аргументов sales_report
+    date_from = serializers.DateField(required=False, source='day_from',
+                                      error_messages={'invalid': 'Неверная дата'})
+    date_to = serializers.DateField(required=False, source='day_to',
+                                    error_messages={'invalid': 'Неверная дата'})
+    product_id = serializers.IntegerField(required=False, min_value=0,
+                                          error_messages={'invalid': 'Ожидается число'})
+    collection_id = serializers.IntegerField(required=False, min_value=0,
+                                             error_messages={'invalid': 'Ожидается число'})
+
+
+class SalesReportRowSerializer(serializers.BaseSerializer):
+    """Строка sales_report: ключи без product__, выручка - как цены."""
+    names = {'product__title': 'title', 'product__collection_id': 'collection_id',
+             'product__collection__title': 'title'}
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+    def to_representation(self, row):
+        return {self.names.get(key, key):
+                self.revenue.to_representation(value) if key == 'revenue' else value
+                for key, value in row.items()}
@@ -1,3 +1,11 @@
 from django.dispatch import Signal
 
-order_created = Signal()
\ No newline at end of file
+# Шлет диспетчер store.outbox после коммита заказа, sender=OutboxEvent.
+# Аргументы: order, event (OutboxEvent). Доставка at-least-once
+order_created = Signal()
+
+# bulk_create / bulk_update / update товаров не шлют post_save.
+# Аргументы: product_ids, created, fields (None - все поля),
+# old_collections ({id товара: старая категория}, если категорию меняли),
+# inventory_deltas ({id товара: +-n} - только у decrement_inventory)
+products_bulk_saved = Signal()
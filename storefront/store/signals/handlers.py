@@ -1,9 +1,240 @@
+from collections import Counter
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
 from django.dispatch import receiver
-from store.models import Customer
+from store.signals import order_created, products_bulk_saved
+from store.models import Customer, Product, ProductImage, Promotion, Collection, Cart, \
+    CartItem, touch_products
+from store.search import get_search_backend
+from store.cache import invalidate_product, invalidate_collections
+from store.pricing import calculate_effective_price, get_discounts, recompute_prices
+from store.facets import apply_deltas, facet_key, refresh_collections
+from store.thumbnails import prepare_image, schedule_variants
+from store.carts import invalidate_cart
+from store.sales import sync_order_sales
+from store.authentication import invalidate_user
+from tags.models import Tag, TaggedItem
+from likes.models import LikedItem
+from django.contrib.contenttypes.models import ContentType
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_customer_for_new_user(sender, **kwargs):
     if kwargs['created']:
         Customer.objects.create(user=kwargs['instance'])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Смена пароля, деактивация - снимок для JWT больше не годится
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    get_search_backend().remove(instance.id)
+
+
+# Версии (last_update) и кеш каталога. Кеш сбрасываем только после коммита,
+# иначе параллельный запрос закеширует еще не закоммиченные данные
+
+@receiver(pre_save, sender=Product)
+def prepare_product(sender, instance, **kwargs):
+    # Старая категория - если товар переносят в другую, старая цена - для effective_price
+    old = None
+    if instance.pk is not None:
+        old = Product.objects.filter(pk=instance.pk) \
+            .values('collection_id', 'unit_price', 'inventory').first()
+    instance._old_collection_id = old['collection_id'] if old else None
+    instance._old_facet_key = facet_key(**old) if old else None
+
+    if old is None:  # Новый товар - акций еще нет
+        instance.effective_price = calculate_effective_price(instance.unit_price)
+    elif old['unit_price'] != instance.unit_price:
+        discounts = get_discounts([instance.pk]).get(instance.pk, [])
+        instance.effective_price = calculate_effective_price(instance.unit_price, discounts)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    old_collection_id = getattr(instance, '_old_collection_id', None)
+    if created:
+        update_products_count({instance.collection_id: 1})
+    elif old_collection_id is not None and old_collection_id != instance.collection_id:
+        update_products_count({old_collection_id: -1, instance.collection_id: 1})
+
+    old_facet_key = getattr(instance, '_old_facet_key', None)
+    new_facet_key = facet_key(instance.collection_id, instance.unit_price, instance.inventory)
+    if created:
+        apply_deltas({new_facet_key: 1})
+    elif old_facet_key is not None and old_facet_key != new_facet_key:
+        apply_deltas({old_facet_key: -1, new_facet_key: 1})
+
+    transaction.on_commit(
+        lambda: invalidate_product(instance.id, instance.collection_id, old_collection_id))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    update_products_count({instance.collection_id: -1})
+    apply_deltas({facet_key(instance.collection_id, instance.unit_price, instance.inventory): -1})
+    transaction.on_commit(lambda: invalidate_product(instance.id, instance.collection_id))
+    # Generic-связь лайков каскадом не удаляется
+    LikedItem.objects.forget(Product, [instance.id])
+
+
+@receiver(products_bulk_saved, sender=Product)
+def products_bulk_saved_handler(sender, product_ids, created, fields, old_collections,
+                                inventory_deltas=None, **kwargs):
+    if inventory_deltas is not None:  # Оформление заказа - только остатки
+        inventory_changed(inventory_deltas)
+        return
+
+    rows = list(Product.objects.filter(pk__in=product_ids).values_list('id', 'collection_id'))
+
+    deltas = Counter()
+    for product_id, collection_id in rows:
+        old_collection_id = old_collections.get(product_id)
+        if created:
+            deltas[collection_id] += 1
+        elif old_collection_id is not None and old_collection_id != collection_id:
+            deltas[old_collection_id] -= 1
+            deltas[collection_id] += 1
+    update_products_count(deltas)
+
+    # Старых цен и остатков тут нет - куб фасетов пересчитываем по категориям
+    if fields is None or {'collection', 'collection_id', 'unit_price', 'inventory'} & set(fields):
+        refresh_collections({collection_id for _, collection_id in rows}
+                            | set(old_collections.values()))
+
+    if fields is None or {'title', 'description'} & set(fields):
+        get_search_backend().index_many(product_ids)
+    if fields is not None and 'unit_price' in fields:
+        recompute_prices(product_ids)
+
+    transaction.on_commit(lambda: [
+        invalidate_product(product_id, collection_id, old_collections.get(product_id))
+        for product_id, collection_id in rows
+    ])
+
+
+def inventory_changed(inventory_deltas):
+    """Фасет 'мало на складе' - по разнице, без пересчета категорий."""
+    rows = list(Product.objects.filter(pk__in=list(inventory_deltas))
+                .values_list('id', 'collection_id', 'unit_price', 'inventory'))
+    facet_deltas = Counter()
+    for product_id, collection_id, unit_price, inventory in rows:
+        old_key = facet_key(collection_id, unit_price, inventory - inventory_deltas[product_id])
+        new_key = facet_key(collection_id, unit_price, inventory)
+        if old_key != new_key:
+            facet_deltas[old_key] -= 1
+            facet_deltas[new_key] += 1
+    apply_deltas(facet_deltas)
+    transaction.on_commit(lambda: [invalidate_product(product_id, collection_id)
+                                   for product_id, collection_id, _, _ in rows])
+
+
+def update_products_count(deltas):
+    """Атомарно (F) меняет products_count и last_update категорий: {id: +-n}."""
+    now = timezone.now()
+    for collection_id, delta in deltas.items():
+        if collection_id is None or delta == 0:
+            continue
+        Collection.objects.filter(pk=collection_id).update(
+            products_count=F('products_count') + delta, last_update=now)
+    if any(deltas.values()):
+        transaction.on_commit(invalidate_collections)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_product_image(sender, instance, **kwargs):
+    touch_products([instance.product_id])
+
+
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+def invalidate_product_tags(sender, instance, **kwargs):
+    if instance.content_type_id == ContentType.objects.get_for_model(Product).id:
+        touch_products([instance.object_id])
+
+
+@receiver(post_save, sender=Tag)
+def invalidate_renamed_tag(sender, instance, created, **kwargs):
+    # Новое название - в tags у всех отмеченных товаров
+    if not created:
+        touch_products(TaggedItem.objects.for_model(Product).filter(tag=instance)
+                       .values_list('object_id', flat=True))
+
+
+@receiver(pre_save, sender=ProductImage)
+def deduplicate_product_image(sender, instance, **kwargs):
+    prepare_image(instance)
+
+
+@receiver(post_save, sender=ProductImage)
+def generate_product_image_variants(sender, instance, **kwargs):
+    schedule_variants(instance)
+
+
+# Акции меняют effective_price. recompute_prices обновляет только изменившиеся
+# цены (а с ними last_update и кеш), тысячи товаров - пачками
+
+@receiver(post_save, sender=Promotion)
+def promotion_saved(sender, instance, **kwargs):
+    recompute_prices(instance.product_set.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Promotion)
+def remember_promotion_products(sender, instance, **kwargs):
+    instance._product_ids = list(instance.product_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Promotion)
+def promotion_deleted(sender, instance, **kwargs):
+    recompute_prices(getattr(instance, '_product_ids', []))
+
+
+@receiver(m2m_changed, sender=Product.promotion.through)
+def product_promotions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        instance._cleared_product_ids = list(instance.product_set.values_list('id', flat=True)) \
+            if reverse else [instance.pk]
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:  # product.promotion.add(...)
+            recompute_prices([instance.pk])
+        elif action == 'post_clear':  # promotion.product_set.clear()
+            recompute_prices(instance._cleared_product_ids)
+        else:
+            recompute_prices(pk_set)
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+def invalidate_collection(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_collections)
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, **kwargs):
+    invalidate_cart(instance.cart_id)
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    invalidate_cart(instance.pk)
+
+
+@receiver(order_created)
+def record_order_sales(sender, order, **kwargs):
+    # Идемпотентно: повторная доставка события не учтет заказ дважды
+    sync_order_sales([order.id])
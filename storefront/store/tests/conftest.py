@@ -1,8 +1,26 @@
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
+from django.core.cache import caches
+from store.authentication import get_user_cache
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # Кеш живет в памяти процесса и переживает откат базы между тестами
+    for cache in caches.all():
+        cache.clear()
+    user_cache = get_user_cache()
+    if user_cache is not None:
+        user_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def outbox_dispatcher(settings):
+    # Без фонового потока: тесты outbox доставляют события сами
+    settings.STORE_OUTBOX_DISPATCHER = None
+
+
 @pytest.fixture
 
 def api_client():
@@ -0,0 +1,131 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from store import authentication
+from store.authentication import UserCache
+from store.models import Cart, CartItem, Customer, Order, Product
+from rest_framework import status
+from model_bakery import baker
+import pytest
+
+
+@pytest.fixture
+def customer():
+    user = baker.make(get_user_model())
+    user.set_password('секрет-123')
+    user.save()
+    return Customer.objects.get(user=user)
+
+
+def customer_queries(queries):
+    return [query['sql'] for query in queries if 'store_customer' in query['sql']]
+
+
+@pytest.mark.django_db
+class TestCustomerClaims:
+    def test_token_carries_customer_claims(self, api_client, customer):
+        response = api_client.post('/auth/jwt/create/', {'username': customer.user.username,
+                                                         'password': 'секрет-123'})
+
+        assert response.status_code == status.HTTP_200_OK
+        access = AccessToken(response.data['access'])
+        refreshed = RefreshToken(response.data['refresh']).access_token
+        for token in [access, refreshed]:
+            assert (token['customer_id'], token['membership']) == (customer.id, 'B')
+
+    def test_orders_use_claim_without_customer_query(self, api_client, customer):
+        order = baker.make(Order, customer=customer)
+        token = api_client.post('/auth/jwt/create/', {'username': customer.user.username,
+                                                      'password': 'секрет-123'}).data['access']
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get('/orders/')
+
+        assert [row['id'] for row in response.data['results']] == [order.id]
+        assert customer_queries(queries) == []
+
+    def test_token_without_claims_falls_back_to_database(self, api_client, customer):
+        order = baker.make(Order, customer=customer)
+        token = AccessToken.for_user(customer.user)  # Выдан до появления claims
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get('/orders/')
+
+        assert [row['id'] for row in response.data['results']] == [order.id]
+        assert len(customer_queries(queries)) == 1
+
+
+    def test_if_claimed_customer_is_gone_it_is_recreated(self, api_client, customer):
+        token = api_client.post('/auth/jwt/create/', {'username': customer.user.username,
+                                                      'password': 'секрет-123'}).data['access']
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+        product = baker.make(Product, inventory=5)
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=product, quantity=1)
+        customer.delete()
+
+        me = api_client.get('/customers/me/')
+        order = api_client.post('/orders/', {'cart_id': str(cart.id)})
+
+        new_customer = Customer.objects.get(user=customer.user)
+        assert me.status_code == status.HTTP_200_OK
+        assert me.data['id'] == new_customer.id
+        assert order.status_code == status.HTTP_200_OK
+        assert Order.objects.get().customer_id == new_customer.id
+
+
+def user_queries(queries):
+    return [query['sql'] for query in queries if 'core_user' in query['sql']]
+
+
+@pytest.fixture
+def jwt_client(api_client, customer):
+    token = AccessToken.for_user(customer.user)
+    api_client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+    return api_client
+
+
+@pytest.mark.django_db
+class TestCachedUser:
+    def test_second_request_skips_user_query(self, jwt_client):
+        jwt_client.get('/customers/me/')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = jwt_client.get('/customers/me/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert user_queries(queries) == []
+
+    def test_if_user_is_deactivated_return_401(self, jwt_client, customer):
+        jwt_client.get('/customers/me/')
+        customer.user.is_active = False
+        customer.user.save()
+
+        response = jwt_client.get('/customers/me/')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_change_from_other_process_applies_after_ttl(self, jwt_client, customer,
+                                                         settings, monkeypatch):
+        jwt_client.get('/customers/me/')
+        # update() не шлет сигналов - как запись из другого процесса
+        get_user_model().objects.filter(pk=customer.user_id).update(is_active=False)
+
+        assert jwt_client.get('/customers/me/').status_code == status.HTTP_200_OK
+        now = authentication.monotonic()
+        monkeypatch.setattr(authentication, 'monotonic',
+                            lambda: now + settings.STORE_AUTH_USER_CACHE_TTL + 1)
+        assert jwt_client.get('/customers/me/').status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_cache_is_bounded(self):
+        users = baker.make(get_user_model(), _quantity=3)
+        cache = UserCache(maxsize=2, ttl=60)
+        for user in users:
+            cache.set(user.id, None, user)
+
+        assert cache.get(get_user_model(), users[0].id, None) is None
+        assert cache.get(get_user_model(), users[2].id, None).username == users[2].username
+        assert cache.get(get_user_model(), users[2].id, 'другая версия') is None
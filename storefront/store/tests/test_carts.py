@@ -0,0 +1,185 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from uuid import uuid4
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from store.carts import add_cart_items, sweep_carts, update_or_create_cart_items
+from store.models import Cart, CartItem, Product, Promotion
+from store.serializers import CartReadSerializer, CartSerializer
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from model_bakery import baker
+import pytest
+
+
+@pytest.fixture
+def cart():
+    return baker.make(Cart)
+
+
+@pytest.mark.django_db
+class TestAddCartItem:
+    def test_same_product_is_added_to_one_item(self, api_client, cart):
+        product = baker.make(Product)
+
+        first = api_client.post(f'/carts/{cart.id}/items/',
+                                {'product_id': product.id, 'quantity': 2})
+        second = api_client.post(f'/carts/{cart.id}/items/',
+                                 {'product_id': product.id, 'quantity': 3})
+
+        assert first.status_code == second.status_code == status.HTTP_201_CREATED
+        assert second.data == {'id': first.data['id'], 'product_id': product.id, 'quantity': 5}
+        assert CartItem.objects.get().quantity == 5
+
+    def test_if_product_does_not_exist_return_400(self, api_client, cart):
+        response = api_client.post(f'/carts/{cart.id}/items/', {'product_id': 0, 'quantity': 1})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['product_id'] is not None
+        assert not CartItem.objects.exists()
+
+    def test_fallback_without_upsert(self, cart):
+        product = baker.make(Product)
+        add_cart_items(cart.id, {product.id: 1})
+
+        items = update_or_create_cart_items(cart.id, {product.id: 2, 0: 1})
+
+        assert [(item.product_id, item.quantity) for item in items] == [(product.id, 3)]
+
+
+@pytest.mark.django_db
+class TestBulkAddCartItems:
+    def test_adds_and_updates_items(self, api_client, cart):
+        first, second = baker.make(Product, _quantity=2)
+        baker.make(CartItem, cart=cart, product=first, quantity=1)
+
+        response = api_client.post(f'/carts/{cart.id}/items/bulk/', {'items': [
+            {'product_id': first.id, 'quantity': 2},
+            {'product_id': second.id, 'quantity': 1},
+            {'product_id': second.id, 'quantity': 4},
+        ]}, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert sorted((item['product_id'], item['quantity']) for item in response.data) == \
+            [(first.id, 3), (second.id, 5)]
+        assert CartItem.objects.count() == 2
+
+    def test_if_any_product_does_not_exist_nothing_is_added(self, api_client, cart):
+        product = baker.make(Product)
+
+        response = api_client.post(f'/carts/{cart.id}/items/bulk/', {'items': [
+            {'product_id': product.id, 'quantity': 1},
+            {'product_id': 0, 'quantity': 1},
+        ]}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not CartItem.objects.exists()
+
+    def test_if_items_are_empty_return_400(self, api_client, cart):
+        response = api_client.post(f'/carts/{cart.id}/items/bulk/', {'items': []},
+                                   format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.parametrize('cart_id', [uuid4, lambda: 'abc'])
+    def test_if_cart_does_not_exist_return_404(self, api_client, cart_id):
+        product = baker.make(Product)
+        item = {'product_id': product.id, 'quantity': 1}
+
+        bulk = api_client.post(f'/carts/{cart_id()}/items/bulk/', {'items': [item]},
+                               format='json')
+        single = api_client.post(f'/carts/{cart_id()}/items/', item)
+
+        assert bulk.status_code == single.status_code == status.HTTP_404_NOT_FOUND
+        assert not CartItem.objects.exists()
+
+
+@pytest.mark.django_db
+class TestRetrieveCart:
+    def test_output_is_identical_to_cart_serializer(self, cart):
+        promotion = baker.make(Promotion, discount=15)
+        products = [baker.make(Product, unit_price=Decimal(price))
+                    for price in ['19.99', '1.05', '9999.50']]
+        products[0].promotion.add(promotion)
+        for quantity, product in enumerate(products, start=1):
+            baker.make(CartItem, cart=cart, product=product, quantity=quantity)
+        empty = baker.make(Cart)
+
+        for instance in [cart, empty]:
+            expected = CartSerializer(Cart.objects.get(pk=instance.pk)).data
+            actual = CartReadSerializer(instance.pk).data
+            assert JSONRenderer().render(actual) == JSONRenderer().render(expected)
+
+    def test_cart_is_cached_until_items_change(self, api_client, cart, django_assert_num_queries,
+                                               django_capture_on_commit_callbacks):
+        product = baker.make(Product, unit_price=Decimal('10'))
+        baker.make(CartItem, cart=cart, product=product, quantity=2)
+
+        with django_assert_num_queries(2):  # id товаров корзины + позиции
+            response = api_client.get(f'/carts/{cart.id}/')
+        assert response.data['total_price'] == Decimal('22.00')
+        with django_assert_num_queries(0):
+            api_client.get(f'/carts/{cart.id}/')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(f'/carts/{cart.id}/items/', {'product_id': product.id, 'quantity': 1})
+        assert api_client.get(f'/carts/{cart.id}/').data['total_price'] == Decimal('33.00')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product.unit_price = Decimal('20')
+            product.save()
+        assert api_client.get(f'/carts/{cart.id}/').data['total_price'] == Decimal('66.00')
+
+    def test_other_products_do_not_invalidate_cart(self, api_client, cart,
+                                                   django_assert_num_queries,
+                                                   django_capture_on_commit_callbacks):
+        baker.make(CartItem, cart=cart, product=baker.make(Product), quantity=1)
+        other = baker.make(Product)
+        api_client.get(f'/carts/{cart.id}/')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            other.unit_price = Decimal('99')
+            other.save()
+
+        with django_assert_num_queries(0):
+            response = api_client.get(f'/carts/{cart.id}/')
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_if_cart_does_not_exist_return_404(self, api_client):
+        assert api_client.get(f'/carts/{uuid4()}/').status_code == status.HTTP_404_NOT_FOUND
+        assert api_client.get('/carts/abc/').status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestSweepCarts:
+    def make_carts(self, count, days_idle):
+        carts = baker.make(Cart, _quantity=count)
+        for cart in carts:
+            baker.make(CartItem, cart=cart, quantity=1)
+        Cart.objects.filter(pk__in=[cart.pk for cart in carts]) \
+            .update(last_activity=timezone.now() - timedelta(days=days_idle))
+        return carts
+
+    def test_deletes_idle_carts_in_batches(self):
+        self.make_carts(5, days_idle=40)
+        fresh = self.make_carts(2, days_idle=1)
+
+        batches = list(sweep_carts(timedelta(days=30), batch_size=2, pause=0))
+
+        assert [(carts, items) for carts, items, _ in batches] == [(2, 2), (2, 2), (1, 1)]
+        assert set(Cart.objects.values_list('pk', flat=True)) == {cart.pk for cart in fresh}
+        assert CartItem.objects.count() == 2
+
+    def test_item_writes_keep_cart_alive(self, api_client):
+        cart, = self.make_carts(1, days_idle=40)
+        product = baker.make(Product)
+
+        api_client.post(f'/carts/{cart.id}/items/', {'product_id': product.id, 'quantity': 1})
+        out = StringIO()
+        call_command('sweep_carts', '--ttl-days', '30', '--pause', '0', stdout=out)
+
+        assert Cart.objects.filter(pk=cart.pk).exists()
+        assert 'Удалено корзин: 0' in out.getvalue()
@@ -0,0 +1,110 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from store.models import Collection, Product, Promotion
+from store.pricing import calculate_effective_price
+from store.signals import products_bulk_saved
+from model_bakery import baker
+from decimal import Decimal
+from io import StringIO
+import json
+import pytest
+
+
+def run(*args):
+    out = StringIO()
+    call_command(*args, stdout=out, stderr=StringIO())
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+class TestImportCatalog:
+    def test_csv_import_creates_then_upserts_by_slug(self, tmp_path):
+        promotion = baker.make(Promotion)
+        path = tmp_path / 'products.csv'
+        path.write_text(
+            'slug,title,description,unit_price,inventory,collection,promotions\n'
+            f'phone,Телефон,,100.50,5,Электроника,{promotion.id}\n'
+            'tv,Телевизор,Большой,300,2,Электроника,\n'
+            'mug,Кружка,,5,50,Посуда,\n', encoding='utf-8')
+
+        output = run('import_catalog', 'product', str(path), '--batch-size', '2')
+
+        assert 'Пачка 2' in output
+        assert Product.objects.count() == 3
+        assert Collection.objects.get(title='Электроника').products_count == 2
+        phone = Product.objects.get(slug='phone')
+        assert list(phone.promotion.all()) == [promotion]
+        assert phone.effective_price == calculate_effective_price(Decimal('100.50'),
+                                                                   [promotion.discount])
+
+        path.write_text(
+            'slug,title,unit_price,inventory,collection\n'
+            'phone,Смартфон,90,5,Посуда\n', encoding='utf-8')
+        run('import_catalog', 'product', str(path))
+
+        phone = Product.objects.get(slug='phone')
+        assert (phone.title, phone.unit_price, phone.collection.title) == \
+            ('Смартфон', Decimal('90'), 'Посуда')
+        assert Product.objects.count() == 3
+        assert Collection.objects.get(title='Посуда').products_count == 2
+
+    def test_file_without_description_keeps_descriptions(self, tmp_path):
+        baker.make(Product, slug='phone', description='Старое описание')
+        path = tmp_path / 'products.jsonl'
+        path.write_text(
+            '{"slug": "phone", "title": "Телефон", "unit_price": 90, "inventory": 1, '
+            '"collection": "Электроника"}\n'
+            '{"slug": "tv", "title": "Телевизор", "description": "Большой", "unit_price": 300, '
+            '"inventory": 2, "collection": "Электроника"}\n', encoding='utf-8')
+
+        run('import_catalog', 'product', str(path))
+
+        assert dict(Product.objects.values_list('slug', 'description')) == \
+            {'phone': 'Старое описание', 'tv': 'Большой'}
+
+    @pytest.mark.parametrize('unit_price, inventory', [(0, 5), (10, 0)])
+    def test_if_row_is_invalid_batch_is_rolled_back(self, tmp_path, unit_price, inventory):
+        product = baker.make(Product, slug='phone', unit_price=100, inventory=5)
+        path = tmp_path / 'products.csv'
+        path.write_text(
+            'slug,title,unit_price,inventory,collection\n'
+            'mug,Кружка,5,50,Посуда\n'
+            f'phone,Телефон,{unit_price},{inventory},Электроника\n', encoding='utf-8')
+
+        with pytest.raises(CommandError, match='phone'):
+            run('import_catalog', 'product', str(path))
+
+        assert list(Product.objects.values_list('slug', 'unit_price', 'inventory')) == \
+            [('phone', product.unit_price, 5)]
+
+    def test_bulk_update_honors_batch_size(self):
+        products = baker.make(Product, _quantity=5)
+        for product in products:
+            product.inventory = 7
+        batches = []
+
+        def receiver(sender, product_ids, **kwargs):
+            batches.append(len(product_ids))
+        products_bulk_saved.connect(receiver)
+        try:
+            rows = Product.objects.bulk_update(products, ['inventory'], batch_size=2)
+        finally:
+            products_bulk_saved.disconnect(receiver)
+
+        assert rows == 5
+        assert batches == [2, 2, 1]
+        assert set(Product.objects.values_list('inventory', flat=True)) == {7}
+
+    def test_jsonl_export_import_roundtrip(self, tmp_path):
+        baker.make(Product, collection=baker.make(Collection, title='Книги'),
+                   unit_price=Decimal('12.30'), inventory=3, _quantity=5)
+        path = tmp_path / 'products.jsonl'
+
+        run('export_catalog', 'product', '--output', str(path), '--batch-size', '2')
+        exported = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+        Product.objects.all().delete()
+        run('import_catalog', 'product', str(path))
+
+        assert len(exported) == 5
+        assert Product.objects.filter(collection__title='Книги',
+                                      unit_price=Decimal('12.30')).count() == 5
@@ -1,6 +1,9 @@
+from django.contrib.auth.models import User
 from store.models import Collection,Product
 from rest_framework import status
 from model_bakery import baker
+from django.core.management import call_command
+from io import StringIO
 import pytest
 
 
@@ -40,4 +43,69 @@ class TestRetrieveCollection:
     def test_if_collection_exists_return_200(self,api_client):
         collection=baker.make(Collection)#Создает тестовую категорию не трогая базу
         response=api_client.get(f'/collections/{collection.id}/')
-        assert response.status_code==status.HTTP_200_OK
\ No newline at end of file
+        assert response.status_code==status.HTTP_200_OK
+
+@pytest.mark.django_db
+class TestCollectionProductsCount:
+    def count(self, collection):
+        collection.refresh_from_db()
+        return collection.products_count
+
+    def test_create_move_and_delete(self):
+        old, new = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=old)
+        assert self.count(old) == 1
+
+        product.collection = new
+        product.save()
+        assert (self.count(old), self.count(new)) == (0, 1)
+
+        product.delete()
+        assert self.count(new) == 0
+
+    def test_bulk_paths(self):
+        old, new = baker.make(Collection, _quantity=2)
+        Product.objects.bulk_create(baker.prepare(Product, collection=old, _quantity=3))
+        assert self.count(old) == 3
+
+        Product.objects.filter(pk__in=Product.objects.values('pk')[:2]).update(collection=new)
+        assert (self.count(old), self.count(new)) == (1, 2)
+
+        products = list(Product.objects.filter(collection=new))
+        for product in products:
+            product.collection = old
+        Product.objects.bulk_update(products, ['collection'])
+        assert (self.count(old), self.count(new)) == (3, 0)
+
+        Product.objects.all().delete()
+        assert self.count(old) == 0
+
+    def test_stale_save_keeps_counter(self, api_client):
+        collection = baker.make(Collection)
+        stale = Collection.objects.get(pk=collection.pk)
+        baker.make(Product, collection=collection, _quantity=2)
+
+        stale.title = 'Новое название'
+        stale.save()
+        api_client.force_authenticate(user=User(is_staff=True))
+        api_client.patch(f'/collections/{collection.id}/', {'title': 'Еще новее'})
+
+        assert self.count(collection) == 2
+        assert collection.title == 'Еще новее'
+
+    def test_recount_command_repairs_counters(self):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, _quantity=2)
+        Collection.objects.update(products_count=10)
+
+        call_command('recount_products', batch_size=1, stdout=StringIO())
+
+        assert self.count(collection) == 2
+
+    def test_api_reads_counter(self, api_client):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection)
+
+        response = api_client.get(f'/collections/{collection.id}/')
+
+        assert response.data['products_count'] == 1
@@ -0,0 +1,115 @@
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from likes.models import LikeCounter, LikedItem
+from store.models import Product
+from rest_framework import status
+from model_bakery import baker
+import pytest
+
+
+@pytest.fixture
+def user(api_client):
+    user = baker.make(get_user_model())
+    api_client.force_authenticate(user=user)
+    return user
+
+
+def counts():
+    return dict(LikeCounter.objects.filter(likes_count__gt=0)
+                .values_list('object_id', 'likes_count'))
+
+
+@pytest.mark.django_db
+class TestProductLikes:
+    def test_if_user_is_anonymous_return_401(self, api_client):
+        product = baker.make(Product)
+
+        response = api_client.post(f'/products/{product.id}/like/')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_like_is_counted_once(self, api_client, user):
+        product = baker.make(Product)
+
+        api_client.post(f'/products/{product.id}/like/')
+        response = api_client.post(f'/products/{product.id}/like/')
+
+        assert response.data == {'product_id': product.id, 'likes_count': 1, 'liked': True}
+        assert LikedItem.objects.count() == 1
+
+        response = api_client.delete(f'/products/{product.id}/like/')
+        api_client.delete(f'/products/{product.id}/like/')
+
+        assert response.data == {'product_id': product.id, 'likes_count': 0, 'liked': False}
+        assert counts() == {}
+
+    def test_if_product_does_not_exist_return_404(self, api_client, user):
+        response = api_client.post('/products/999/like/')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_if_product_id_is_not_a_number_return_404(self, api_client, user):
+        response = api_client.post('/products/abc/like/')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_deleting_product_removes_its_likes(self, user):
+        tea, coffee = baker.make(Product, _quantity=2)
+        LikedItem.objects.like(user, Product, [tea.id, coffee.id])
+
+        tea.delete()
+
+        assert list(LikedItem.objects.values_list('object_id', flat=True)) == [coffee.id]
+        assert list(LikeCounter.objects.values_list('object_id', flat=True)) == [coffee.id]
+
+    def test_bulk_like_and_unlike(self, api_client, user):
+        tea, coffee, cocoa = baker.make(Product, _quantity=3)
+        other = baker.make(get_user_model())
+        LikedItem.objects.like(other, Product, [tea.id, coffee.id])
+        LikedItem.objects.like(user, Product, [cocoa.id])
+
+        response = api_client.post('/products/likes/', {
+            'like': [tea.id, coffee.id, 999], 'unlike': [cocoa.id]}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert {row['product_id']: (row['likes_count'], row['liked'])
+                for row in response.data} == {tea.id: (2, True), coffee.id: (2, True),
+                                              999: (0, False), cocoa.id: (0, False)}
+        assert counts() == {tea.id: 2, coffee.id: 2}
+
+    def test_if_product_is_liked_and_unliked_return_400(self, api_client, user):
+        response = api_client.post('/products/likes/', {'like': [1], 'unlike': [1]},
+                                   format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_like_states_for_page_use_two_queries(self, api_client, user,
+                                                  django_assert_num_queries):
+        products = baker.make(Product, _quantity=5)
+        LikedItem.objects.like(user, Product, [products[0].id, products[2].id])
+        ids = ','.join(str(product.id) for product in products)
+
+        with django_assert_num_queries(2):
+            response = api_client.get(f'/products/likes/?ids={ids}')
+
+        assert [row['liked'] for row in response.data] == [True, False, True, False, False]
+        assert [row['likes_count'] for row in response.data] == [1, 0, 1, 0, 0]
+
+    def test_anonymous_sees_counts(self, api_client):
+        product = baker.make(Product)
+        LikedItem.objects.like(baker.make(get_user_model()), Product, [product.id])
+
+        response = api_client.get(f'/products/likes/?ids={product.id}')
+
+        assert response.data == [{'product_id': product.id, 'likes_count': 1, 'liked': False}]
+
+    def test_orm_writes_keep_counter(self):
+        product = baker.make(Product)
+        users = baker.make(get_user_model(), _quantity=2)
+        for user in users:
+            LikedItem.objects.create(user=user, object_id=product.id,
+                                     content_type=ContentType.objects.get_for_model(Product))
+
+        users[0].delete()  # Каскад удаляет лайк
+
+        assert counts() == {product.id: 1}
@@ -0,0 +1,185 @@
+from django.contrib.auth import get_user_model
+from store.facets import count_rows, precomputed_rows
+from store.models import Cart, CartItem, Customer, Order, OrderItem, Product
+from store.serializers import CreateOrderSerializer
+from rest_framework.exceptions import ValidationError
+from rest_framework import status
+from model_bakery import baker
+import json
+from base64 import b64encode
+import pytest
+
+
+@pytest.fixture
+def orders():
+    customer = Customer.objects.get(user=baker.make(get_user_model()))
+    product = baker.make(Product, title='Чайник')
+    paid = baker.make(Order, customer=customer, payment_status=Order.PAYMENT_STATUS_COMPLETE)
+    pending = baker.make(Order, customer=customer)
+    for order in [paid, pending]:
+        baker.make(OrderItem, order=order, product=product, quantity=2, unit_price=10)
+    return paid, pending
+
+
+@pytest.mark.django_db
+class TestOrderExport:
+    def content(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_if_user_is_not_admin_return_403(self, api_client, authenticate, orders):
+        authenticate()
+        response = api_client.get('/orders/export/')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_ndjson_with_status_filter(self, api_client, authenticate, orders):
+        authenticate(is_staff=True)
+
+        response = api_client.get('/orders/export/?payment_status=C&placed_after=2000-01-01')
+
+        lines = [json.loads(line) for line in self.content(response).splitlines()]
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert [line['id'] for line in lines] == [orders[0].id]
+        assert lines[0]['items'][0]['product']['title'] == 'Чайник'
+
+    def test_csv_has_row_per_item(self, api_client, authenticate, orders):
+        authenticate(is_staff=True)
+
+        response = api_client.get('/orders/export/?output=csv')
+
+        rows = self.content(response).splitlines()
+        assert rows[0].startswith('order_id,placed_at')
+        assert len(rows) == 3
+
+    def test_if_date_is_invalid_return_400(self, api_client, authenticate):
+        authenticate(is_staff=True)
+        response = api_client.get('/orders/export/?placed_before=вчера')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_date_does_not_exist_return_400(self, api_client, authenticate):
+        authenticate(is_staff=True)
+        response = api_client.get('/orders/export/?placed_after=2020-13-45')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.fixture
+def checkout(api_client):
+    user = baker.make(get_user_model())
+    api_client.force_authenticate(user=user)
+
+    def do_checkout(cart):
+        return api_client.post('/orders/', {'cart_id': str(cart.id)})
+    return do_checkout
+
+
+@pytest.mark.django_db
+class TestCheckoutInventory:
+    def test_decrements_inventory(self, checkout):
+        kettle = baker.make(Product, inventory=12)
+        cup = baker.make(Product, inventory=3)
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=kettle, quantity=5)
+        baker.make(CartItem, cart=cart, product=cup, quantity=3)
+
+        response = checkout(cart)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert dict(Product.objects.values_list('id', 'inventory')) == {kettle.id: 7, cup.id: 0}
+        assert sorted(item['quantity'] for item in response.data['items']) == [3, 5]
+        assert not Cart.objects.filter(pk=cart.pk).exists()
+        # Фасет "мало на складе" обновлен по разнице
+        assert sorted(precomputed_rows()) == sorted(count_rows(Product.objects.all()))
+
+    def test_if_stock_is_short_nothing_changes(self, checkout):
+        kettle = baker.make(Product, inventory=12)
+        cup = baker.make(Product, inventory=2)
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=kettle, quantity=5)
+        baker.make(CartItem, cart=cart, product=cup, quantity=3)
+
+        response = checkout(cart)
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert [(error['product_id'], error['available']) for error in response.data['items']] \
+            == [(cup.id, 2)]
+        assert dict(Product.objects.values_list('id', 'inventory')) == {kettle.id: 12, cup.id: 2}
+        assert not Order.objects.exists()
+        assert CartItem.objects.filter(cart=cart).count() == 2
+
+
+    def test_stock_errors_list_only_short_products(self, checkout):
+        # Чайник списывается первым: после списания его остаток 3 < 5, но не хватает только чашки
+        kettle = baker.make(Product, inventory=8)
+        cup = baker.make(Product, inventory=2)
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=kettle, quantity=5)
+        baker.make(CartItem, cart=cart, product=cup, quantity=3)
+
+        response = checkout(cart)
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert [(error['product_id'], error['quantity'], error['available'])
+                for error in response.data['items']] == [(cup.id, 3, 2)]
+        assert dict(Product.objects.values_list('id', 'inventory')) == {kettle.id: 8, cup.id: 2}
+
+    def test_if_cart_was_emptied_after_validation_no_order_is_created(self):
+        product = baker.make(Product, inventory=5)
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=product, quantity=1)
+        customer = Customer.objects.get(user=baker.make(get_user_model()))
+        serializer = CreateOrderSerializer(data={'cart_id': str(cart.id)},
+                                           context={'customer_id': customer.id})
+        serializer.is_valid(raise_exception=True)
+        Cart.objects.filter(pk=cart.pk).delete()  # Параллельное оформление той же корзины
+
+        with pytest.raises(ValidationError):
+            serializer.save()
+
+        assert not Order.objects.exists()
+        assert Product.objects.get(pk=product.pk).inventory == 5
+
+
+@pytest.mark.django_db
+class TestOrderHistory:
+    def test_if_user_is_anonymous_return_401(self, api_client):
+        response = api_client.get('/orders/')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_returns_own_orders_newest_first_with_totals(self, api_client, orders):
+        paid, pending = orders
+        baker.make(OrderItem, order=pending, product=baker.make(Product), quantity=1, unit_price='2.50')
+        other = Customer.objects.get(user=baker.make(get_user_model()))
+        baker.make(Order, customer=other)  # Чужой заказ
+        api_client.force_authenticate(user=paid.customer.user)
+
+        response = api_client.get('/orders/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [order['id'] for order in response.data['results']] == [pending.id, paid.id]
+        assert [str(order['total_price']) for order in response.data['results']] \
+            == ['22.50', '20.00']
+
+    def test_cursor_walks_all_pages(self, api_client):
+        customer = Customer.objects.get(user=baker.make(get_user_model()))
+        placed = baker.make(Order, customer=customer, _quantity=5)
+        Order.objects.update(placed_at=placed[0].placed_at)  # Порядок держит только id
+        api_client.force_authenticate(user=customer.user)
+
+        ids = []
+        url = '/orders/?page_size=2'
+        while url:
+            data = api_client.get(url).data
+            ids += [order['id'] for order in data['results']]
+            url = data['next']
+
+        assert ids == sorted(ids, reverse=True)
+        assert sorted(ids) == sorted(order.id for order in placed)
+
+    @pytest.mark.parametrize('values, reverse', [(5, 0), (None, 0), (['x', '1'], 'yes')])
+    def test_if_cursor_is_malformed_return_404(self, api_client, values, reverse):
+        api_client.force_authenticate(user=baker.make(get_user_model()))
+        cursor = json.dumps({'o': '-placed_at,-id', 'v': values, 'r': reverse})
+
+        response = api_client.get('/orders/', {'cursor': b64encode(cursor.encode()).decode()})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from store.models import Cart, CartItem, Customer, Order, OutboxEvent, Product
+from store.outbox import deliver_pending, publish
+from store.signals import order_created
+from model_bakery import baker
+import pytest
+
+
+@pytest.fixture
+def receiver():
+    calls = []
+
+    def on_order_created(sender, order, event, **kwargs):
+        calls.append(order.id)
+        if receiver.fail:
+            raise RuntimeError('Склад недоступен')
+
+    receiver.fail = False
+    receiver.calls = calls
+    order_created.connect(on_order_created)
+    yield receiver
+    order_created.disconnect(on_order_created)
+
+
+@pytest.fixture
+def checkout(api_client):
+    user = baker.make(get_user_model())
+    api_client.force_authenticate(user=user)
+
+    def do_checkout(inventory=10):
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=baker.make(Product, inventory=inventory),
+                   quantity=2)
+        return api_client.post('/orders/', {'cart_id': str(cart.id)})
+    return do_checkout
+
+
+@pytest.mark.django_db
+class TestOutbox:
+    def test_order_created_is_delivered_after_checkout(self, checkout, receiver):
+        response = checkout()
+
+        assert receiver.calls == []  # Оформление не ждет получателей
+        event = OutboxEvent.objects.get()
+        assert (event.topic, event.payload) == ('order_created', {'order_id': response.data['id']})
+
+        assert deliver_pending() == 1
+        assert receiver.calls == [response.data['id']]
+        assert OutboxEvent.objects.get().delivered_at is not None
+        assert deliver_pending() == 0
+
+    def test_failed_checkout_publishes_nothing(self, checkout):
+        checkout(inventory=1)
+        assert not OutboxEvent.objects.exists()
+
+    def test_failed_delivery_is_retried_with_backoff(self, receiver):
+        order = baker.make(Order, customer=Customer.objects.get(user=baker.make(get_user_model())))
+        publish('order_created', order_id=order.id)
+        receiver.fail = True
+
+        deliver_pending()
+
+        event = OutboxEvent.objects.get()
+        assert (event.attempts, event.delivered_at) == (1, None)
+        assert 'Склад недоступен' in event.last_error
+        assert event.available_at > timezone.now()
+        assert deliver_pending() == 0  # Еще рано
+
+        receiver.fail = False
+        OutboxEvent.objects.update(available_at=timezone.now())
+        deliver_pending()
+        assert receiver.calls == [order.id, order.id]  # at-least-once
+        assert OutboxEvent.objects.get().delivered_at is not None
+
+    def test_sync_dispatcher_delivers_on_commit(self, settings, checkout, receiver,
+                                                django_capture_on_commit_callbacks):
+        settings.STORE_OUTBOX_DISPATCHER = 'sync'
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = checkout()
+
+        assert receiver.calls == [response.data['id']]
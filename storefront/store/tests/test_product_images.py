@@ -0,0 +1,76 @@
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from store.models import Product, ProductImage
+from rest_framework import status
+from model_bakery import baker
+from PIL import Image
+import pytest
+
+
+def make_upload(color='red', size=(2000, 1000)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+
+@pytest.fixture(autouse=True)
+def media(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.STORE_IMAGE_WORKERS = 0  # Без пула: варианты строятся на коммите
+    settings.STORE_IMAGE_VARIANTS = {'large': 800, 'small': 100}
+    return tmp_path
+
+
+@pytest.fixture
+def upload(api_client, authenticate, django_capture_on_commit_callbacks):
+    def do_upload(product, image):
+        authenticate(is_staff=True)
+        with django_capture_on_commit_callbacks(execute=True):
+            return api_client.post(f'/products/{product.id}/images/', {'image': image},
+                                   format='multipart')
+    return do_upload
+
+
+@pytest.mark.django_db
+class TestProductImageVariants:
+    def test_upload_builds_variants(self, api_client, upload, media):
+        product = baker.make(Product)
+
+        response = upload(product, make_upload())
+
+        assert response.status_code == status.HTTP_201_CREATED
+        response = api_client.get(f'/products/{product.id}/images/')
+        variants = response.data[0]['variants']
+        assert list(variants) == ['small', 'large']  # От меньшего к большему
+        assert (variants['small']['width'], variants['small']['height']) == (100, 50)
+        assert (variants['large']['width'], variants['large']['height']) == (800, 400)
+        image = ProductImage.objects.get()
+        for variant in image.variants.values():
+            with Image.open(media / variant['path']) as file:
+                assert file.format == 'WEBP'
+
+        response = api_client.get(f'/products/{product.id}/')
+        assert response.data['images'][0]['variants'] == variants
+
+    def test_same_upload_is_stored_once(self, upload, media):
+        first, second = baker.make(Product, _quantity=2)
+
+        upload(first, make_upload())
+        upload(second, make_upload())
+        upload(second, make_upload(color='blue'))
+
+        images = list(ProductImage.objects.order_by('id'))
+        assert images[0].image.name == images[1].image.name
+        assert images[0].variants == images[1].variants
+        assert images[2].content_hash != images[0].content_hash
+        assert len(list((media / 'store' / 'images').glob('*.png'))) == 2
+
+    def test_if_user_is_anonymous_return_401(self, api_client):
+        product = baker.make(Product)
+
+        response = api_client.post(f'/products/{product.id}/images/',
+                                   {'image': make_upload()}, format='multipart')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert not ProductImage.objects.exists()
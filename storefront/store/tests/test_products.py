@@ -0,0 +1,415 @@
+from store.facets import count_rows, precomputed_rows
+from store.models import Collection, Product, ProductImage, Promotion
+from store.serializers import ProductSerializer, ProductReadSerializer
+from tags.models import Tag, TaggedItem
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from model_bakery import baker
+from decimal import Decimal
+import pytest
+
+
+@pytest.fixture
+def products():
+    collection = baker.make(Collection)
+    # Одинаковые цены - проверяем tie-breaker по id
+    return [baker.make(Product, collection=collection, unit_price=Decimal(10 + i % 3))
+            for i in range(25)]
+
+
+@pytest.mark.django_db
+class TestProductCursorPagination:
+    def walk(self, api_client, url):
+        ids = []
+        while url:
+            response = api_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_walks_all_products_once_in_order(self, api_client, products):
+        ids = self.walk(api_client, '/products/?cursor=&ordering=-unit_price')
+
+        expected = sorted(products, key=lambda p: (-p.unit_price, -p.id))
+        assert ids == [p.id for p in expected]
+
+    def test_default_title_ordering(self, api_client, products):
+        ids = self.walk(api_client, '/products/?cursor=&page_size=7')
+
+        expected = sorted(products, key=lambda p: (p.title, p.id))
+        assert ids == [p.id for p in expected]
+
+    def test_previous_link_returns_previous_page(self, api_client, products):
+        first = api_client.get('/products/?cursor=&ordering=unit_price').data
+        second = api_client.get(first['next']).data
+        back = api_client.get(second['previous']).data
+
+        assert back['results'] == first['results']
+        assert first['previous'] is None
+
+    def test_approximate_count(self, api_client, products):
+        response = api_client.get('/products/?cursor=&count=approx')
+
+        assert response.data['count'] == 25
+        assert response.data['count_is_approximate'] is True
+
+    def test_if_cursor_is_invalid_return_404(self, api_client, products):
+        response = api_client.get('/products/?cursor=garbage')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_without_cursor_page_number_pagination_is_used(self, api_client, products):
+        response = api_client.get('/products/')
+
+        assert response.data['count'] == 25
+
+
+@pytest.mark.django_db(transaction=True)  # Кеш каталога сбрасывается on_commit
+class TestProductSearch:
+    def test_ranks_by_relevance(self, api_client):
+        collection = baker.make(Collection)
+        weak = baker.make(Product, collection=collection, title='Apple чехол',
+                          description='Подходит для телефона iphone')
+        strong = baker.make(Product, collection=collection, title='Смартфон iphone 15',
+                            description='Смартфон iphone')
+        baker.make(Product, collection=collection, title='Ноутбук', description='')
+
+        response = api_client.get('/products/?search=iphone')
+
+        assert [item['id'] for item in response.data['results']] == [strong.id, weak.id]
+
+    def test_index_follows_updates_and_deletes(self, api_client):
+        product = baker.make(Product, title='Старое название')
+        product.title = 'Новое название'
+        product.save()
+
+        assert api_client.get('/products/?search=старое').data['count'] == 0
+        assert api_client.get('/products/?search=новое').data['count'] == 1
+
+        product.delete()
+
+        assert api_client.get('/products/?search=новое').data['count'] == 0
+
+    def test_search_syntax_is_escaped(self, api_client):
+        baker.make(Product, title='Кабель "USB" AND')
+
+        response = api_client.get('/products/?search="usb" OR')
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db(transaction=True)
+class TestProductCache:
+    def test_list_is_served_from_cache(self, api_client, django_assert_num_queries):
+        baker.make(Product, _quantity=3)
+        api_client.get('/products/')
+
+        with django_assert_num_queries(1):  # Только валидатор ETag
+            response = api_client.get('/products/')
+
+        assert response.data['count'] == 3
+
+    def test_product_save_invalidates_list_and_detail(self, api_client):
+        product = baker.make(Product, title='Старое')
+        api_client.get('/products/')
+        api_client.get(f'/products/{product.id}/')
+
+        product.title = 'Новое'
+        product.save()
+
+        assert api_client.get('/products/').data['results'][0]['title'] == 'Новое'
+        assert api_client.get(f'/products/{product.id}/').data['title'] == 'Новое'
+
+    def test_moving_product_invalidates_both_collections(self, api_client):
+        old, new = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=old)
+        api_client.get(f'/products/?collection_id={old.id}')
+        api_client.get(f'/products/?collection_id={new.id}')
+
+        product.collection = new
+        product.save()
+
+        assert api_client.get(f'/products/?collection_id={old.id}').data['count'] == 0
+        assert api_client.get(f'/products/?collection_id={new.id}').data['count'] == 1
+
+    def test_new_product_invalidates_collection_counts(self, api_client):
+        collection = baker.make(Collection)
+        api_client.get('/collections/')
+
+        baker.make(Product, collection=collection)
+
+        assert api_client.get('/collections/').data[0]['products_count'] == 1
+
+
+@pytest.mark.django_db(transaction=True)
+class TestProductConditionalGet:
+    def test_if_etag_matches_return_304(self, api_client):
+        product = baker.make(Product)
+        etag = api_client.get(f'/products/{product.id}/')['ETag']
+
+        response = api_client.get(f'/products/{product.id}/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+
+    def test_if_modified_since_return_304(self, api_client):
+        product = baker.make(Product)
+        last_modified = api_client.get(f'/products/{product.id}/')['Last-Modified']
+
+        response = api_client.get(f'/products/{product.id}/',
+                                  HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_new_image_changes_etag(self, api_client):
+        product = baker.make(Product)
+        etag = api_client.get(f'/products/{product.id}/')['ETag']
+
+        baker.make(ProductImage, product=product)
+        response = api_client.get(f'/products/{product.id}/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['images']) == 1
+
+    def test_list_etag_changes_on_delete(self, api_client):
+        products = baker.make(Product, _quantity=2)
+        etag = api_client.get('/products/')['ETag']
+
+        products[0].delete()
+        response = api_client.get('/products/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 1
+
+    def test_collection_list_etag_changes_on_new_product(self, api_client):
+        collection = baker.make(Collection)
+        etag = api_client.get('/collections/')['ETag']
+
+        baker.make(Product, collection=collection)
+        response = api_client.get('/collections/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+class TestProductReadSerializer:
+    def test_output_is_byte_identical_to_product_serializer(self):
+        collection = baker.make(Collection)
+        products = [
+            baker.make(Product, collection=collection, unit_price=Decimal('19.99'),
+                       description=None),
+            baker.make(Product, collection=collection, unit_price=Decimal('1.05')),
+            baker.make(Product, collection=collection, unit_price=Decimal('9999.50')),
+        ]
+        baker.make(ProductImage, product=products[0], image='store/images/a.jpg')
+        baker.make(ProductImage, product=products[0], image='store/images/b c.jpg')
+        baker.make(ProductImage, product=products[2], image='store/images/d.png')
+        for label in ['чай', 'акция']:
+            baker.make(TaggedItem, tag=baker.make(Tag, label=label),
+                       content_object=products[1])
+        request = Request(APIRequestFactory().get('/products/'))
+        queryset = Product.objects.order_by('id')
+
+        expected = ProductSerializer(queryset, many=True, context={'request': request}).data
+        actual = ProductReadSerializer(queryset.values(*ProductReadSerializer.fields),
+                                       many=True, context={'request': request}).data
+
+        assert JSONRenderer().render(actual) == JSONRenderer().render(expected)
+
+    def test_retrieve_uses_one_query_for_images(self, api_client, django_assert_num_queries):
+        product = baker.make(Product)
+        baker.make(ProductImage, product=product, image='store/images/a.jpg', _quantity=3)
+
+        # Валидатор ETag + товар + картинки + тэги
+        with django_assert_num_queries(4):
+            response = api_client.get(f'/products/{product.id}/')
+
+        assert len(response.data['images']) == 3
+
+
+@pytest.mark.django_db
+class TestEffectivePrice:
+    def price(self, product):
+        product.refresh_from_db()
+        return product.effective_price
+
+    def test_new_product_price_includes_tax(self):
+        product = baker.make(Product, unit_price=Decimal('100'))
+        assert self.price(product) == Decimal('110.00')
+
+    def test_promotions_stack_and_follow_changes(self):
+        product = baker.make(Product, unit_price=Decimal('100'))
+        half, tenth = baker.make(Promotion, discount=50), baker.make(Promotion, discount=10)
+
+        product.promotion.add(half, tenth)
+        assert self.price(product) == Decimal('49.50')  # 100 * 0.5 * 0.9 * 1.1
+
+        half.discount = 20
+        half.save()
+        assert self.price(product) == Decimal('79.20')
+
+        tenth.delete()
+        assert self.price(product) == Decimal('88.00')
+
+        product.unit_price = Decimal('50')
+        product.save()
+        assert self.price(product) == Decimal('44.00')
+
+    def test_bulk_price_update_recomputes(self):
+        products = baker.make(Product, unit_price=Decimal('10'), _quantity=3)
+
+        Product.objects.update(unit_price=Decimal('20'))
+
+        assert {self.price(p) for p in products} == {Decimal('22.00')}
+
+    def test_ordering_by_effective_price(self, api_client):
+        cheap = baker.make(Product, unit_price=Decimal('100'))
+        expensive = baker.make(Product, unit_price=Decimal('60'))
+        cheap.promotion.add(baker.make(Promotion, discount=50))
+
+        response = api_client.get('/products/?ordering=effective_price')
+
+        assert [item['id'] for item in response.data['results']] == [cheap.id, expensive.id]
+
+
+@pytest.mark.django_db(transaction=True)
+class TestProductFacets:
+    def cube(self):
+        return sorted((c, b, l, n) for c, _, b, l, n in precomputed_rows())
+
+    def actual(self):
+        return sorted((c, b, l, n) for c, _, b, l, n in count_rows(Product.objects.all()))
+
+    def test_cube_follows_product_writes(self):
+        first, second = baker.make(Collection, _quantity=2)
+        products = baker.make(Product, collection=first, unit_price=Decimal('5'),
+                              inventory=100, _quantity=3)
+        assert self.cube() == self.actual() == [(first.id, 0, False, 3)]
+
+        product = products[0]
+        product.collection = second
+        product.unit_price = Decimal('75')
+        product.inventory = 3
+        product.save()
+        products[1].delete()
+        Product.objects.filter(pk=products[2].pk).update(inventory=1)
+        Product.objects.bulk_update([product], ['unit_price'])
+        baker.make(Product, collection=second, unit_price=Decimal('1000'), inventory=50)
+
+        assert self.cube() == self.actual() == [
+            (first.id, 0, True, 1), (second.id, 2, True, 1), (second.id, 4, False, 1)]
+
+    def test_update_is_chunked_and_keeps_counters(self, monkeypatch):
+        first, second = baker.make(Collection, _quantity=2)
+        baker.make(Product, collection=first, inventory=100, _quantity=5)
+        monkeypatch.setattr(Product.objects._queryset_class, 'update_batch_size', 2)
+
+        # Фильтр по меняемому полю: ни одна строка не пропущена и не обновлена дважды
+        rows = Product.objects.filter(collection=first).update(collection=second, inventory=1)
+
+        assert rows == 5
+        assert list(Collection.objects.order_by('id').values_list('products_count', flat=True)) \
+            == [0, 5]
+        assert self.cube() == self.actual()
+
+    def test_list_with_facets(self, api_client):
+        collection = baker.make(Collection, title='Чай')
+        baker.make(Product, collection=collection, title='Зеленый чай',
+                   unit_price=Decimal('5'), inventory=3)
+        baker.make(Product, collection=collection, title='Черный чай',
+                   unit_price=Decimal('60'), inventory=50)
+        baker.make(Product, title='Кофе', unit_price=Decimal('60'), inventory=50)
+
+        response = api_client.get('/products/?facets=collection,inventory')
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 3
+        assert set(response.data['facets']) == {'collection', 'inventory'}
+        assert response.data['facets']['inventory'] == [
+            {'value': 'low', 'count': 1}, {'value': 'ok', 'count': 2}]
+
+        response = api_client.get('/products/facets/?search=чай')
+        assert response.data['collection'] == [
+            {'id': collection.id, 'title': 'Чай', 'count': 2}]
+        assert [bucket['count'] for bucket in response.data['price']] == [1, 0, 1, 0, 0]
+
+        response = api_client.get('/products/?price=50-100&inventory=ok&facets=')
+        assert response.data['count'] == 2
+        assert response.data['facets']['price'][2] == \
+            {'value': '50-100', 'min': 50, 'max': 100, 'count': 2}
+
+    def test_if_facet_value_is_unknown_returns_400(self, api_client):
+        assert api_client.get('/products/?price=1-2').status_code == \
+            status.HTTP_400_BAD_REQUEST
+        assert api_client.get('/products/?inventory=none').status_code == \
+            status.HTTP_400_BAD_REQUEST
+
+
+def tag(product, label):
+    return baker.make(TaggedItem, tag=Tag.objects.get_or_create(label=label)[0],
+                      content_object=product)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestProductTags:
+    def test_tags_are_inline_in_list_and_detail(self, api_client):
+        tea, coffee = baker.make(Product, _quantity=2)
+        tag(tea, 'новинка')
+        tag(tea, 'зеленый')
+        tag(coffee, 'новинка')
+
+        results = {row['id']: row['tags'] for row in api_client.get('/products/').data['results']}
+
+        assert results == {tea.id: ['зеленый', 'новинка'], coffee.id: ['новинка']}
+        assert api_client.get(f'/products/{coffee.id}/').data['tags'] == ['новинка']
+
+    def test_tags_for_many_is_one_query(self, django_assert_num_queries):
+        products = baker.make(Product, _quantity=3)
+        for product in products:
+            tag(product, 'новинка')
+
+        with django_assert_num_queries(1):
+            tags = TaggedItem.objects.get_tags_for_many(Product, [p.id for p in products])
+
+        assert {product_id: [t.label for t in items] for product_id, items in tags.items()} == \
+            {product.id: ['новинка'] for product in products}
+
+    def test_filter_by_tag(self, api_client):
+        tea, coffee, cocoa = baker.make(Product, _quantity=3)
+        tag(tea, 'новинка')
+        tag(coffee, 'новинка')
+        tag(coffee, 'акция')
+        # Тот же object_id у другой модели не должен попасть в выборку
+        baker.make(TaggedItem, tag=Tag.objects.get(label='акция'),
+                   content_object=baker.make(Promotion, id=cocoa.id))
+
+        new = api_client.get('/products/?tag=новинка&facets=collection').data
+        both = api_client.get('/products/?tag=новинка&tag=акция').data
+
+        assert sorted(row['id'] for row in new['results']) == sorted([tea.id, coffee.id])
+        assert sum(entry['count'] for entry in new['facets']['collection']) == 2
+        assert [row['id'] for row in both['results']] == [coffee.id]
+
+    def test_tagging_invalidates_cached_product(self, api_client):
+        product = baker.make(Product)
+        assert api_client.get(f'/products/{product.id}/').data['tags'] == []
+
+        item = tag(product, 'новинка')
+        assert api_client.get(f'/products/{product.id}/').data['tags'] == ['новинка']
+
+        item.delete()
+        assert api_client.get('/products/').data['results'][0]['tags'] == []
+
+    def test_renaming_tag_invalidates_tagged_products(self, api_client):
+        product = baker.make(Product)
+        item = tag(product, 'новинка')
+        first = api_client.get(f'/products/{product.id}/')
+
+        item.tag.label = 'хит'
+        item.tag.save()
+        response = api_client.get(f'/products/{product.id}/', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['tags'] == ['хит']
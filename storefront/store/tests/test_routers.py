@@ -0,0 +1,132 @@
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.test.utils import CaptureQueriesContext
+from store.models import Collection, Product
+from store.routers import STICKY_COOKIE, ReplicaRouter, use_replica, reset_replica
+from rest_framework import status
+from model_bakery import baker
+import pytest
+
+
+@pytest.fixture
+def replica(settings):
+    # Второе подключение к той же тестовой базе - реплика без отставания.
+    # Видит только закоммиченное, поэтому тесты - transaction=True
+    connections.settings['replica'] = dict(connections['default'].settings_dict)
+    settings.STORE_DB_REPLICAS = ['replica']
+    yield connections['replica']
+    connections['replica'].close()
+    del connections['replica']
+    del connections.settings['replica']
+
+
+@pytest.fixture
+def lagging_replica(settings):
+    # Отдельная база в памяти: отстает, пока не вызван sync()
+    connections.settings['replica'] = dict(connections['default'].settings_dict,
+                                           NAME='file:replica_lag?mode=memory&cache=shared')
+    settings.STORE_DB_REPLICAS = ['replica']
+    replica = connections['replica']
+
+    def sync():
+        connections['default'].ensure_connection()
+        replica.ensure_connection()
+        connections['default'].connection.backup(replica.connection)
+
+    yield sync
+    replica.close()
+    del connections['replica']
+    del connections.settings['replica']
+
+
+def count_queries(alias, request):
+    with CaptureQueriesContext(connections[alias]) as queries:
+        response = request()
+    return response, len(queries)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestReplicaRouting:
+    def test_safe_requests_read_from_replica(self, api_client, replica):
+        product = baker.make(Product)
+
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(replica) as replica_queries:
+                products = api_client.get('/products/')
+                detail = api_client.get(f'/products/{product.id}/')
+                reviews = api_client.get(f'/products/{product.id}/reviews/')
+
+        assert [products.status_code, detail.status_code, reviews.status_code] \
+            == [status.HTTP_200_OK] * 3
+        assert len(primary) == 0
+        assert len(replica_queries) > 0
+
+    def test_client_reads_from_primary_after_write(self, api_client, replica):
+        api_client.force_authenticate(user=baker.make(get_user_model(), is_staff=True))
+
+        response = api_client.post('/collections/', {'title': 'a'})
+        collections, primary = count_queries('default', lambda: api_client.get('/collections/'))
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert STICKY_COOKIE in response.cookies
+        assert primary > 0
+        assert collections.data[0]['title'] == 'a'
+
+    def test_authenticated_client_without_cookies_is_sticky(self, api_client, replica):
+        api_client.force_authenticate(user=baker.make(get_user_model(), is_staff=True))
+        api_client.post('/collections/', {'title': 'a'})
+        api_client.cookies.clear()  # JWT-клиент cookie не хранит
+
+        response, queries = count_queries('replica', lambda: api_client.get('/collections/'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert queries == 0
+
+    def test_without_replicas_reads_from_primary(self, api_client):
+        baker.make(Collection)
+
+        response = api_client.get('/collections/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert STICKY_COOKIE not in response.cookies
+
+    def test_transaction_reads_from_primary(self, replica):
+        router = ReplicaRouter()
+        token = use_replica('replica')
+        try:
+            outside = router.db_for_read(Product)
+            with transaction.atomic():
+                inside = router.db_for_read(Product)
+        finally:
+            reset_replica(token)
+
+        assert outside == 'replica'
+        assert inside is None
+        assert router.db_for_write(Product) == 'default'
+
+    def test_replica_reads_after_write_do_not_fill_catalog_cache(self, api_client,
+                                                                 lagging_replica):
+        product = baker.make(Product, unit_price=10)
+        lagging_replica()
+        api_client.force_authenticate(user=baker.make(get_user_model(), is_staff=True))
+        api_client.patch(f'/products/{product.id}/', {'price': 20})
+        api_client.force_authenticate(user=None)
+        api_client.cookies.clear()  # Другой клиент: читает с реплики
+
+        stale = api_client.get(f'/products/{product.id}/')  # Реплика еще отстает
+        lagging_replica()
+        fresh = api_client.get(f'/products/{product.id}/')
+
+        assert stale.data['price'] == 10
+        assert fresh.data['price'] == 20
+
+    def test_replica_reads_fill_catalog_cache(self, api_client, replica, settings):
+        settings.STORE_DB_STICKY_SECONDS = 0  # Поколение сразу считается догнанным
+        product = baker.make(Product)
+        api_client.get(f'/products/{product.id}/')
+
+        response, queries = count_queries(
+            'replica', lambda: api_client.get(f'/products/{product.id}/'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert queries == 1  # Только валидатор ETag
@@ -0,0 +1,115 @@
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from store.models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product, \
+    SalesDaily, SalesHourly
+from store.outbox import deliver_pending, publish
+from rest_framework import status
+from model_bakery import baker
+import pytest
+
+
+def rollup(model):
+    return sorted((row.product_id, row.payment_status, row.units, str(row.revenue))
+                  for row in model.objects.all() if row.units)
+
+
+@pytest.fixture
+def staff(api_client):
+    api_client.force_authenticate(user=baker.make(get_user_model(), is_staff=True))
+
+
+@pytest.fixture
+def history():
+    customer = Customer.objects.get(user=baker.make(get_user_model()))
+    kettle = baker.make(Product, collection=baker.make(Collection, title='Кухня'))
+    cup = baker.make(Product, collection=kettle.collection)
+    for payment_status in ['C', 'C', 'P']:
+        order = baker.make(Order, customer=customer, payment_status=payment_status)
+        baker.make(OrderItem, order=order, product=kettle, quantity=1, unit_price='100.00')
+        baker.make(OrderItem, order=order, product=cup, quantity=2, unit_price='7.50')
+    return kettle, cup
+
+
+@pytest.mark.django_db
+class TestSalesRollups:
+    def test_checkout_and_payment_update_rollups(self, api_client):
+        product = baker.make(Product, inventory=10)
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=product, quantity=3)
+        api_client.force_authenticate(user=baker.make(get_user_model()))
+        order_id = api_client.post('/orders/', {'cart_id': str(cart.id)}).data['id']
+        price = str(3 * Product.objects.get(pk=product.id).effective_price)
+
+        deliver_pending()
+        publish('order_created', order_id=order_id)  # Повторная доставка
+        deliver_pending()
+
+        assert rollup(SalesDaily) == [(product.id, 'P', 3, price)]
+        assert rollup(SalesHourly) == rollup(SalesDaily)
+
+        api_client.force_authenticate(user=baker.make(get_user_model(), is_staff=True))
+        response = api_client.patch(f'/orders/{order_id}/', {'payment_status': 'C'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert rollup(SalesDaily) == [(product.id, 'C', 3, price)]
+        assert rollup(SalesHourly) == rollup(SalesDaily)
+
+    def test_backfill_matches_incremental(self, history):
+        call_command('backfill_sales', chunk_size=2)
+        daily = rollup(SalesDaily)
+        call_command('backfill_sales')  # Все учтено - ничего не меняется
+        call_command('backfill_sales', rebuild=True)
+
+        kettle, cup = history
+        assert daily == sorted([(kettle.id, 'C', 2, '200.00'), (kettle.id, 'P', 1, '100.00'),
+                                (cup.id, 'C', 4, '30.00'), (cup.id, 'P', 2, '15.00')])
+        assert rollup(SalesDaily) == daily
+        assert rollup(SalesHourly) == daily
+
+
+@pytest.mark.django_db
+class TestSalesReport:
+    def test_if_user_is_not_admin_return_403(self, api_client, authenticate):
+        authenticate()
+
+        response = api_client.get('/reports/sales/')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_groups_paid_sales(self, api_client, staff, history):
+        call_command('backfill_sales')
+        kettle, cup = history
+
+        by_collection = api_client.get('/reports/sales/?group_by=collection').data
+        by_product = api_client.get('/reports/sales/?group_by=product&payment_status=P').data
+        by_day = api_client.get('/reports/sales/?date_from=2000-01-01').data
+
+        assert by_collection['results'] == [{'collection_id': kettle.collection_id, 'title': 'Кухня',
+                                             'units': 6, 'revenue': Decimal('230.00')}]
+        assert [(row['product_id'], row['units'], str(row['revenue']))
+                for row in by_product['results']] == [(kettle.id, 1, '100.00'), (cup.id, 2, '15.00')]
+        assert [(row['units'], str(row['revenue'])) for row in by_day['results']] \
+            == [(6, '230.00')]
+
+    def test_if_group_by_is_invalid_return_400(self, api_client, staff):
+        response = api_client.get('/reports/sales/?group_by=week')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_date_does_not_exist_return_400(self, api_client, staff):
+        response = api_client.get('/reports/sales/?date_from=2020-13-45')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'date_from' in response.data
+
+    def test_if_product_id_is_not_a_number_return_400(self, api_client, staff):
+        response = api_client.get('/reports/sales/?product_id=abc')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'product_id' in response.data
+
+    def test_empty_params_are_ignored(self, api_client, staff):
+        response = api_client.get('/reports/sales/?date_from=&product_id=')
+
+        assert response.status_code == status.HTTP_200_OK
@@ -0,0 +1,32 @@
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from store.transactions import atomic_write
+import pytest
+
+
+def pragma(name):
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.skipif(connection.vendor != 'sqlite', reason='Только SQLite')
+@pytest.mark.django_db(transaction=True)
+class TestSqliteProfile:
+    def test_new_connection_gets_pragmas(self):
+        connection.ensure_connection()
+
+        assert pragma('busy_timeout') == 5000
+        assert pragma('synchronous') == 1  # NORMAL
+        assert pragma('cache_size') == -20000
+
+    def test_atomic_write_begins_immediate(self):
+        with CaptureQueriesContext(connection) as queries:
+            with atomic_write():
+                with atomic_write():  # Вложенный - SAVEPOINT
+                    pass
+            with transaction.atomic():
+                pass
+
+        begins = [query['sql'] for query in queries if query['sql'].startswith('BEGIN')]
+        assert begins == ['BEGIN IMMEDIATE', 'BEGIN DEFERRED']
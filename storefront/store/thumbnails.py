@@ -0,0 +1,163 @@
+"""
+Варианты картинок товаров: уменьшенные и пережатые в WebP копии оригинала
+(размеры - STORE_IMAGE_VARIANTS), клиент берет наименьшую подходящую.
+
+Ресайз идет в фоновом пуле потоков (Pillow отпускает GIL при ресайзе
+и кодировании), запрос только ставит задачу после коммита. Одинаковые
+загрузки определяются по sha256 содержимого: файл и его варианты хранятся
+один раз, повторная загрузка ссылается на уже сохраненный файл.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Product, ProductImage
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'store/images/variants'
+VARIANT_FORMAT = 'WEBP'
+VARIANT_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_variant_sizes():
+    return getattr(settings, 'STORE_IMAGE_VARIANTS', {})
+
+
+def get_storage():
+    return ProductImage._meta.get_field('image').storage
+
+
+def hash_file(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def prepare_image(image):
+    """
+    pre_save: хеш новой загрузки. Если такой файл уже есть - берем его имя
+    и варианты, новый файл в хранилище не пишется.
+    """
+    if image.image._committed:
+        return
+    image.content_hash = hash_file(image.image)
+    image.variants = {}
+    duplicate = ProductImage.objects.filter(content_hash=image.content_hash) \
+        .exclude(pk=image.pk).values('image', 'variants').first()
+    if duplicate is not None:
+        image.image = duplicate['image']
+        image.variants = duplicate['variants']
+
+
+def schedule_variants(image):
+    """post_save: варианты строятся после коммита, в запросе ресайза нет."""
+    if image.variants or not image.content_hash:
+        return
+    content_hash = image.content_hash
+    transaction.on_commit(lambda: submit(content_hash))
+
+
+def get_executor():
+    global _executor
+    workers = getattr(settings, 'STORE_IMAGE_WORKERS', 0)
+    if not workers:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='store-thumbnails')
+    return _executor
+
+
+def submit(content_hash):
+    """Ставит задачу в пул. STORE_IMAGE_WORKERS = 0 - выполняет сразу."""
+    executor = get_executor()
+    if executor is None:
+        return generate_variants(content_hash)
+    return executor.submit(run_in_worker, content_hash)
+
+
+def run_in_worker(content_hash):
+    try:
+        return generate_variants(content_hash)
+    except Exception:
+        logger.exception('Не удалось построить варианты картинки %s', content_hash)
+    finally:
+        connections.close_all()  # Соединения потока пула
+
+
+def variant_path(content_hash, name):
+    return f'{VARIANTS_DIR}/{content_hash[:2]}/{content_hash}_{name}.webp'
+
+
+def open_source(name):
+    with get_storage().open(name) as file:
+        source = ImageOps.exif_transpose(Image.open(file))
+        source.load()
+    if source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGBA' if 'transparency' in source.info
+                                or source.mode in ('LA', 'PA') else 'RGB')
+    return source
+
+
+def generate_variants(content_hash):
+    """
+    Строит недостающие варианты и записывает их во все ProductImage
+    с этим хешем. Уже готовые файлы вариантов не пересчитываются.
+    """
+    images = ProductImage.objects.filter(content_hash=content_hash)
+    original = images.values_list('image', flat=True).first()
+    if original is None:
+        return {}
+
+    storage = get_storage()
+    source = None
+    variants = {}
+    for name, size in get_variant_sizes().items():
+        path = variant_path(content_hash, name)
+        if storage.exists(path):
+            with storage.open(path) as file:
+                width, height = Image.open(file).size
+        else:
+            if source is None:
+                source = open_source(original)
+            variant = source.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)  # Не увеличивает
+            buffer = BytesIO()
+            variant.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+            path = storage.save(path, ContentFile(buffer.getvalue()))
+            width, height = variant.size
+        variants[name] = {'path': path, 'width': width, 'height': height}
+
+    with transaction.atomic():
+        product_ids = list(images.values_list('product_id', flat=True))
+        images.update(variants=variants)
+        # Новые URL в ответах API: меняем версию товаров (ETag, кеш каталога)
+        Product.objects.filter(pk__in=product_ids).update(last_update=timezone.now())
+    return variants
+
+
+def variant_urls(variants, request=None):
+    """{имя: {url, width, height}} от меньшего к большему."""
+    storage = get_storage()
+    urls = {}
+    for name, variant in sorted(variants.items(), key=lambda item: item[1]['width']):
+        url = storage.url(variant['path'])
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        urls[name] = {'url': url, 'width': variant['width'], 'height': variant['height']}
+    return urls
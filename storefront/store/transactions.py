@@ -0,0 +1,16 @@
+from django.db import transaction
+
+
+def atomic_write(using=None):
+    """
+    transaction.atomic для транзакций, которые будут писать. На SQLite
+    (store.backends.sqlite3) внешняя транзакция начинается с BEGIN IMMEDIATE
+    и сразу берет блокировку записи, ожидая ее до busy_timeout. Обычная
+    транзакция сначала читает, и если база к первой записи уже изменилась,
+    получает "database is locked" без ожидания. Вложенный вызов и другие базы -
+    обычный atomic. Только как контекстный менеджер, не декоратор.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block and hasattr(connection, 'begin_mode'):
+        connection.begin_mode = 'IMMEDIATE'
+    return transaction.atomic(using)
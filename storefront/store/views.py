@@ -1,42 +1,159 @@
 from django.shortcuts import get_object_or_404
-from .models import Product, Collection, Order, OrderItem, Cart, CartItem, Review
+from .models import Product, Collection, Order, OrderItem, Cart, CartItem, Review, ProductImage
 from django.http import HttpResponse
 from .permissions import IsAdminOrReadOnly
 # Create your views here.
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import ProductSerializer, CollectionSerializer, ReviewSerializer
-from django.db.models import Count
+from .serializers import ProductSerializer, ProductReadSerializer, CollectionSerializer, \
+    ReviewSerializer, ProductImageSerializer, ProductLikesSerializer
+from django.db.models import Count, Prefetch
 from rest_framework.views import APIView
 from rest_framework.mixins import ListModelMixin
 from rest_framework.mixins import CreateModelMixin
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.filters import SearchFilter, OrderingFilter
-from .pagination import DefaultPagination
-
-
-
-class ProductViewSet(ModelViewSet):
+from .pagination import DefaultPagination, KeysetPagination
+from .search import ProductSearchFilter
+from .facets import ProductFacetFilter, get_facets, parse_facet_names
+from tags.filters import TagFilter
+from .cache import CatalogCacheMixin, cached_response, product_group, product_list_group
+from .conditional import ConditionalGetMixin
+from .querybudget import QueryBudgetMixin
+from .routers import ReplicaReadMixin
+from .carts import cart_cache_groups, line_total, touch_cart
+from likes.models import LikeCounter, LikedItem
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.exceptions import ValidationError
+from django.http import Http404
+from uuid import UUID
+
+
+
+def parse_ids(value, limit):
+    """?ids=1,2,3 -> [1, 2, 3] без повторов, не больше limit."""
+    try:
+        ids = list(dict.fromkeys(int(part) for part in (value or '').split(',') if part))
+    except ValueError:
+        raise ValidationError({'ids': 'Ожидаются числа через запятую'})
+    if len(ids) > limit:
+        raise ValidationError({'ids': f'Не более {limit} товаров за раз'})
+    return ids
+
+
+class ProductViewSet(QueryBudgetMixin, ReplicaReadMixin, ConditionalGetMixin, CatalogCacheMixin,
+                     ModelViewSet):
+    # Валидатор ETag + COUNT + товары + картинки и тэги по запросу на страницу (+ фасеты)
+    query_budget = {'list': 6, 'retrieve': 4, 'facets': 1, 'create': 11,
+                    'partial_update': 14, 'update': 14, 'destroy': 13,
+                    # Лайки: не зависит от числа товаров (RETURNING, UPDATE ... IN, SAVEPOINT в тестах)
+                    'like': 10, 'likes': 15}
+    cached_actions = {'list': 'product_list', 'retrieve': 'product'}
     serializer_class = ProductSerializer
     queryset = Product.objects.all()
     permission_classes = [IsAdminOrReadOnly]
     pagination_class = DefaultPagination
-    filter_backends = [SearchFilter, OrderingFilter]
+    filter_backends = [ProductSearchFilter, TagFilter, ProductFacetFilter, OrderingFilter]
     search_fields = ['title', 'description']
-    ordering_fields = ['unit_price', 'last_update']
+    ordering_fields = ['unit_price', 'last_update', 'effective_price']
 
     def get_queryset(self):
-        queryset = Product.objects.all()
+        queryset = Product.objects.prefetch_related('images')
         collection_id = self.request.query_params.get('collection_id')
         if collection_id is not None:
             queryset = queryset.filter(collection_id=collection_id)
         return queryset
 
+    @property
+    def paginator(self):
+        # ?cursor= включает курсорную пагинацию без OFFSET и COUNT
+        if not hasattr(self, '_paginator'):
+            if KeysetPagination.cursor_query_param in self.request.query_params:
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def is_fast_read(self):
+        # Только чтение: для форм browsable API нужен настоящий ProductSerializer
+        return self.action in ('list', 'retrieve') and self.request.method in ('GET', 'HEAD')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.is_fast_read():
+            # Картинки ProductReadSerializer загрузит сам
+            return queryset.prefetch_related(None).values(*ProductReadSerializer.fields)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.is_fast_read():
+            return ProductReadSerializer(*args, context=self.get_serializer_context(), **kwargs)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_paginated_response(self, data):
+        # ?facets= - счетчики фасетов для тех же фильтров, что и список
+        response = super().get_paginated_response(data)
+        if 'facets' in self.request.query_params:
+            response.data['facets'] = get_facets(
+                self.request, self.filter_queryset(self.get_queryset()),
+                parse_facet_names(self.request.query_params['facets']))
+        return response
+
+    @action(detail=False)
+    def facets(self, request):
+        handler = lambda: Response(get_facets(
+            request, self.filter_queryset(self.get_queryset()),
+            parse_facet_names(request.query_params.get('facets'))))
+        return cached_response(request, 'product_facets', self.get_cache_group(), handler)
+
+    def get_cache_group(self):
+        if self.action == 'retrieve':
+            return product_group(self.kwargs['pk'])
+        return product_list_group(self.request.query_params.get('collection_id'))
+
     def get_serializer_context(self):
         return {'request': self.request}
 
+    def get_like_states(self, product_ids):
+        counts = LikeCounter.objects.get_counts(Product, product_ids)
+        liked = LikedItem.objects.get_liked_ids(self.request.user, Product, product_ids)
+        return [{'product_id': product_id, 'likes_count': counts.get(product_id, 0),
+                 'liked': product_id in liked} for product_id in product_ids]
+
+    @action(detail=True, methods=['POST', 'DELETE'], permission_classes=[IsAuthenticated])
+    def like(self, request, pk):
+        try:
+            product_id = int(pk)
+        except ValueError:
+            raise Http404
+        if not Product.objects.filter(pk=product_id).exists():
+            raise Http404
+        if request.method == 'POST':
+            LikedItem.objects.like(request.user, Product, [product_id])
+        else:
+            LikedItem.objects.unlike(request.user, Product, [product_id])
+        return Response(self.get_like_states([product_id])[0])
+
+    @action(detail=False, methods=['GET', 'POST'],
+            permission_classes=[IsAuthenticatedOrReadOnly])
+    def likes(self, request):
+        """
+        GET ?ids=1,2,3 - счетчики и "лайкнул ли я" для страницы товаров
+        (два запроса на любое кол-во). POST - лайки пачкой, ProductLikesSerializer.
+        """
+        if request.method == 'POST':
+            serializer = ProductLikesSerializer(data=request.data, context={'user': request.user})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            data = serializer.validated_data
+            product_ids = list(dict.fromkeys(data['like'] + data['unlike']))
+        else:
+            product_ids = parse_ids(request.query_params.get('ids'),
+                                    ProductLikesSerializer.max_items)
+        return Response(self.get_like_states(product_ids))
+
     def destroy(self, request, *args, **kwargs):
         if OrderItem.objects.filter(product_id=self.kwargs['pk']).count() > 0:
             return Response({'error': 'Товар не может быть удален. Он есть в заказах'},
@@ -44,10 +161,17 @@ class ProductViewSet(ModelViewSet):
         return super().destroy(self, request, *args, **kwargs)
 
 
-class CollectionViewSet(ModelViewSet):
+class CollectionViewSet(QueryBudgetMixin, ReplicaReadMixin, ConditionalGetMixin,
+                        CatalogCacheMixin, ModelViewSet):
+    query_budget = {'list': 2, 'retrieve': 2, 'create': 1, 'update': 2,
+                    'partial_update': 2, 'destroy': 4}
+    cached_actions = {'list': 'collection_list'}
     permission_classes = [IsAdminOrReadOnly]
     serializer_class = CollectionSerializer
-    queryset = Collection.objects.annotate(products_count=Count('products')).all()
+    queryset = Collection.objects.all()  # products_count - хранимый счетчик
+
+    def get_cache_group(self):
+        return 'collections'
 
     def get_serializer_context(self):
         return {'request': self.request}
@@ -61,7 +185,9 @@ class CollectionViewSet(ModelViewSet):
 
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(QueryBudgetMixin, ReplicaReadMixin, ModelViewSet):
+    query_budget = {'list': 1, 'retrieve': 1, 'create': 1, 'update': 2, 'partial_update': 2,
+                    'destroy': 2}
     serializer_class = ReviewSerializer
 
    
@@ -72,52 +198,126 @@ class ReviewViewSet(ModelViewSet):
         return {'product_id': self.kwargs['product_pk']}
 
 
+class ProductImageViewSet(QueryBudgetMixin, ModelViewSet):
+    # Загрузка только сохраняет файл: варианты строятся в фоне (store.thumbnails)
+    query_budget = {'list': 1, 'retrieve': 1, 'create': 8, 'destroy': 6}
+    http_method_names = ['get', 'post', 'delete']
+    permission_classes = [IsAdminOrReadOnly]
+    serializer_class = ProductImageSerializer
+
+    def get_queryset(self):
+        return ProductImage.objects.filter(product_id=self.kwargs['product_pk'])
+
+    def get_serializer_context(self):
+        return {'product_id': self.kwargs['product_pk'], 'request': self.request}
+
+
 from rest_framework.mixins import RetrieveModelMixin, DestroyModelMixin, CreateModelMixin
 from rest_framework.viewsets import GenericViewSet
-from .serializers import CartSerializer, CartItemSerializer, \
-    AddCartItemSerializer, UpdateCartItemSerializer
+from .serializers import CartSerializer, CartReadSerializer, CartItemSerializer, \
+    AddCartItemSerializer, BulkAddCartItemSerializer, UpdateCartItemSerializer
 
 
-class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
+class CartViewSet(QueryBudgetMixin, CreateModelMixin, RetrieveModelMixin, DestroyModelMixin,
+                  GenericViewSet):
+    # retrieve: id товаров корзины (при смене позиций) + позиции с суммами одним запросом
+    # (+ проверка пустой корзины)
+    query_budget = {'create': 1, 'retrieve': 3, 'destroy': 4}
     queryset = Cart.objects.prefetch_related('items__product').all()
     serializer_class = CartSerializer
 
-
-class CartItemViewSet(ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            cart_id = UUID(str(self.kwargs['pk']))
+        except ValueError:
+            raise Http404
+
+        def handler():
+            data = CartReadSerializer(cart_id).data
+            if data is None:
+                raise Http404
+            return Response(data)
+        # Позиции корзины и каждый ее товар (цены, названия) - группы инвалидации
+        return cached_response(request, 'cart', cart_cache_groups(cart_id), handler)
+
+
+class CartItemViewSet(QueryBudgetMixin, ModelViewSet):
+    # bulk: upsert + SAVEPOINT/ROLLBACK TO/RELEASE, если уже внутри транзакции
+    # Запись: +1 на last_activity корзины, добавление: +1 на проверку корзины
+    query_budget = {'list': 1, 'retrieve': 1, 'create': 3, 'bulk': 6, 'partial_update': 4,
+                    'destroy': 3}
     http_method_names = ['get', 'post', 'patch', 'delete']
 
-  
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        try:
+            cart_id = UUID(str(self.kwargs['cart_pk']))
+        except ValueError:
+            raise Http404
+        # Upsert не проверяет корзину: внешний ключ SQLite упал бы только при коммите
+        if self.action in ('create', 'bulk') and not Cart.objects.filter(pk=cart_id).exists():
+            raise Http404
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, cart_pk=None):
+        # {"items": [{"product_id": 1, "quantity": 2}, ...]}
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.save()
+        touch_cart(cart_pk)
+        return Response(AddCartItemSerializer(items, many=True).data,
+                        status=status.HTTP_201_CREATED)
+
     def get_serializer_class(self):
+        if self.action == 'bulk':
+            return BulkAddCartItemSerializer
         if self.request.method == 'POST':
             return AddCartItemSerializer
         elif self.request.method == 'PATCH':
             return UpdateCartItemSerializer
         return CartItemSerializer # GET - в любом другом случае
 
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        touch_cart(self.kwargs['cart_pk'])
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        touch_cart(self.kwargs['cart_pk'])
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        touch_cart(self.kwargs['cart_pk'])
+
     def get_serializer_context(self):
         return {'cart_id': self.kwargs['cart_pk']}
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('product')
+        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']) \
+            .select_related('product').annotate(total_price=line_total()) \
+            .only('id', 'cart_id', 'quantity', 'product__id', 'product__title',
+                  'product__unit_price', 'product__effective_price')
 
 
 from .serializers import CustomerSerializer
 from .models import Customer
+from .authentication import get_customer, get_customer_id
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 
 
-class CustomerViewSet(ModelViewSet):
+class CustomerViewSet(QueryBudgetMixin, ModelViewSet):
+    # +1 на загрузку пользователя по JWT
+    # me: +4, если покупателя из claim нет и его пересоздает get_or_create
+    query_budget = {'list': 2, 'retrieve': 2, 'me': 6, 'create': 1, 'update': 2,
+                    'partial_update': 2, 'destroy': 4}
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAdminUser]
 
     @action(detail=False, methods=['GET', 'PUT'], permission_classes=[IsAuthenticated])
     def me(self, request):
-        try:
-            customer = Customer.objects.get(user_id=request.user.id)
-        except:
-            customer, created = Customer.objects.get_or_create(user_id=request.user.id)
+        customer = get_customer(request)
 
         if request.method == 'GET':
             serializer = CustomerSerializer(customer)
@@ -129,25 +329,69 @@ class CustomerViewSet(ModelViewSet):
             return Response(serializer.data)
 
 
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from .exports import ORDER_EXPORT_FORMATS, iter_order_export, parse_moment
 from .serializers import OrderSerializer, OrderItemSerializer, \
-    CreateOrderSerializer, UpdateOrderSerializer
-
-class OrderViewSet(ModelViewSet):
+    CreateOrderSerializer, UpdateOrderSerializer, OutOfStockError
+
+class OrderViewSet(QueryBudgetMixin, ModelViewSet):
+    # Пользователь + заказы с суммами + позиции + товары
+    # partial_update: + сводки продаж (заказ, метка, позиции, 2 upsert) и SAVEPOINT/RELEASE
+    # create: покупатель, корзина, по UPDATE остатка и фасетов на товар, ответ - заказ
+    # и позиции с товарами. export: выгрузка читает уже при отдаче потока, вне dispatch
+    query_budget = {'list': 4, 'retrieve': 4, 'partial_update': 12, 'create': 25,
+                    'destroy': 4, 'export': 1}
+    # История заказов: новые сверху, курсор по (placed_at, id)
+    pagination_class = KeysetPagination
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
 
     def get_permissions(self):
-        if self.request.method in ['PATCH', 'DELETE']:
+        if self.request.method in ['PATCH', 'DELETE'] or self.action == 'export':
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
     def create(self, request, *args, **kwargs):
         serializer = CreateOrderSerializer(data=request.data,
-                                           context={'user_id': self.request.user.id})
+                                           context={'customer_id': get_customer(request, 'id').id})
         serializer.is_valid(raise_exception=True)
-        order = self.save()
-        serializer = OrderSerializer(order)
+        try:
+            order = serializer.save()
+        except OutOfStockError as error:  # Транзакция уже откатилась
+            return Response({'items': error.errors}, status=status.HTTP_409_CONFLICT)
+        # Сумма в SQL и позиции с товарами двумя запросами, как в истории заказов
+        serializer = OrderSerializer(self.get_orders().get(pk=order.pk))
         return Response(serializer.data)
 
+    @action(detail=False, methods=['GET'])
+    def export(self, request):
+        """
+        Потоковая выгрузка заказов для финансов: ?output=ndjson|csv,
+        ?placed_after=, ?placed_before= (дата или дата-время), ?payment_status=
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in ORDER_EXPORT_FORMATS:
+            raise ValidationError({'output': f'Допустимо: {", ".join(ORDER_EXPORT_FORMATS)}'})
+
+        queryset = Order.objects.all()
+        for param, lookup in [('placed_after', 'placed_at__gte'), ('placed_before', 'placed_at__lt')]:
+            value = request.query_params.get(param)
+            if value:
+                moment = parse_moment(value)
+                if moment is None:
+                    raise ValidationError({param: 'Неверная дата'})
+                queryset = queryset.filter(**{lookup: moment})
+        payment_status = request.query_params.get('payment_status')
+        if payment_status:
+            if payment_status not in dict(Order.PAYMENT_STATUS_CHOICES):
+                raise ValidationError({'payment_status': 'Неизвестный статус'})
+            queryset = queryset.filter(payment_status=payment_status)
+
+        response = StreamingHttpResponse(iter_order_export(queryset, output),
+                                         content_type=ORDER_EXPORT_FORMATS[output])
+        response['Content-Disposition'] = f'attachment; filename="orders.{output}"'
+        return response
+
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return CreateOrderSerializer
@@ -156,19 +400,43 @@ class OrderViewSet(ModelViewSet):
         return OrderSerializer
 
 
-    def get_queryset(self):
-        user = self.request.user
-
-        if user.is_staff:
-            return Order.objects.all()
+    def get_orders(self):
+        items = OrderItem.objects.select_related('product').only(
+            'id', 'order_id', 'quantity', 'unit_price',
+            'product__id', 'product__title', 'product__unit_price', 'product__effective_price')
+        return Order.objects.with_totals() \
+            .prefetch_related(Prefetch('items', queryset=items)) \
+            .order_by('-placed_at', '-id')
 
-        customer_id = Customer.objects.only('id').get(user_id=user.id)
-        # only - возмет одно поле а не весь объект
-        return Order.objects.filter(customer_id=customer_id)
+    def get_queryset(self):
+        queryset = self.get_orders()
+        if self.request.user.is_staff:
+            return queryset
 
+        # customer_id из токена, дальше - индекс (customer, placed_at, id)
+        return queryset.filter(customer_id=get_customer_id(self.request))
 
 
+from .sales import sales_report
+from .serializers import SalesReportQuerySerializer, SalesReportRowSerializer
 
 
+class SalesReportViewSet(QueryBudgetMixin, GenericViewSet):
+    """
+    Продажи из сводок (SalesDaily / SalesHourly), позиции заказов не читаются.
+    ?group_by=day|hour|product|collection, ?date_from=, ?date_to= (даты
+    включительно), ?payment_status= (по умолчанию C - оплаченные),
+    ?product_id=, ?collection_id=
+    """
+    permission_classes = [IsAdminUser]
+    # Пользователь + отчет
+    query_budget = {'list': 2}
 
+    def list(self, request):
+        query = SalesReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        filters = dict(query.validated_data)
+        group_by = filters.pop('group_by')
 
+        rows = SalesReportRowSerializer(sales_report(group_by, **filters), many=True)
+        return Response({'group_by': group_by, 'results': rows.data})
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -57,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.routers.PrimaryAfterWriteMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,13 +87,46 @@ WSGI_APPLICATION = 'storefront.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite под несколькими воркерами (store.backends.sqlite3). WAL: читатели не ждут
+# писателя. synchronous = NORMAL в WAL не теряет целостность, fsync - на checkpoint.
+# busy_timeout: писатель ждет блокировку, а не сразу "database is locked".
+# CONN_MAX_AGE: подключение с PRAGMA и кешем страниц переживает запрос
+SQLITE_OPTIONS = {
+    'pragmas': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,  # мс
+        'cache_size': -20000,  # КБ, на подключение
+        'mmap_size': 128 * 1024 * 1024,
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'store.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': SQLITE_OPTIONS,
     }
 }
 
+# Реплики для чтения каталога (store.routers). Локально: STORE_DB_REPLICA=replica.sqlite3 -
+# второй файл SQLite, копию основного обновляет manage.py sync_replica
+if os.environ.get('STORE_DB_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'store.backends.sqlite3',
+        'NAME': BASE_DIR / os.environ['STORE_DB_REPLICA'],
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'OPTIONS': SQLITE_OPTIONS,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+STORE_DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# Столько секунд после записи клиент читает с основной базы
+STORE_DB_STICKY_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,6 +171,67 @@ CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173'
 ]
 
+# Кеш каталога (товары и категории).
+# Локально - LocMemCache: он ограничен MAX_ENTRIES и вытесняет по LRU.
+# Для нескольких воркеров задайте CATALOG_CACHE_URL (redis://...) -
+# тогда все процессы используют общий кеш и общую инвалидацию
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+if os.environ.get('CATALOG_CACHE_URL'):
+    CACHES['catalog'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['CATALOG_CACHE_URL'],
+        'TIMEOUT': 300,
+    }
+
+# Время жизни записей кеша каталога в секундах
+STORE_CATALOG_CACHE_TTL = {
+    'product': 300,
+    'product_list': 60,
+    'collection_list': 300,
+    'product_facets': 60,
+    'cart': 300,
+}
+
+# Варианты картинок товаров: имя -> наибольшая сторона в px (store.thumbnails).
+# После изменения: manage.py generate_thumbnails --force
+STORE_IMAGE_VARIANTS = {'small': 160, 'medium': 480, 'large': 1024}
+# Потоков фонового ресайза, 0 - прямо в запросе (тесты)
+STORE_IMAGE_WORKERS = 2
+
+# Брошенные корзины удаляются через STORE_CART_TTL_DAYS дней без активности:
+# manage.py sweep_carts (cron) или фоновый поток процесса каждые
+# STORE_CART_SWEEP_INTERVAL секунд (None - поток не запускается)
+STORE_CART_TTL_DAYS = 30
+STORE_CART_SWEEP_INTERVAL = None
+STORE_CART_SWEEP_BATCH_SIZE = 500
+STORE_CART_SWEEP_PAUSE = 0.1  # Секунд между пачками
+
+# Доставка событий outbox (store.outbox): 'thread' - фоновый поток процесса,
+# None - только manage.py outbox_worker, 'sync' - сразу после коммита
+STORE_OUTBOX_DISPATCHER = 'thread'
+STORE_OUTBOX_BATCH_SIZE = 100
+STORE_OUTBOX_POLL_INTERVAL = 5  # Секунд между проверками повторов
+STORE_OUTBOX_RETRY_BACKOFF = (1, 3600)  # Первая и наибольшая задержка повтора, с
+
+# Границы ценовых диапазонов фасетов (unit_price): 0-10, 10-50, ..., 500+.
+# После изменения: manage.py rebuild_facets
+STORE_PRICE_BUCKETS = [10, 50, 100, 500]
+
+# Лимиты SQL-запросов вьюсетов (query_budget): 'raise' - ошибка, 'warn' - лог, None - выкл
+STORE_QUERY_BUDGET_MODE = 'raise' if DEBUG else 'warn'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -144,7 +240,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication + customer_id и membership из claims токена
+        'store.authentication.CustomerJWTAuthentication',
     ),
 }
 
@@ -157,9 +254,16 @@ DJOSER = {
 
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('JWT',),
-    'ACCESS_TOKEN_LIFETIME': timedelta(days=1)
+    'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
+    'TOKEN_OBTAIN_SERIALIZER': 'store.authentication.CustomerTokenObtainPairSerializer',
 }
 
+# Снимки пользователей для JWT в памяти процесса (store.authentication.UserCache).
+# Изменения пользователя из другого процесса (пароль, деактивация) видны
+# не позже чем через STORE_AUTH_USER_CACHE_TTL секунд. 0 - без кеша
+STORE_AUTH_USER_CACHE_TTL = 60
+STORE_AUTH_USER_CACHE_SIZE = 10000
+
 AUTH_USER_MODEL = 'core.User'
 
 '''
@@ -172,4 +276,7 @@ AUTH_USER_MODEL = 'core.User'
     Тогда пользователь будет авторизован на сайте по токен живет
     
 
-'''
\ No newline at end of file
+'''
+# Бэкенд поиска товаров (?search=).
+# None - SQLite FTS5 для sqlite и LIKE для остальных баз
+STORE_SEARCH_BACKEND = None
@@ -0,0 +1,15 @@
+from rest_framework.filters import BaseFilterBackend
+
+from .models import TaggedItem
+
+
+class TagFilter(BaseFilterBackend):
+    """?tag=label - объекты с тэгом, несколько ?tag= - со всеми сразу."""
+    tag_query_param = 'tag'
+
+    def filter_queryset(self, request, queryset, view):
+        for label in request.query_params.getlist(self.tag_query_param):
+            if label:
+                queryset = queryset.filter(
+                    pk__in=TaggedItem.objects.tagged_ids(queryset.model, label))
+        return queryset
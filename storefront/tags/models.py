@@ -13,8 +13,26 @@ class TaggedItemManager(models.Manager):
             object_id=obj_id
         )
 
+    def for_model(self, obj_type):
+        # JOIN с django_content_type вместо отдельного запроса ContentType
+        meta = obj_type._meta
+        return self.filter(content_type__app_label=meta.app_label,
+                           content_type__model=meta.model_name)
+
+    def get_tags_for_many(self, obj_type, obj_ids):
+        """{id объекта: [Tag, ...]} одним запросом по индексу (content_type, object_id)."""
+        tags = {}
+        for item in self.for_model(obj_type).select_related('tag') \
+                .filter(object_id__in=list(obj_ids)).order_by('tag__label', 'tag_id'):
+            tags.setdefault(item.object_id, []).append(item.tag)
+        return tags
+
+    def tagged_ids(self, obj_type, label):
+        """Подзапрос id объектов с тэгом: pk__in=tagged_ids(...)."""
+        return self.for_model(obj_type).filter(tag__label=label).values('object_id')
+
 class Tag(models.Model):
-    label = models.CharField(max_length=255)
+    label = models.CharField(max_length=255, db_index=True)
 
     def __str__(self):
         return self.label
@@ -24,4 +42,12 @@ class TaggedItem(models.Model):
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
-    content_object = GenericForeignKey()
\ No newline at end of file
+    content_object = GenericForeignKey()
+
+    class Meta:
+        indexes = [
+            # Тэги объектов (get_tags_for, get_tags_for_many)
+            models.Index(fields=['content_type', 'object_id']),
+            # Объекты с тэгом (?tag=): тэг -> id без чтения таблицы
+            models.Index(fields=['tag', 'content_type', 'object_id']),
+        ]